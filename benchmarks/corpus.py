@@ -0,0 +1,152 @@
+import base64
+import html
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+SECTIONS = (
+    "HEADLINES & LAUNCHES",
+    "RESEARCH & INNOVATION",
+    "ENGINEERING & RESOURCES",
+    "MISCELLANEOUS",
+)
+COMPANIES = (
+    "Nvidia", "OpenAI", "AMD", "Google", "Meta", "Apple", "Microsoft", "Anthropic",
+    "Mistral", "Tesla", "Intel", "Amazon", "Samsung", "TSMC", "Broadcom", "Stripe",
+)
+TOPICS = (
+    "chips", "language models", "robotics", "datacenters", "open source", "agents",
+    "privacy", "quantum computing", "batteries", "self-driving cars", "search",
+    "smartphones", "cloud pricing", "security breaches", "compilers", "databases",
+)
+ACTIONS = (
+    "launches", "acquires", "open-sources", "delays", "benchmarks", "cuts prices of",
+    "invests in", "rebuilds", "announces", "partners on",
+)
+FILLER = (
+    "The company says the change will roll out over the coming months.",
+    "Analysts expect competitors to respond with similar announcements.",
+    "Early benchmarks show large gains on long-context workloads.",
+    "The release includes weights, training code and an evaluation suite.",
+    "Regulators have asked for more detail on how user data is handled.",
+    "Developers can try it today through a public preview.",
+    "Costs dropped sharply thanks to a new inference stack.",
+    "The team published a detailed write-up of the architecture.",
+)
+START_DATE = datetime(2024, 1, 1, 13, tzinfo=timezone.utc)
+
+
+def newsletter(rng: random.Random, date: datetime, n_articles: int) -> str:
+    """A newsletter in the TLDR plain-text layout, as understood by TLDRContentParser."""
+    newsletter_type = rng.choice(("TLDR", "TLDR AI"))
+    lines = [" Sign Up [1] |Advertise [2]|View Online [3] ", "", f"{newsletter_type} {date:%Y-%m-%d}", ""]
+    links = []
+    for i in range(n_articles):
+        if i % 4 == 0:
+            lines += [SECTIONS[(i // 4) % len(SECTIONS)], ""]
+        company, topic, action = rng.choice(COMPANIES), rng.choice(TOPICS), rng.choice(ACTIONS)
+        link = len(links) + 4
+        links.append(f"https://example.com/{date:%Y%m%d}/{i}")
+        title = f"{company} {action} {topic}".upper()
+        lines += [
+            f" {title} ({rng.randint(1, 15)} MINUTE READ) [{link}] ",
+            "",
+            f" {company} {action} {topic}. " + " ".join(rng.sample(FILLER, 3)),
+            "",
+        ]
+    lines += ["Love TLDR? Tell your friends and get rewards!", "", "Links:", "------"]
+    lines += [f"[{i + 1}] https://tldr.tech/{i + 1}" for i in range(3)]
+    lines += [f"[{i + 4}] {link}" for i, link in enumerate(links)]
+    return "\n".join(lines)
+
+
+def _part(mime_type: str, body: bytes, charset: str = "utf-8", **extra) -> Dict:
+    return {
+        "mimeType": mime_type,
+        "filename": "",
+        "headers": [{"name": "Content-Type", "value": f"{mime_type}; charset=\"{charset}\""}],
+        "body": {"size": len(body), "data": base64.urlsafe_b64encode(body).decode()},
+        **extra,
+    }
+
+
+def _multipart(mime_type: str, *parts: Dict) -> Dict:
+    return {"mimeType": mime_type, "filename": "", "headers": [], "body": {"size": 0}, "parts": list(parts)}
+
+
+def _as_html(text: str) -> bytes:
+    paragraphs = "".join(f"<p>{html.escape(line)}</p>" for line in text.split("\n"))
+    return f"<html><head><style>p {{margin: 0}}</style></head><body>{paragraphs}</body></html>".encode()
+
+
+def _attachment() -> Dict:
+    part = _part("application/pdf", b"%PDF-1.4 " * 512, body_by_id=True)
+    part["filename"] = "sponsor.pdf"
+    return part
+
+
+# Shapes newsletters arrive in, each building a payload from the plain text
+MESSAGE_STRUCTURES: Dict[str, Callable[[str], Dict]] = {
+    "plain": lambda text: _part("text/plain", text.encode()),
+    "alternative": lambda text: _multipart(
+        "multipart/alternative", _part("text/plain", text.encode()), _part("text/html", _as_html(text))
+    ),
+    # HTML first, as some senders order it, the plain part must still win
+    "mixed_alternative": lambda text: _multipart(
+        "multipart/mixed",
+        _multipart("multipart/alternative", _part("text/html", _as_html(text)), _part("text/plain", text.encode())),
+        _attachment(),
+    ),
+    "related_html_only": lambda text: _multipart(
+        "multipart/related", _part("text/html", _as_html(text)), _part("image/png", b"\x89PNG" * 64)
+    ),
+    "latin_1": lambda text: _part("text/plain", (text + "\nCaf\u00e9 na\u00efve").encode("latin-1"), "iso-8859-1"),
+    # Large bodies are left out of messages.get, with an ID to download them by
+    "large_body": lambda text: _multipart(
+        "multipart/alternative", _part("text/plain", text.encode(), body_by_id=True)
+    ),
+}
+
+
+def gmail_messages(
+    n_emails: int, articles_per_email: int = 10, seed: int = 0, structures: bool = False
+) -> List[Dict]:
+    """
+    Generated newsletters shaped like Gmail API `messages.get` responses, one a day.
+
+    Args:
+        n_emails: Number of emails
+        articles_per_email: Articles in each newsletter
+        seed: Seed, the same arguments always give the same corpus
+        structures: Cycle through MESSAGE_STRUCTURES rather than only sending
+            text/plain bodies. Parts marked `body_by_id` are served by
+            FakeGmailServer through the attachments endpoint.
+
+    Returns:
+        List[Dict]: Messages with an id, internalDate and a base64url encoded body
+    """
+    rng = random.Random(seed)
+    shapes = list(MESSAGE_STRUCTURES.values()) if structures else [MESSAGE_STRUCTURES["plain"]]
+    messages = []
+    for i in range(n_emails):
+        date = START_DATE + timedelta(days=i)
+        payload = shapes[i % len(shapes)](newsletter(rng, date, articles_per_email))
+        payload["headers"] = payload["headers"] + [{"name": "From", "value": "TLDR <dan@tldrnewsletter.com>"}]
+        messages.append({
+            "id": f"{i:016x}",
+            "threadId": f"{i:016x}",
+            "labelIds": ["INBOX"],
+            "internalDate": str(int(date.timestamp() * 1000)),
+            "payload": payload,
+        })
+    return messages
+
+
+def search_queries(n_queries: int, seed: int = 1) -> List[str]:
+    """Queries about the corpus topics, all distinct up to a few hundred so they miss the result cache."""
+    rng = random.Random(seed)
+    queries = {f"{company} {topic}" for company in COMPANIES for topic in TOPICS}
+    queries |= {f"{action} {topic}" for action in ACTIONS for topic in TOPICS}
+    queries = sorted(queries)
+    rng.shuffle(queries)
+    return [queries[i % len(queries)] for i in range(n_queries)]
@@ -0,0 +1,69 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from emails.embedding_backends import LocalEmbeddings
+
+
+class FakeEmbeddingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections alive like Ollama does
+    disable_nagle_algorithm = True  # Headers and body are separate writes
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        payload = json.dumps({"model": body.get("model"), "embeddings": self.server.embed(texts)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeEmbeddingServer(ThreadingHTTPServer):
+    """
+    A local stand-in for Ollama's /api/embed endpoint.
+
+    Vectors come from the hashed bag-of-words LocalEmbeddings, so searches return
+    sensible results. The simulated model cost is `latency` per request plus
+    `latency_per_text` per input, taken while holding a lock because a model server
+    embeds one batch at a time.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, size: int = 256, latency: float = 0.0, latency_per_text: float = 0.0):
+        super().__init__(("127.0.0.1", 0), FakeEmbeddingHandler)
+        self.embeddings = LocalEmbeddings(size=size)
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+        self.requests = 0
+        self.texts = 0
+        self._model_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def __enter__(self) -> "FakeEmbeddingServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-embeddings", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+    def embed(self, texts):
+        with self._model_lock:
+            self.requests += 1
+            self.texts += len(texts)
+            delay = self.latency + self.latency_per_text * len(texts)
+            if delay:
+                time.sleep(delay)
+            return self.embeddings.embed_documents(texts)
@@ -0,0 +1,172 @@
+import json
+import threading
+import time
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build
+from googleapiclient.http import BatchHttpRequest
+
+MESSAGES_PATH = "/gmail/v1/users/me/messages"
+BATCH_PATH = "/batch/gmail/v1"
+MAX_PAGE_SIZE = 500  # Gmail caps maxResults at 500
+
+
+class FakeGmailHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections alive like Google's frontends
+    disable_nagle_algorithm = True  # Headers and body are separate writes
+
+    def do_GET(self):
+        status, payload = self.server.route(self.path)
+        self._send(status, "application/json", json.dumps(payload).encode())
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if urlsplit(self.path).path != BATCH_PATH:
+            self._send(404, "application/json", b'{"error": {"code": 404}}')
+            return
+        boundary = "batch_response"
+        payload = self.server.batch(self.headers["Content-Type"], body, boundary)
+        self._send(200, f"multipart/mixed; boundary={boundary}", payload)
+
+    def _send(self, status: int, content_type: str, payload: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeGmailServer(ThreadingHTTPServer):
+    """
+    A local stand-in for the Gmail API serving a fixed list of messages.
+
+    Supports `messages.list` with paging, `messages.get`, `messages.attachments.get`
+    and batch requests of `messages.get`, which is all the fetcher uses. Every
+    message matches every query. `latency` is added to each HTTP request to mimic
+    the real round trip.
+
+    Parts marked `body_by_id` have their data left out of `messages.get`, as Gmail
+    does for attachments and large bodies, and get an `attachmentId` instead.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, messages: List[Dict], latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), FakeGmailHandler)
+        self.messages = messages
+        self.attachments: Dict[str, str] = {}
+        self.by_id = {message["id"]: self._detach(message) for message in messages}
+        self.latency = latency
+        self.requests: Dict[str, int] = {"list": 0, "get": 0, "attachment": 0, "batch": 0}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/"
+
+    def __enter__(self) -> "FakeGmailServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-gmail", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+    def service(self):
+        """A Gmail API client, built from the bundled discovery document, that talks to this server."""
+        return build(
+            "gmail", "v1",
+            credentials=AnonymousCredentials(),
+            client_options={"api_endpoint": self.url},
+            static_discovery=True,
+            cache_discovery=False
+        )
+
+    def new_batch(self, callback=None) -> BatchHttpRequest:
+        """A batch request that is sent to this server rather than Google's batch endpoint."""
+        return BatchHttpRequest(callback=callback, batch_uri=self.url.rstrip("/") + BATCH_PATH)
+
+    def _detach(self, message: Dict) -> Dict:
+        """The message as served, with the data of `body_by_id` parts replaced by attachment IDs."""
+        def detach(part: Dict) -> Dict:
+            part = dict(part)
+            if part.pop("body_by_id", False):
+                attachment_id = f"{message['id']}-{len(self.attachments)}"
+                self.attachments[attachment_id] = part["body"]["data"]
+                part["body"] = {"size": part["body"]["size"], "attachmentId": attachment_id}
+            if "parts" in part:
+                part["parts"] = [detach(child) for child in part["parts"]]
+            return part
+
+        return {**message, "payload": detach(message["payload"])}
+
+    def _count(self, kind: str):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests[kind] += 1
+
+    def route(self, path: str, count: bool = True):
+        """Answer one API request, `count` is False for the parts of a batch."""
+        url = urlsplit(path)
+        if url.path == MESSAGES_PATH:
+            if count:
+                self._count("list")
+            return 200, self._list(parse_qs(url.query))
+        if "/attachments/" in url.path:
+            if count:
+                self._count("attachment")
+            data = self.attachments.get(url.path.rsplit("/", 1)[1])
+            if data is None:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            return 200, {"size": len(data), "data": data}
+        if url.path.startswith(MESSAGES_PATH + "/"):
+            if count:
+                self._count("get")
+            message = self.by_id.get(url.path.rsplit("/", 1)[1])
+            if message is None:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            return 200, message
+        return 404, {"error": {"code": 404, "message": "Not found"}}
+
+    def _list(self, params: Dict[str, List[str]]) -> Dict:
+        page_size = min(int(params.get("maxResults", ["100"])[0]), MAX_PAGE_SIZE)
+        start = int(params.get("pageToken", ["0"])[0])
+        page = self.messages[start:start + page_size]
+        response = {
+            "messages": [{"id": message["id"], "threadId": message["threadId"]} for message in page],
+            "resultSizeEstimate": len(self.messages),
+        }
+        if start + page_size < len(self.messages):
+            response["nextPageToken"] = str(start + page_size)
+        return response
+
+    def batch(self, content_type: str, body: bytes, boundary: str) -> bytes:
+        """Answer a multipart/mixed batch of GET requests as one multipart/mixed response."""
+        self._count("batch")
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        parts = []
+        for part in message.get_payload():
+            request_line = part.get_payload().lstrip().split("\n", 1)[0]
+            _, path, _ = request_line.split(" ", 2)
+            status, payload = self.route(path, count=False)
+            content = json.dumps(payload)
+            parts.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'].strip('<>')}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n"
+                f"Content-Length: {len(content.encode())}\r\n\r\n"
+                f"{content}\r\n"
+            )
+        return ("".join(parts) + f"--{boundary}--\r\n").encode()
@@ -0,0 +1,280 @@
+"""
+End-to-end indexing and search benchmarks against local stand-ins for Gmail and Ollama.
+
+Run from the repository root, e.g.
+
+    PYTHONPATH=src python -m benchmarks.run --sizes 100 1000
+    PYTHONPATH=src python -m benchmarks.run --check            # fail on regressions
+    PYTHONPATH=src python -m benchmarks.run --save-baseline    # record new baselines
+
+Baselines are machine specific, record them on the machine that runs the checks.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+import numpy as np
+from rich import print
+from rich.table import Table
+
+from api.core.config import Settings
+from api.main import app
+from api.services.account_manager import get_email_service
+from api.services.email_service import EmailService
+from api.services.warmup import Warmup
+from emails.email_fetcher import EmailFetcher
+from emails.email_indexer import EmailIndexingService
+
+from .corpus import gmail_messages, search_queries
+from .fake_embeddings import FakeEmbeddingServer
+from .fake_gmail import FakeGmailServer
+
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+SEARCH_MODES = ("lexical", "vector", "hybrid")
+BATCH_SIZE = 100  # Requests per Gmail batch, the API allows up to 100
+WARMUP_QUERIES = 20
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+
+
+def benchmark_batch_fetch(gmail: FakeGmailServer) -> float:
+    """Download every message through batch requests, returning emails per second."""
+    service = gmail.service()
+    fetched = []
+    start = time.perf_counter()
+    for i in range(0, len(gmail.messages), BATCH_SIZE):
+        batch = gmail.new_batch(lambda request_id, response, exception: fetched.append(response))
+        for message in gmail.messages[i:i + BATCH_SIZE]:
+            batch.add(service.users().messages().get(userId="me", id=message["id"]))
+        batch.execute()
+    elapsed = time.perf_counter() - start
+    assert len(fetched) == len(gmail.messages) and all(fetched)
+    return len(fetched) / elapsed
+
+
+def benchmark_body_extraction(n_emails: int, args) -> float:
+    """Extract the bodies of every message structure in the corpus, returning emails per second."""
+    messages = gmail_messages(n_emails, args.articles_per_email, structures=True)
+    with FakeGmailServer(messages, latency=args.gmail_latency) as gmail:
+        fetcher = EmailFetcher(service=gmail.service())
+        emails = [gmail.by_id[message["id"]] for message in messages]
+        start = time.perf_counter()
+        bodies = [fetcher.get_body(email) for email in emails]
+        elapsed = time.perf_counter() - start
+    assert all(bodies)
+    return n_emails / elapsed
+
+
+def benchmark_indexing(service: EmailService, n_emails: int) -> Dict[str, float]:
+    """Index the whole fake mailbox through EmailService, as POST /api/emails/index does."""
+    start = time.perf_counter()
+    result = asyncio.run(service.index_emails("from:dan@tldrnewsletter.com", n_emails))
+    elapsed = time.perf_counter() - start
+    if result["status"] != "success":
+        raise RuntimeError(f"Indexing failed: {result['message']}")
+    articles = service.get_total_articles()
+    return {
+        "index_seconds": round(elapsed, 3),
+        "index_emails_per_s": round(n_emails / elapsed, 2),
+        "index_articles_per_s": round(articles / elapsed, 2),
+    }
+
+
+async def drive_search(
+    client: httpx.AsyncClient, queries: List[str], mode: str, concurrency: int, limit: int
+) -> Dict[str, float]:
+    """Closed-loop load: `concurrency` clients each send their next query as soon as one returns."""
+    pending = iter(queries)
+    latencies = []
+
+    async def worker():
+        for query in pending:
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/emails/search", json={"query": query, "limit": limit, "mode": mode}
+            )
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"qps": round(len(latencies) / elapsed, 2), **percentiles(latencies)}
+
+
+async def benchmark_search(service: EmailService, args) -> Dict[str, Dict[str, float]]:
+    """Search latency and throughput per mode through the HTTP API, in process."""
+    app.dependency_overrides[get_email_service] = lambda: service
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for mode in args.modes:
+                # Every mode starts cold, so cached embeddings do not favour later modes
+                service.search_system.embedding_cache.clear()
+                service.search_system.result_cache.clear()
+                queries = search_queries(WARMUP_QUERIES + args.queries)
+                await drive_search(client, queries[:WARMUP_QUERIES], mode, args.concurrency, args.limit)
+                results[mode] = await drive_search(
+                    client, queries[WARMUP_QUERIES:], mode, args.concurrency, args.limit
+                )
+    finally:
+        app.dependency_overrides.pop(get_email_service, None)
+    return results
+
+
+def benchmark_cold_start(settings: Settings) -> Dict[str, float]:
+    """Time importing the API in a fresh interpreter, and warming up a fresh service over the index."""
+    code = "import time; start = time.perf_counter(); import api.main; print(time.perf_counter() - start)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    ).stdout
+    warmup = Warmup(settings)
+    EmailService._instance = None
+    try:
+        start = time.perf_counter()
+        warmup.run_sync()
+        elapsed = time.perf_counter() - start
+    finally:
+        if EmailService._instance is not None:
+            EmailService._instance.close()
+        EmailService._instance = None
+    return {"import_api_s": round(float(output), 3), "warmup_s": round(elapsed, 3)}
+
+
+def run_size(n_emails: int, args) -> Dict[str, Any]:
+    messages = gmail_messages(n_emails, args.articles_per_email)
+    with tempfile.TemporaryDirectory() as base_dir, \
+            FakeGmailServer(messages, latency=args.gmail_latency) as gmail, \
+            FakeEmbeddingServer(
+                size=args.dimensions, latency=args.embed_latency, latency_per_text=args.embed_latency_per_text
+            ) as embedder:
+        settings = Settings(
+            base_dir=base_dir,
+            model_name="benchmark",
+            embedding_backend="ollama",
+            ollama_base_url=embedder.url,
+            search_workers=args.concurrency,
+            max_in_flight_searches=args.concurrency * 2
+        )
+        service = EmailService(settings)
+        service.indexing_service = EmailIndexingService(
+            cache_dir=base_dir,
+            search_system=service.search_system,
+            email_fetcher=EmailFetcher(service=gmail.service())
+        )
+        try:
+            results = benchmark_indexing(service, n_emails)
+            results["batch_fetch_emails_per_s"] = round(benchmark_batch_fetch(gmail), 2)
+            results["body_extraction_emails_per_s"] = round(benchmark_body_extraction(n_emails, args), 2)
+            results["search"] = asyncio.run(benchmark_search(service, args))
+        finally:
+            service.close()
+            service.embeddings.close()
+        results["cold_start"] = benchmark_cold_start(settings)
+    return results
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_s") or metric.endswith("qps")
+
+
+def compare(results: Dict[str, Any], baselines: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print every metric next to its baseline, returning the ones that regressed."""
+    table = Table(title=f"Benchmarks (regression tolerance {tolerance:.0%})")
+    for column in ("emails", "metric", "value", "baseline", "change"):
+        table.add_column(column, justify="right")
+
+    regressions = []
+    for size, size_results in results.items():
+        baseline = flatten(baselines.get(size, {}))
+        for metric, value in flatten(size_results).items():
+            if metric == "index_seconds":
+                continue
+            reference = baseline.get(metric)
+            change = ""
+            if reference:
+                ratio = value / reference - 1
+                worse = -ratio if higher_is_better(metric) else ratio
+                change = f"{ratio:+.1%}"
+                if worse > tolerance:
+                    change = f"[red]{change}[/red]"
+                    regressions.append(f"{size} emails {metric}: {value} vs {reference}")
+            table.add_row(size, metric, str(value), str(reference or "-"), change)
+    print(table)
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000], help="Corpus sizes in emails")
+    parser.add_argument("--articles-per-email", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=300, help="Measured queries per search mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent search clients")
+    parser.add_argument("--limit", type=int, default=10, help="Results per search")
+    parser.add_argument("--modes", nargs="+", choices=SEARCH_MODES, default=list(SEARCH_MODES))
+    parser.add_argument("--dimensions", type=int, default=256, help="Size of the fake embeddings")
+    parser.add_argument("--gmail-latency", type=float, default=0.0, help="Seconds added per Gmail request")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds added per embedding request")
+    parser.add_argument("--embed-latency-per-text", type=float, default=0.0, help="Seconds added per embedded text")
+    parser.add_argument("--baselines", type=Path, default=BASELINES_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baselines")
+    parser.add_argument("--check", action="store_true", help="Exit with an error when a metric regressed")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for n_emails in args.sizes:
+        print(f"Benchmarking {n_emails} emails ({n_emails * args.articles_per_email} articles)")
+        results[str(n_emails)] = run_size(n_emails, args)
+
+    stored = json.loads(args.baselines.read_text()) if args.baselines.exists() else {}
+    regressions = compare(results, stored.get("results", {}), args.tolerance)
+
+    if args.save_baseline:
+        config = {key: value for key, value in vars(args).items()
+                  if key not in ("baselines", "save_baseline", "check")}
+        args.baselines.write_text(json.dumps({
+            "environment": {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "system": platform.system(),
+            },
+            "config": config,
+            "results": {**stored.get("results", {}), **results},
+        }, indent=2) + "\n")
+        print(f"Saved baselines to {args.baselines}")
+
+    if regressions:
+        print("[red]Regressions:[/red]\n" + "\n".join(regressions))
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import tempfile
+
+import faiss
+import numpy as np
+from rich import print
+from rich.table import Table
+
+from emails.email_searcher import EmailSearchSystem
+from emails.vector_storage import (VECTOR_STORAGES, ExactVectorStore,
+                                   build_index, index_memory_bytes,
+                                   reconstruct_all, rerank)
+
+K = 10
+RERANK_FACTOR = 4
+N_QUERIES = 200
+SYNTHETIC_SIZE = (20000, 1024)
+
+
+def load_vectors() -> np.ndarray:
+    """Use the vectors of the local index, or synthetic ones if it is too small to train PQ."""
+    search_system = EmailSearchSystem()
+    if search_system.vector_store is not None and search_system.vector_store.index.ntotal >= 1000:
+        print(f"Using {search_system.vector_store.index.ntotal} vectors from the local index")
+        return reconstruct_all(search_system.vector_store.index)
+
+    print(f"Local index too small, using {SYNTHETIC_SIZE[0]} synthetic clustered vectors")
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((200, SYNTHETIC_SIZE[1]))
+    vectors = centers[rng.integers(0, len(centers), SYNTHETIC_SIZE[0])]
+    vectors = (vectors + 0.5 * rng.standard_normal(vectors.shape)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    return float(np.mean([len(set(t) & set(f)) / len(t) for t, f in zip(truth, found)]))
+
+
+def main():
+    vectors = load_vectors()
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), N_QUERIES, replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    faiss.normalize_L2(queries)
+
+    _, truth = build_index("flat", vectors).search(queries, K)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        exact_vectors = ExactVectorStore(f"{tmp_dir}/exact_vectors.f32", vectors.shape[1])
+        exact_vectors.append(vectors)
+
+        table = Table(title=f"Vector storage over {len(vectors)} x {vectors.shape[1]}-d vectors")
+        for column in ("storage", "bytes/vector", "memory saving", f"recall@{K}", f"recall@{K} reranked"):
+            table.add_column(column, justify="right")
+
+        flat_bytes = None
+        for storage in VECTOR_STORAGES:
+            index = build_index(storage, vectors)
+            memory = index_memory_bytes(index)
+            flat_bytes = flat_bytes or memory
+
+            _, found = index.search(queries, K)
+            _, candidates = index.search(queries, K * RERANK_FACTOR)
+            _, reranked = rerank(queries, candidates, exact_vectors, K)
+
+            table.add_row(
+                storage,
+                f"{memory / len(vectors):.1f}",
+                f"{flat_bytes / memory:.1f}x",
+                f"{recall_at_k(truth, found):.3f}",
+                f"{recall_at_k(truth, reranked):.3f}",
+            )
+
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
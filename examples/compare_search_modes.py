@@ -0,0 +1,53 @@
+import statistics
+import time
+
+from rich import print
+from rich.table import Table
+
+from emails.email_searcher import SEARCH_MODES, EmailSearchSystem
+
+QUERIES = [
+    "Nvidia",
+    "OpenAI",
+    "What are the latest developments in AI chips?",
+    "Rust programming language release",
+    "startup funding rounds",
+]
+REPEATS = 20
+
+
+def time_mode(search_system: EmailSearchSystem, mode: str) -> list:
+    latencies = []
+    for _ in range(REPEATS):
+        for query in QUERIES:
+            start = time.perf_counter()
+            search_system.search(query, k=5, mode=mode)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    # Disable caching so every search pays the full cost of its mode
+    search_system = EmailSearchSystem(embedding_cache_size=0, result_cache_size=0)
+    print(f"Comparing search modes over {search_system.get_total_articles()} indexed articles")
+
+    table = Table(title=f"Search latency ({len(QUERIES)} queries x {REPEATS} repeats)")
+    for column in ("mode", "mean ms", "p50 ms", "p95 ms", "max ms"):
+        table.add_column(column, justify="right")
+
+    for mode in SEARCH_MODES:
+        latencies = time_mode(search_system, mode)
+        percentiles = statistics.quantiles(latencies, n=100)
+        table.add_row(
+            mode,
+            f"{statistics.mean(latencies):.3f}",
+            f"{percentiles[49]:.3f}",
+            f"{percentiles[94]:.3f}",
+            f"{max(latencies):.3f}",
+        )
+
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,7 @@ def main():
 
     for article in articles:
         print("\n" + "="*80)
-        print(json.dumps(article, indent=2, ensure_ascii=False))
+        print(json.dumps(article.to_dict(), indent=2, ensure_ascii=False))
         
     print(f"Extracted {len(articles)} articles from {query}")
 
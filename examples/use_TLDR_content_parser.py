@@ -25,7 +25,7 @@ def main():
         print(f"\nProcessing {file}:")
         print("="*80)
         for article in articles:
-            print(json.dumps(article, indent=2, ensure_ascii=False))
+            print(json.dumps(article.to_dict(), indent=2, ensure_ascii=False))
             print("-"*40)
     
     print(f"\nTotal articles extracted: {len(all_articles)}")
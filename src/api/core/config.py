@@ -1,12 +1,67 @@
-from pydantic import BaseModel
+from typing import Dict, List, Optional
 
+from pydantic_settings import BaseSettings
 
-class Settings(BaseModel):
+
+class Settings(BaseSettings):
     app_name: str = "Email Search API"
     base_dir: str = ".email_search"
     model_name: str = "mxbai-embed-large"
+    user_credentials: str = "secrets/user_token.pickle"
+    embedding_backend: str = "ollama"  # "local" embeds in-process without a server
+    ollama_base_url: str = "http://localhost:11434"
+    embedding_timeout: float = 30.0
+    embedding_max_connections: int = 4
+    embedding_batch_size: int = 32
+    embedding_cache_size: int = 1024
+    result_cache_size: int = 256
+    cursor_cache_size: int = 256  # Paged searches whose ranked results are kept for their next_cursor
+    vector_storage: str = "flat"
+    rerank_factor: int = 0
+    neighbor_count: int = 10  # Related articles precomputed per article, 0 disables the graph
+    partition: Optional[str] = None  # "month" or "newsletter" to shard the index
+    max_loaded_shards: int = 12
+    # "standalone" indexes and serves in one process; with several uvicorn
+    # workers run one "writer" that publishes snapshots and N "reader"s
+    serving_role: str = "standalone"
+    snapshot_dir: Optional[str] = None  # Defaults to <base_dir>/snapshots
+    snapshot_poll_interval: float = 2.0
+    # Portable export (see emails.index_export) imported when base_dir has no index yet
+    bootstrap_export: Optional[str] = None
+    # Retention, unset keeps every article forever
+    retention_max_age_days: Optional[int] = None
+    retention_max_articles: Optional[int] = None
+    retention_newsletter_max_age_days: Dict[str, int] = {}  # e.g. '{"TLDR Crypto": 30}'
+    retention_interval: float = 3600.0
+    # Multi-account serving: each account gets its own index under accounts_dir
+    # and Gmail token at <account_credentials_dir>/<account>/user_token.pickle
+    accounts_dir: Optional[str] = None  # Defaults to <base_dir>/accounts
+    account_credentials_dir: str = "secrets/accounts"
+    max_loaded_accounts: int = 8
+    account_memory_budget_mb: Optional[float] = None
+    account_idle_timeout: float = 1800.0
+    # Continuous indexing: queries polled in the background, e.g.
+    # '["from:dan@tldrnewsletter.com"]'; empty leaves indexing to POST /api/emails/index
+    indexing_queries: List[str] = []
+    indexing_min_interval: float = 60.0
+    indexing_max_interval: float = 1800.0
+    indexing_backoff: float = 2.0
+    indexing_batch_size: int = 20
+    search_workers: int = 4
+    max_in_flight_searches: int = 64  # Distinct searches admitted before answering 503
+    # Load the index and pre-warm the embedding model when the API starts, rather
+    # than on the first request; /ready reports 503 until this is done
+    warmup: bool = True
+    cold_start_budget: float = 10.0  # Seconds, a slower warmup is logged as a warning
+    # When enabled, requests sent with an X-Profile header or ?profile=true are
+    # traced and profiled; any client can ask, so only enable it on trusted networks
+    profiling_enabled: bool = False
+    profile_dir: Optional[str] = None  # Defaults to <base_dir>/profiles
+    profile_interval: float = 0.005  # Seconds between stack samples
+    max_profiles: int = 100  # Newest request traces kept, older ones are deleted
     
     model_config = {
+        'env_prefix': 'EMAIL_SEARCH_',
         'env_file': '.env',
         'extra': 'allow',
         'protected_namespaces': ()
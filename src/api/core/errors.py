@@ -22,4 +22,44 @@ class EmailNotFoundError(EmailAPIError):
             status_code=status.HTTP_404_NOT_FOUND,
             message="Email not found",
             error_code="EMAIL_NOT_FOUND"
-        ) 
\ No newline at end of file
+        )
+
+class ArticleNotFoundError(EmailAPIError):
+    def __init__(self, article_id: str):
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            message=f"Article '{article_id}' not found",
+            error_code="ARTICLE_NOT_FOUND"
+        )
+
+class ServiceOverloadedError(EmailAPIError):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            message="Too many searches in flight, retry shortly",
+            error_code="SERVICE_OVERLOADED"
+        )
+
+class NeighborGraphUnavailableError(EmailAPIError):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            message="Related articles are not available until the neighbor graph is built",
+            error_code="NEIGHBOR_GRAPH_UNAVAILABLE"
+        )
+
+class InvalidAccountError(EmailAPIError):
+    def __init__(self, account: str):
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            message=f"Invalid account '{account}'",
+            error_code="INVALID_ACCOUNT"
+        )
+
+class InvalidCursorError(EmailAPIError):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            message="Invalid or expired search cursor",
+            error_code="INVALID_CURSOR"
+        )
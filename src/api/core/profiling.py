@@ -0,0 +1,90 @@
+import os
+import re
+
+from starlette.datastructures import Headers, QueryParams
+
+import tracing
+
+from .config import Settings
+
+# Endpoints that may be traced, everything else passes straight through
+PROFILED_PATHS = ("/api/emails/search", "/api/emails/index")
+PROFILE_FLAGS = ("1", "true", "yes")
+TRACE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def profile_dir(settings: Settings) -> str:
+    return settings.profile_dir or os.path.join(settings.base_dir, "profiles")
+
+
+def profile_requested(scope) -> bool:
+    """Whether a request asks to be profiled, with an X-Profile header or ?profile=true."""
+    if scope["type"] != "http" or not scope["path"].startswith(PROFILED_PATHS):
+        return False
+    flag = Headers(scope=scope).get("x-profile")
+    if flag is None:
+        flag = QueryParams(scope["query_string"]).get("profile")
+    return flag is not None and flag.lower() in PROFILE_FLAGS
+
+
+def prune_profiles(directory: str, keep: int) -> int:
+    """
+    Delete the oldest stored traces beyond the newest `keep`, with their samples.
+
+    Returns:
+        int: Number of traces deleted
+    """
+    traces = []
+    for name in os.listdir(directory):
+        trace_id, ext = os.path.splitext(name)
+        if ext == ".json" and TRACE_ID_PATTERN.match(trace_id):
+            try:
+                traces.append((os.path.getmtime(os.path.join(directory, name)), trace_id))
+            except FileNotFoundError:
+                # Pruned meanwhile by a concurrent request
+                continue
+    traces.sort(reverse=True)
+    for _, trace_id in traces[keep:]:
+        for ext in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(directory, trace_id + ext))
+            except FileNotFoundError:
+                pass
+    return len(traces[keep:])
+
+
+class ProfilingMiddleware:
+    """
+    Trace requests that ask for it, sampling their stacks while they run, once
+    profiling is enabled in the settings; otherwise the request is served as usual.
+
+    The spans and the folded stack samples are stored under the profile directory as
+    `<trace_id>.json` and `<trace_id>.folded`, keeping the newest `max_profiles`
+    traces, and the response carries the trace id in X-Trace-Id with the span totals
+    in Server-Timing. This is a plain ASGI middleware so requests that are not
+    profiled only pay for a settings check.
+    """
+
+    def __init__(self, app, settings: Settings):
+        self.app = app
+        self.settings = settings
+
+    async def __call__(self, scope, receive, send):
+        if not self.settings.profiling_enabled or not profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        with tracing.trace(scope["path"], self.settings.profile_interval) as current:
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    # Spans still open, e.g. a streamed body, are only in the stored trace
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-trace-id", current.trace_id.encode()))
+                    headers.append((b"server-timing", current.server_timing().encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)
+        directory = profile_dir(self.settings)
+        current.save(directory)
+        prune_profiles(directory, self.settings.max_profiles)
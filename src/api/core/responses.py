@@ -0,0 +1,58 @@
+import base64
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+from .errors import InvalidCursorError
+
+
+def project_results(results: List[Dict[str, Any]], fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """
+    Keep only the requested fields of search results.
+
+    Args:
+        results: Search results as returned by the search system
+        fields: Top-level fields and "metadata.<name>" fields to keep, None for all
+
+    Returns:
+        List[Dict[str, Any]]: New result dicts; the input results are not modified
+    """
+    if fields is None:
+        return results
+    top_level = [field for field in fields if "." not in field]
+    metadata_fields = [field.split(".", 1)[1] for field in fields if field.startswith("metadata.")]
+    if "metadata" in top_level:
+        metadata_fields = []
+
+    projected = []
+    for result in results:
+        row = {field: result[field] for field in top_level}
+        if metadata_fields:
+            metadata = result["metadata"]
+            row["metadata"] = {name: metadata.get(name) for name in metadata_fields}
+        projected.append(row)
+    return projected
+
+
+def encode_cursor(search_id: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps({"search": search_id, "offset": offset})).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Tuple[Optional[str], int]:
+    """
+    Get the search a cursor pages through and the result offset it points at,
+    (None, 0) for no cursor.
+
+    Raises:
+        InvalidCursorError: If the cursor was not returned by a search
+    """
+    if not cursor:
+        return None, 0
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        search_id, offset = data["search"], data["offset"]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursorError()
+    if not isinstance(search_id, str) or not isinstance(offset, int) or offset < 0:
+        raise InvalidCursorError()
+    return search_id, offset
@@ -1,15 +1,44 @@
-from fastapi import FastAPI
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
+
+import metrics
 
 from .core.config import get_settings
+from .core.profiling import TRACE_ID_PATTERN, ProfilingMiddleware, profile_dir
 from .routers import emails
+from .services.account_manager import AccountManager
+from .services.email_service import EmailService
+from .services.warmup import Warmup
 
 settings = get_settings()
+warmup = Warmup(settings)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so /health answers while the index loads
+    task = asyncio.create_task(warmup.run()) if settings.warmup else None
+    if task is None:
+        warmup.skip()
+    yield
+    if task is not None:
+        await task
+    if AccountManager._instance is not None:
+        AccountManager._instance.close()
+    if EmailService._instance is not None:
+        EmailService._instance.close()
+
 
 app = FastAPI(
     title=settings.app_name,
     description="API for searching and indexing emails",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware for Electron app
@@ -21,8 +50,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ProfilingMiddleware, settings=settings)
+
 app.include_router(emails.router)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"} 
\ No newline at end of file
+    """Liveness, the process is up even while it is still warming up"""
+    return {"status": "healthy"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness, 503 until the index and embedding model are loaded"""
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready else 503)
+
+def render_metrics() -> str:
+    # Only report index gauges once the service exists, scraping must not load it
+    if EmailService._instance is not None:
+        EmailService._instance.collect_metrics()
+    return metrics.REGISTRY.render()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Metrics in the Prometheus text exposition format"""
+    # Gauges are read from the index, which must not hold up the event loop
+    body = await asyncio.to_thread(render_metrics)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/profiles/{trace_id}")
+async def get_profile(trace_id: str, format: str = "json"):
+    """A stored request trace, as spans ("json") or flamegraph-ready stacks ("folded")"""
+    if (
+        not settings.profiling_enabled
+        or format not in ("json", "folded")
+        or not TRACE_ID_PATTERN.match(trace_id)
+    ):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    path = os.path.join(profile_dir(settings), f"{trace_id}.{format}")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "application/json" if format == "json" else "text/plain"
+    return FileResponse(path, media_type=media_type)
@@ -1,26 +1,75 @@
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+MAX_SEARCH_RESULTS = 10000
+
+
+def result_fields() -> List[str]:
+    """Fields a search can be projected to, metadata fields as "metadata.<name>"."""
+    return ["id", "content", "similarity_score", "metadata"] + [
+        f"metadata.{name}" for name in EmailMetadata.model_fields
+    ]
+
+
+def check_fields(fields: Optional[List[str]]) -> Optional[List[str]]:
+    if fields is not None:
+        unknown = set(fields) - set(result_fields())
+        if unknown:
+            raise ValueError(f"Unknown result fields {sorted(unknown)}, expected some of {result_fields()}")
+    return fields
 
 
 class SearchQuery(BaseModel):
     query: str
-    limit: int = Field(default=5, ge=1, le=10000)
+    limit: int = Field(default=5, ge=1, le=MAX_SEARCH_RESULTS)
     min_score: float = Field(default=0.0, ge=0.0, le=1.0)
+    filters: Optional[Dict[str, str]] = None
+    mode: Literal["vector", "lexical", "hybrid"] = "vector"
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    # Only return these result fields, e.g. ["metadata.title", "similarity_score"]
+    fields: Optional[List[str]] = None
+    # next_cursor of the previous page
+    cursor: Optional[str] = None
+
+    _check_fields = field_validator("fields")(check_fields)
     
+class BatchSearchQuery(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=100)
+    limit: int = Field(default=5, ge=1, le=MAX_SEARCH_RESULTS)
+    min_score: float = Field(default=0.0, ge=0.0, le=1.0)
+    filters: Optional[Dict[str, str]] = None
+    mode: Literal["vector", "lexical", "hybrid"] = "vector"
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    fields: Optional[List[str]] = None
+
+    _check_fields = field_validator("fields")(check_fields)
+
 class EmailMetadata(BaseModel):
     title: str
     section: Optional[str] = None
     reading_time: Optional[int] = None
     newsletter_type: Optional[str] = None
     link: Optional[str] = None
+    email_id: Optional[str] = None
+    date: Optional[str] = None
+    message_id: Optional[str] = None
 
 class SearchResult(BaseModel):
-    content: str
-    metadata: EmailMetadata
-    similarity_score: float
+    # Optional, since a search may project results to fewer fields
+    id: Optional[str] = None
+    content: Optional[str] = None
+    metadata: Optional[EmailMetadata] = None
+    similarity_score: Optional[float] = None
 
 class SearchResponse(BaseModel):
     results: List[SearchResult]
     total: int
-    query: str 
\ No newline at end of file
+    query: str
+    next_cursor: Optional[str] = None
+
+class BatchSearchResponse(BaseModel):
+    responses: List[SearchResponse]
+    total: int
@@ -1,10 +1,16 @@
 from typing import Any, Dict
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 
+import tracing
 from logging_config import setup_logging
 
-from ..models.emails import SearchQuery, SearchResponse
+from ..core.errors import EmailAPIError
+from ..models.emails import (MAX_SEARCH_RESULTS, BatchSearchQuery,
+                              BatchSearchResponse, SearchQuery,
+                              SearchResponse)
+from ..services.account_manager import AccountManager, get_email_service
 from ..services.email_service import EmailService
 
 logger = setup_logging(__name__)
@@ -15,7 +21,7 @@ router = APIRouter(prefix="/api/emails", tags=["emails"])
 async def index_emails(
     query: str,
     max_results: int,
-    email_service: EmailService = Depends(EmailService.get_instance)
+    email_service: EmailService = Depends(get_email_service)
 ) -> Dict[str, Any]:
     """Index new emails from a specific query"""
     logger.info(f"Received index request with query='{query}', max_results={max_results}")
@@ -31,29 +37,100 @@ async def index_emails(
         logger.error(f"Unexpected error during indexing: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/search")
+@router.post("/search", response_model=SearchResponse)
 async def search_emails(
     query: SearchQuery,
-    email_service: EmailService = Depends(EmailService.get_instance)
-) -> SearchResponse:
-    """Search indexed emails"""
-    logger.info(f"Received search request: {query}")
+    email_service: EmailService = Depends(get_email_service)
+) -> ORJSONResponse:
+    """Search indexed emails, one page at a time"""
+    logger.debug("Received search request: %s", query)
     
     try:
-        response = email_service.search(
+        response = await email_service.search(
             query.query,
             limit=query.limit,
-            min_score=query.min_score
+            min_score=query.min_score,
+            filters=query.filters,
+            mode=query.mode,
+            date_from=query.date_from,
+            date_to=query.date_to,
+            fields=query.fields,
+            cursor=query.cursor
         )
-        logger.info(f"Search completed successfully with {response.total} results")
-        return response
+        logger.debug("Search completed successfully with %d results", response["total"])
+        # Results come straight from the index, skip re-validating each of them
+        with tracing.span("serialize"):
+            return ORJSONResponse(response)
+    except EmailAPIError:
+        raise
     except Exception as e:
         logger.error(f"Search failed: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def search_emails_batch(
+    query: BatchSearchQuery,
+    email_service: EmailService = Depends(get_email_service)
+) -> ORJSONResponse:
+    """Search indexed emails for several queries in one request"""
+    logger.debug("Received batch search request with %d queries", len(query.queries))
+    
+    try:
+        response = await email_service.search_many(
+            query.queries,
+            limit=query.limit,
+            min_score=query.min_score,
+            filters=query.filters,
+            mode=query.mode,
+            date_from=query.date_from,
+            date_to=query.date_to,
+            fields=query.fields
+        )
+        logger.debug("Batch search completed successfully for %d queries", response["total"])
+        with tracing.span("serialize"):
+            return ORJSONResponse(response)
+    except EmailAPIError:
+        raise
+    except Exception as e:
+        logger.error(f"Batch search failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/duplicates")
+async def get_near_duplicates(
+    min_score: float = Query(default=0.9, ge=0.0, le=1.0),
+    email_service: EmailService = Depends(get_email_service)
+) -> Dict[str, Any]:
+    """Group indexed articles that tell the same story"""
+    logger.info(f"Received near-duplicate request with min_score={min_score}")
+    try:
+        return email_service.near_duplicates(min_score)
+    except EmailAPIError:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to cluster near-duplicates: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{article_id}/related", response_model=SearchResponse)
+async def get_related_articles(
+    article_id: str,
+    limit: int = Query(default=10, ge=1, le=MAX_SEARCH_RESULTS),
+    min_score: float = Query(default=0.0, ge=0.0, le=1.0),
+    email_service: EmailService = Depends(get_email_service)
+) -> ORJSONResponse:
+    """Get the articles most similar to an indexed article, without embedding anything"""
+    logger.debug("Received related articles request for %s", article_id)
+    try:
+        response = email_service.related(article_id, limit=limit, min_score=min_score)
+        return ORJSONResponse(response)
+    except EmailAPIError:
+        raise
+    except Exception as e:
+        logger.error(f"Related articles lookup failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/count")
 async def get_article_count(
-    email_service: EmailService = Depends(EmailService.get_instance)
+    email_service: EmailService = Depends(get_email_service)
 ) -> Dict[str, int]:
     """Get the total number of indexed articles"""
     logger.info("Received request for article count")
@@ -63,4 +140,38 @@ async def get_article_count(
         return {"total": count}
     except Exception as e:
         logger.error(f"Failed to get article count: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+@router.get("/cache/stats")
+async def get_cache_stats(
+    email_service: EmailService = Depends(get_email_service)
+) -> Dict[str, Any]:
+    """Get hit-rate and eviction statistics of the search caches"""
+    logger.info("Received request for cache statistics")
+    try:
+        return email_service.get_cache_stats()
+    except Exception as e:
+        logger.error(f"Failed to get cache statistics: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/indexing/stats")
+async def get_indexing_stats(
+    email_service: EmailService = Depends(get_email_service)
+) -> Dict[str, Any]:
+    """Get the polling state of every query of the continuous indexing daemon"""
+    logger.info("Received request for indexing statistics")
+    if email_service.indexing_daemon is None:
+        return {"enabled": False, "queries": {}}
+    return {"enabled": True, "queries": email_service.indexing_daemon.stats()}
+
+@router.get("/accounts/stats")
+async def get_account_stats(
+    account_manager: AccountManager = Depends(AccountManager.get_instance)
+) -> Dict[str, Any]:
+    """Get the loaded accounts with their memory use, and eviction counters"""
+    logger.info("Received request for account statistics")
+    try:
+        return account_manager.stats()
+    except Exception as e:
+        logger.error(f"Failed to get account statistics: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
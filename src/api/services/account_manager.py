@@ -0,0 +1,300 @@
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from fastapi import Depends, Header
+
+from logging_config import setup_logging
+
+from ..core.config import Settings, get_settings
+from ..core.errors import InvalidAccountError
+from .email_service import EmailService
+
+logger = setup_logging(__name__)
+
+ACCOUNT_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._@+-]{0,127}$")
+
+
+class AccountManager:
+    """
+    Serves many mailboxes from one process with bounded memory.
+
+    Each account gets its own EmailService, i.e. its own index directory, Gmail
+    token and indexing state, created on the account's first request. Services are
+    kept in least-recently-used order and evicted when more than `max_loaded_accounts`
+    are loaded, when their estimated index memory exceeds the budget, or when they
+    have been idle too long. An evicted account is reloaded from disk on next use.
+    All accounts share one embedding client.
+
+    Requests lease the service of their account. Leased services are never
+    evicted to make room, and a service evicted explicitly or at shutdown while
+    leased is only closed once its last request is done.
+    """
+
+    _instance: Optional['AccountManager'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, settings: Settings):
+        from emails.embedding_backends import create_embeddings
+
+        self.settings = settings
+        self.accounts_dir = settings.accounts_dir or os.path.join(settings.base_dir, "accounts")
+        self.max_loaded_accounts = settings.max_loaded_accounts
+        self.memory_budget_bytes = (
+            int(settings.account_memory_budget_mb * 1024 * 1024)
+            if settings.account_memory_budget_mb is not None else None
+        )
+        self.idle_timeout = settings.account_idle_timeout
+        self.embeddings = create_embeddings(
+            settings.embedding_backend,
+            model_name=settings.model_name,
+            base_url=settings.ollama_base_url,
+            timeout=settings.embedding_timeout,
+            max_connections=settings.embedding_max_connections,
+            batch_size=settings.embedding_batch_size
+        )
+        self._services: "OrderedDict[str, EmailService]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # Services being loaded, and in-flight requests per account
+        self._loading: Dict[str, Future] = {}
+        self._leases: Counter = Counter()
+        # Evicted while leased, closed by the release of the last lease
+        self._closing: Dict[str, EmailService] = {}
+        self.evictions = 0
+
+        self._stop = threading.Event()
+        self._reaper = threading.Thread(target=self._reap, name="account-reaper", daemon=True)
+        self._reaper.start()
+
+    @classmethod
+    def get_instance(cls, settings: Settings = Depends(get_settings)) -> 'AccountManager':
+        with cls._instance_lock:
+            if cls._instance is None:
+                logger.info("Creating new AccountManager instance")
+                cls._instance = cls(settings)
+            return cls._instance
+
+    def account_settings(self, account: str) -> Settings:
+        """Get the settings of an account's service, with its own index and credentials."""
+        return self.settings.model_copy(update={
+            "base_dir": os.path.join(self.accounts_dir, account),
+            "user_credentials": os.path.join(
+                self.settings.account_credentials_dir, account, "user_token.pickle"
+            ),
+            "snapshot_dir": None,
+            # The export bootstraps the default mailbox, never another account's
+            "bootstrap_export": None,
+            # Account services are loaded and evicted on demand, they are
+            # indexed on request rather than polled in the background
+            "indexing_queries": [],
+        })
+
+    def _acquire(self, account: str) -> EmailService:
+        """
+        Lease the service of an account until _release, loading it on first use.
+        Services are loaded without holding the lock, so other accounts stay
+        available meanwhile, and concurrent requests wait for the same load.
+
+        Raises:
+            InvalidAccountError: If the account name is not a safe directory name
+        """
+        if not ACCOUNT_PATTERN.match(account) or account in (".", ".."):
+            raise InvalidAccountError(account)
+
+        while True:
+            with self._lock:
+                service = self._services.get(account)
+                if service is None and account in self._closing:
+                    # Evicted while leased and not closed yet, serve it again
+                    service = self._services[account] = self._closing.pop(account)
+                if service is not None:
+                    self._services.move_to_end(account)
+                    self._last_used[account] = time.monotonic()
+                    self._leases[account] += 1
+                    return service
+                loading = self._loading.get(account)
+                if loading is None:
+                    loading = self._loading[account] = Future()
+                    break
+            # Loaded by another request, which may have failed; lease it on the next pass
+            loading.result()
+
+        logger.info(f"Loading account {account}")
+        try:
+            service = EmailService(self.account_settings(account), embeddings=self.embeddings)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[account]
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[account]
+            self._services[account] = service
+            self._last_used[account] = time.monotonic()
+            self._leases[account] += 1
+        loading.set_result(service)
+        self._enforce_limits(keep=account)
+        return service
+
+    def _release(self, account: str) -> None:
+        with self._lock:
+            self._leases[account] -= 1
+            if self._leases[account]:
+                return
+            del self._leases[account]
+            self._last_used[account] = time.monotonic()
+            service = self._closing.pop(account, None)
+        if service is not None:
+            service.close()
+            logger.info(f"Closed evicted account {account}")
+
+    @contextmanager
+    def lease(self, account: str) -> Iterator[EmailService]:
+        """
+        Use the service of an account, loading it on first use. It is not closed
+        until the block exits.
+
+        Raises:
+            InvalidAccountError: If the account name is not a safe directory name
+        """
+        service = self._acquire(account)
+        try:
+            yield service
+        finally:
+            self._release(account)
+
+    def get(self, account: str) -> EmailService:
+        """
+        Get the service of an account, loading it on first use, without leasing
+        it: it may be evicted and closed at any time. Requests use lease().
+
+        Raises:
+            InvalidAccountError: If the account name is not a safe directory name
+        """
+        with self.lease(account) as service:
+            return service
+
+    def _usage(self) -> Dict[str, int]:
+        """
+        Estimate the memory of every loaded account without holding the lock,
+        the estimate walks every document and would stall all leases meanwhile.
+        """
+        with self._lock:
+            services = list(self._services.items())
+        return {account: service.approximate_memory_bytes() for account, service in services}
+
+    def _enforce_limits(self, keep: Optional[str] = None):
+        # Called when an account is loaded and periodically as indexes grow.
+        # Never evicts leased accounts, e.g. the one being served
+        with self._lock:
+            excess = len(self._services) - self.max_loaded_accounts
+            for account in [account for account in self._services if account not in self._leases][:max(excess, 0)]:
+                self._evict(account)
+        if self.memory_budget_bytes is None:
+            return
+        usage = self._usage()
+        with self._lock:
+            # Accounts loaded meanwhile are left to the limits enforced by their own load
+            total = sum(usage.get(account, 0) for account in self._services)
+            for account in list(self._services):
+                if total <= self.memory_budget_bytes:
+                    break
+                if account in usage and account not in self._leases:
+                    total -= usage[account]
+                    self._evict(account)
+        if keep in usage and total > self.memory_budget_bytes:
+            logger.warning(
+                f"Account {keep} alone needs {usage[keep]} bytes, over the "
+                f"{self.memory_budget_bytes} byte budget"
+            )
+
+    def _evict(self, account: str):
+        # Called with the lock held. A leased service is closed by its last release
+        service = self._services.pop(account)
+        self._last_used.pop(account, None)
+        self.evictions += 1
+        logger.info(f"Evicted account {account}")
+        if account in self._leases:
+            self._closing[account] = service
+        else:
+            service.close()
+
+    def evict(self, account: str) -> bool:
+        """Unload an account; it is reloaded from disk on next use."""
+        with self._lock:
+            if account not in self._services:
+                return False
+            self._evict(account)
+            return True
+
+    def evict_idle(self) -> int:
+        """
+        Unload accounts not used for `idle_timeout` seconds.
+
+        Returns:
+            int: Number of accounts evicted
+        """
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [
+                account for account, used in self._last_used.items()
+                if used < cutoff and account not in self._leases
+            ]
+            for account in idle:
+                self._evict(account)
+        return len(idle)
+
+    def _reap(self):
+        # At least a second between passes, a zero idle timeout must not spin
+        while not self._stop.wait(min(max(self.idle_timeout, 1.0), 60.0)):
+            try:
+                self.evict_idle()
+                self._enforce_limits()
+            except Exception as e:
+                logger.error(f"Failed to evict idle accounts: {e}", exc_info=True)
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            for account in list(self._services):
+                self._evict(account)
+
+    def stats(self) -> Dict[str, Any]:
+        usage = self._usage()
+        with self._lock:
+            now = time.monotonic()
+            loaded = {
+                account: {
+                    "memory_bytes": usage.get(account, 0),
+                    "idle_seconds": round(now - self._last_used[account], 1),
+                }
+                for account in self._services
+            }
+        return {
+            "loaded": loaded,
+            "max_loaded_accounts": self.max_loaded_accounts,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "evictions": self.evictions,
+        }
+
+
+def get_email_service(
+    account: Optional[str] = Header(None, alias="X-Email-Account"),
+    settings: Settings = Depends(get_settings)
+) -> Iterator[EmailService]:
+    """
+    Resolve the service of a request: the account named by the X-Email-Account
+    header, or the process-wide default mailbox when there is none. An account's
+    service is leased until the request is done.
+    """
+    if account is None:
+        yield EmailService.get_instance(settings)
+        return
+    with AccountManager.get_instance(settings).lease(account) as service:
+        yield service
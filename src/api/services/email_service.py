@@ -1,65 +1,416 @@
-from typing import Any, Dict, Optional
+import asyncio
+import hashlib
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional
 
 from fastapi import Depends
 
-from emails.email_indexer import EmailIndexingService
-from emails.email_searcher import EmailSearchSystem
+import metrics
+from emails.indexing_daemon import IndexingDaemon
+from emails.neighbor_graph import NeighborGraphUnavailable
+from emails.query_cache import LRUCache, normalize_query
+from emails.retention import RetentionPolicy, RetentionWorker
+from emails.snapshots import SnapshotSearchSystem, SnapshotStore
 from logging_config import setup_logging
 
 from ..core.config import Settings, get_settings
-from ..models.emails import SearchResponse
+from ..core.errors import ArticleNotFoundError, EmailAPIError, InvalidCursorError, NeighborGraphUnavailableError
+from ..core.responses import decode_cursor, encode_cursor, project_results
+from ..models.emails import MAX_SEARCH_RESULTS
+from .search_runner import SearchRunner
+
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
 
 logger = setup_logging(__name__)
 
+SERVING_ROLES = ("standalone", "writer", "reader")
+
+REQUEST_SECONDS = metrics.histogram(
+    "email_service_request_seconds", "Time spent serving a request", ["operation"]
+)
+INDEXED_ARTICLES = metrics.gauge("email_search_indexed_articles", "Articles in the index")
+INDEX_MEMORY_BYTES = metrics.gauge("email_search_index_memory_bytes", "Estimated memory held by the index")
+CACHE_ENTRIES = metrics.gauge("email_search_cache_entries", "Entries held by a cache", ["cache"])
+
+
+class RankedResults(NamedTuple):
+    """The results of a paged search ranked so far, and whether there are no more"""
+    results: List[Dict[str, Any]]
+    exhausted: bool
+
+
 class EmailService:
     _instance: Optional['EmailService'] = None
+    # The warmup and the first requests may race to create the instance
+    _instance_lock = threading.Lock()
     
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, embeddings: Optional["Embeddings"] = None):
+        # FAISS, LangChain and the Gmail client take seconds to import, so they are
+        # only imported once a service is created, in the warmup or on first use
+        from emails.email_indexer import EmailIndexingService
+        from emails.embedding_backends import create_embeddings
+
         logger.debug("Initializing EmailService")
         self.settings = settings
-        self.search_system = EmailSearchSystem(
-            base_dir=settings.base_dir,
-            model_name=settings.model_name
+        if settings.serving_role not in SERVING_ROLES:
+            raise ValueError(
+                f"Unknown serving role '{settings.serving_role}', expected one of {SERVING_ROLES}"
+            )
+        # One pooled client serves every index, shard and snapshot of this process
+        self.embeddings = embeddings or create_embeddings(
+            settings.embedding_backend,
+            model_name=settings.model_name,
+            base_url=settings.ollama_base_url,
+            timeout=settings.embedding_timeout,
+            max_connections=settings.embedding_max_connections,
+            batch_size=settings.embedding_batch_size
         )
-        self.indexing_service = EmailIndexingService(
-            search_system=self.search_system
+        self.snapshot_store = None
+        if settings.serving_role != "standalone":
+            self.snapshot_store = SnapshotStore(
+                settings.snapshot_dir or os.path.join(settings.base_dir, "snapshots")
+            )
+        
+        if settings.serving_role == "reader":
+            self.search_system = SnapshotSearchSystem(
+                self.snapshot_store,
+                open_snapshot=lambda path: self._create_search_system(path, read_only=True),
+                poll_interval=settings.snapshot_poll_interval
+            )
+            self.indexing_service = None
+        else:
+            if settings.bootstrap_export:
+                self._bootstrap(settings.bootstrap_export)
+            self.search_system = self._create_search_system(settings.base_dir)
+            self.indexing_service = EmailIndexingService(
+                cache_dir=settings.base_dir,
+                search_system=self.search_system,
+                user_credentials=settings.user_credentials,
+                retention_policy=RetentionPolicy(
+                    max_age_days=settings.retention_max_age_days,
+                    max_articles=settings.retention_max_articles,
+                    newsletter_max_age_days=settings.retention_newsletter_max_age_days
+                )
+            )
+            if self.snapshot_store is not None:
+                # Readers must never serve a state older than the writer's
+                self.snapshot_store.publish(self.search_system)
+        self.retention_worker = None
+        if self.indexing_service is not None and self.indexing_service.retention_policy.enabled:
+            self.retention_worker = RetentionWorker(
+                self.apply_retention, interval=settings.retention_interval
+            )
+        self.indexing_daemon = None
+        if self.indexing_service is not None and settings.indexing_queries:
+            self.indexing_daemon = IndexingDaemon(
+                self.index_batch,
+                settings.indexing_queries,
+                min_interval=settings.indexing_min_interval,
+                max_interval=settings.indexing_max_interval,
+                backoff=settings.indexing_backoff,
+                batch_size=settings.indexing_batch_size
+            )
+        self.search_runner = SearchRunner(
+            self.search_system,
+            max_workers=settings.search_workers,
+            max_in_flight=settings.max_in_flight_searches
         )
+        # Pages after the first are sliced from these, so they neither repeat
+        # nor skip results, by search id, see _search_id
+        self.ranked_results = LRUCache(settings.cursor_cache_size, name="cursor")
         logger.info("EmailService initialized successfully")
     
+    def _bootstrap(self, export_path: str):
+        """Import a portable export into an empty base directory, without re-embedding."""
+        from emails.index_export import import_index
+
+        base_dir = self.settings.base_dir
+        if any(os.path.exists(os.path.join(base_dir, name))
+               for name in ("faiss_index", "shards", "processed_emails.json")):
+            logger.debug(f"{base_dir} already holds an index, not bootstrapping")
+            return
+        logger.info(f"Bootstrapping {base_dir} from {export_path}")
+        import_index(export_path, base_dir, model_name=self.settings.model_name)
+
+    def _create_search_system(self, base_dir: str, read_only: bool = False):
+        from emails.email_searcher import EmailSearchSystem
+        from emails.sharded_searcher import ShardedEmailSearchSystem
+
+        search_kwargs = dict(
+            base_dir=base_dir,
+            model_name=self.settings.model_name,
+            embedding_cache_size=self.settings.embedding_cache_size,
+            result_cache_size=self.settings.result_cache_size,
+            vector_storage=self.settings.vector_storage,
+            rerank_factor=self.settings.rerank_factor,
+            neighbor_count=self.settings.neighbor_count,
+            read_only=read_only,
+            embeddings=self.embeddings
+        )
+        if not read_only and self.snapshot_store is not None:
+            # Snapshots published before the graph was built lack it
+            search_kwargs["on_neighbor_graph"] = self._publish_neighbor_graph
+        if self.settings.partition:
+            return ShardedEmailSearchSystem(
+                partition=self.settings.partition,
+                max_loaded_shards=self.settings.max_loaded_shards,
+                **search_kwargs
+            )
+        return EmailSearchSystem(**search_kwargs)
+    
+    def _publish_neighbor_graph(self):
+        # A graph built before the search system is returned is part of the
+        # first snapshot, published once the service is set up
+        search_system = getattr(self, "search_system", None)
+        if search_system is not None:
+            self.snapshot_store.publish(search_system)
+    
+    def close(self):
+        """Stop the background threads of this service."""
+        if self.indexing_daemon is not None:
+            self.indexing_daemon.close(timeout=5.0)
+        if self.retention_worker is not None:
+            self.retention_worker.close()
+        if isinstance(self.search_system, SnapshotSearchSystem):
+            self.search_system.close()
+        self.search_runner.close()
+        self.ranked_results.clear()
+    
     @classmethod
     def get_instance(cls, settings: Settings = Depends(get_settings)) -> 'EmailService':
         logger.debug("Getting EmailService instance")
-        if cls._instance is None:
-            logger.info("Creating new EmailService instance")
-            cls._instance = cls(settings)
-        return cls._instance
+        with cls._instance_lock:
+            if cls._instance is None:
+                logger.info("Creating new EmailService instance")
+                cls._instance = cls(settings)
+            return cls._instance
     
-    def search(self, query: str, limit: int = 5, min_score: float = 0.0) -> SearchResponse:
-        logger.info(f"Searching emails with query='{query}', limit={limit}, min_score={min_score}")
+    async def search(
+        self,
+        query: str,
+        limit: int = 5,
+        min_score: float = 0.0,
+        filters: Optional[Dict[str, Any]] = None,
+        mode: str = "vector",
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Search one page of results. The results of a paged search are ranked
+        once and cached, next_cursor pages through them while the index is
+        unchanged; the cached ranking is only extended, searching twice as deep,
+        when a page goes past its end.
+        
+        Returns:
+            Dict[str, Any]: A payload shaped like SearchResponse, left as plain
+                dicts so it can be serialized without validating every result
+        
+        Raises:
+            InvalidCursorError: If the cursor is malformed, belongs to another
+                search, was returned before the index changed or has expired
+        """
+        logger.debug(
+            "Searching emails with query='%s', limit=%d, min_score=%s, mode=%s", query, limit, min_score, mode
+        )
         
         try:
-            results = self.search_system.search(query, k=limit)
-            filtered_results = [
-                result for result in results 
-                if result.get("similarity_score", 0) >= min_score
-            ]
+            with REQUEST_SECONDS.labels(operation="search").time():
+                cursor_search_id, offset = decode_cursor(cursor)
+                end = min(offset + limit, MAX_SEARCH_RESULTS)
+                search_id = self._search_id(query, min_score, filters, mode, date_from, date_to)
+                if cursor_search_id is not None and cursor_search_id != search_id:
+                    # Another search's cursor, or the index changed since the previous page
+                    raise InvalidCursorError()
+                ranked = self.ranked_results.get(search_id)
+                if ranked is None and cursor_search_id is not None:
+                    raise InvalidCursorError()
+                
+                if ranked is None or (len(ranked.results) < end and not ranked.exhausted):
+                    k = end if ranked is None else min(max(end, 2 * len(ranked.results)), MAX_SEARCH_RESULTS)
+                    [results] = await self.search_runner.search_many(
+                        [query],
+                        k=k,
+                        min_score=min_score,
+                        filters=filters,
+                        mode=mode,
+                        date_from=date_from,
+                        date_to=date_to
+                    )
+                    exhausted = len(results) < k
+                    if ranked is not None:
+                        if self._search_id(query, min_score, filters, mode, date_from, date_to) != search_id:
+                            raise InvalidCursorError()
+                        # A deeper hybrid ranking can reorder results, keep the ones already ranked first
+                        seen = {result["id"] for result in ranked.results}
+                        results = ranked.results + [result for result in results if result["id"] not in seen]
+                    else:
+                        # The index may have changed during the search, bind the ranking to the newer version
+                        search_id = self._search_id(query, min_score, filters, mode, date_from, date_to)
+                    ranked = RankedResults(results, exhausted)
+                    self.ranked_results.put(search_id, ranked)
             
-            logger.debug(f"Found {len(filtered_results)} results after filtering")
+            logger.debug("Found %d results after filtering", len(ranked.results))
+            page = ranked.results[offset:end]
+            more = end < MAX_SEARCH_RESULTS and (len(ranked.results) > end or not ranked.exhausted)
             
-            return SearchResponse(
-                results=filtered_results,
-                total=len(filtered_results),
-                query=query
-            )
+            return {
+                "results": project_results(page, fields),
+                "total": len(page),
+                "query": query,
+                "next_cursor": encode_cursor(search_id, end) if more else None
+            }
+        except EmailAPIError:
+            raise
         except Exception as e:
             logger.error(f"Search failed: {str(e)}", exc_info=True)
             raise
     
+    def _search_id(
+        self,
+        query: str,
+        min_score: float,
+        filters: Optional[Dict[str, Any]],
+        mode: str,
+        date_from: Optional[str],
+        date_to: Optional[str]
+    ) -> str:
+        """Identify a search of the current index version, which the cursors of its pages are bound to."""
+        key = (
+            normalize_query(query),
+            min_score,
+            tuple(sorted(filters.items())) if filters else None,
+            mode,
+            date_from,
+            date_to,
+            self.search_system.index_version
+        )
+        return hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+    
+    async def search_many(
+        self,
+        queries: List[str],
+        limit: int = 5,
+        min_score: float = 0.0,
+        filters: Optional[Dict[str, Any]] = None,
+        mode: str = "vector",
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Search several queries at once.
+        
+        Returns:
+            Dict[str, Any]: A payload shaped like BatchSearchResponse
+        """
+        logger.debug("Searching emails with %d queries, limit=%d, min_score=%s", len(queries), limit, min_score)
+        
+        try:
+            with REQUEST_SECONDS.labels(operation="search_many").time():
+                all_results = await self.search_runner.search_many(
+                    queries,
+                    k=limit,
+                    min_score=min_score,
+                    filters=filters,
+                    mode=mode,
+                    date_from=date_from,
+                    date_to=date_to
+                )
+            
+            return {
+                "responses": [
+                    {
+                        "results": project_results(results, fields),
+                        "total": len(results),
+                        "query": query,
+                        "next_cursor": None
+                    }
+                    for query, results in zip(queries, all_results)
+                ],
+                "total": len(queries)
+            }
+        except EmailAPIError:
+            raise
+        except Exception as e:
+            logger.error(f"Batch search failed: {str(e)}", exc_info=True)
+            raise
+    
+    def related(
+        self,
+        article_id: str,
+        limit: int = 10,
+        min_score: float = 0.0,
+        fields: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Get the articles most similar to an indexed article, from the neighbor graph.
+        
+        Returns:
+            Dict[str, Any]: A payload shaped like SearchResponse, with the article
+                id as the query
+        
+        Raises:
+            ArticleNotFoundError: If no article has this id
+            NeighborGraphUnavailableError: While the neighbor graph is being built
+        """
+        logger.debug("Getting %d articles related to %s", limit, article_id)
+        with REQUEST_SECONDS.labels(operation="related").time():
+            try:
+                results = self.search_system.related(article_id, k=limit, min_score=min_score)
+            except NeighborGraphUnavailable:
+                raise NeighborGraphUnavailableError()
+        if results is None:
+            raise ArticleNotFoundError(article_id)
+        return {
+            "results": project_results(results, fields),
+            "total": len(results),
+            "query": article_id,
+            "next_cursor": None
+        }
+    
+    def near_duplicates(self, min_score: float = 0.9) -> Dict[str, Any]:
+        """
+        Group articles telling the same story, from the neighbor graph.
+        
+        Returns:
+            Dict[str, Any]: Clusters of articles, largest first, with their
+                id, title, newsletter type, date and link
+        
+        Raises:
+            NeighborGraphUnavailableError: While the neighbor graph is being built
+        """
+        logger.info(f"Clustering near-duplicate articles with min_score={min_score}")
+        with REQUEST_SECONDS.labels(operation="duplicates").time():
+            try:
+                clusters = self.search_system.near_duplicates(min_score=min_score)
+            except NeighborGraphUnavailable:
+                raise NeighborGraphUnavailableError()
+            metadata = self.search_system.article_metadata() if clusters else {}
+        keys = ("title", "newsletter_type", "date", "link")
+        return {
+            "clusters": [
+                [{"id": doc_id, **{key: metadata[doc_id].get(key) for key in keys}} for doc_id in cluster]
+                for cluster in clusters
+            ],
+            "total": len(clusters)
+        }
+    
     async def index_emails(self, query: str, max_results: int) -> Dict[str, Any]:
         logger.info(f"Indexing emails with query='{query}', max_results={max_results}")
         
+        if self.indexing_service is None:
+            return {
+                "status": "error",
+                "message": "This worker serves read-only snapshots, index emails on the writer"
+            }
+        
         try:
-            new_count = self.indexing_service.index_new_emails(query, max_results)
+            # Fetching, embedding and publishing block, keep them off the event loop
+            new_count = await asyncio.to_thread(self._index_new_emails, query, max_results)
             result = {
                 "status": "success",
                 "new_count": new_count,
@@ -75,6 +426,42 @@ class EmailService:
                 "message": str(e)
             } 
     
+    def _index_new_emails(self, query: str, max_results: int) -> int:
+        with REQUEST_SECONDS.labels(operation="index").time():
+            new_count = self.indexing_service.index_new_emails(query, max_results)
+        if new_count and self.snapshot_store is not None:
+            self.snapshot_store.publish(self.search_system)
+        return new_count
+    
+    def index_batch(self, query: str, max_results: int, max_new: Optional[int] = None) -> Dict[str, int]:
+        """
+        Index one batch for the indexing daemon, publishing a new snapshot if
+        anything was added.
+        
+        Returns:
+            Dict[str, int]: Counts of listed and indexed emails, see EmailIndexingService.index_batch
+        """
+        with REQUEST_SECONDS.labels(operation="index_batch").time():
+            result = self.indexing_service.index_batch(query, max_results, max_new)
+        if result["new_articles"] and self.snapshot_store is not None:
+            self.snapshot_store.publish(self.search_system)
+        return result
+    
+    def apply_retention(self) -> int:
+        """
+        Delete articles expired by the retention policy, publishing a new snapshot
+        if any were deleted.
+        
+        Returns:
+            int: Number of articles deleted
+        """
+        if self.indexing_service is None:
+            return 0
+        deleted = self.indexing_service.apply_retention()
+        if deleted and self.snapshot_store is not None:
+            self.snapshot_store.publish(self.search_system)
+        return deleted
+    
     def get_total_articles(self) -> int:
         """
         Get the total number of indexed articles.
@@ -83,4 +470,42 @@ class EmailService:
             int: Total number of articles in the search system
         """
         logger.info("Getting total number of indexed articles")
-        return self.search_system.get_total_articles()
\ No newline at end of file
+        return self.search_system.get_total_articles()
+
+    def approximate_memory_bytes(self) -> int:
+        """
+        Estimate the memory held by the indexes of this service.
+        
+        Returns:
+            int: Estimated size in bytes
+        """
+        return self.search_system.approximate_memory_bytes()
+
+    def collect_metrics(self):
+        """
+        Refresh the gauges that are read from the search system when metrics are
+        scraped. Unloaded shards are counted from their saved index headers and
+        not loaded, but this still walks the documents of the loaded index, so
+        call it off the event loop.
+        """
+        INDEXED_ARTICLES.set(self.search_system.get_total_articles())
+        INDEX_MEMORY_BYTES.set(self.approximate_memory_bytes())
+        for name, stats in self.search_system.get_cache_stats().items():
+            if name.endswith("_cache"):
+                CACHE_ENTRIES.labels(cache=name[:-len("_cache")]).set(stats["size"])
+        CACHE_ENTRIES.labels(cache="cursor").set(len(self.ranked_results))
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get hit-rate and eviction statistics of the search caches.
+        
+        Returns:
+            Dict[str, Any]: Index version, embedding/result/cursor cache counters
+                and in-flight, coalesced and rejected search counts
+        """
+        logger.info("Getting search cache statistics")
+        return {
+            **self.search_system.get_cache_stats(),
+            "cursor_cache": self.ranked_results.stats(),
+            "search_runner": self.search_runner.stats()
+        }
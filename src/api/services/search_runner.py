@@ -0,0 +1,113 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Tuple
+
+import metrics
+import tracing
+from emails.query_cache import normalize_query
+from logging_config import setup_logging
+
+from ..core.errors import ServiceOverloadedError
+
+logger = setup_logging(__name__)
+
+SEARCHES_REJECTED = metrics.counter("email_service_searches_rejected", "Searches shed with a 503")
+SEARCHES_COALESCED = metrics.counter(
+    "email_service_searches_coalesced", "Searches served by an identical in-flight one"
+)
+
+
+class SearchRunner:
+    """
+    Runs searches for async request handlers without blocking the event loop.
+
+    Query embeddings are awaited through the async embedding client, then the CPU
+    bound FAISS/BM25 part runs on a bounded thread pool. Identical searches already
+    in flight are coalesced onto one computation, and once `max_in_flight` distinct
+    searches are running new ones are rejected with a 503 instead of queueing up.
+    """
+
+    def __init__(self, search_system: Any, max_workers: int = 4, max_in_flight: int = 64):
+        """
+        Args:
+            search_system: Search system with `aembed_queries` and a `search_many`
+                taking the awaited `query_vectors`
+            max_workers: Threads running the index part of searches
+            max_in_flight: Distinct searches admitted at once, waiting or running
+        """
+        self.search_system = search_system
+        self.max_in_flight = max_in_flight
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search")
+        self._in_flight: Dict[Tuple, asyncio.Task] = {}
+        self._coalesced = 0
+        self._rejected = 0
+
+    @staticmethod
+    def _key(queries: List[str], kwargs: Dict[str, Any]) -> Tuple:
+        filters = kwargs.get("filters")
+        return (
+            tuple(normalize_query(query) for query in queries),
+            tuple(sorted((name, value) for name, value in kwargs.items() if name != "filters")),
+            tuple(sorted(filters.items())) if filters else None,
+        )
+
+    async def search_many(self, queries: List[str], **kwargs) -> List[List[Dict]]:
+        """
+        Search like `search_system.search_many(queries, **kwargs)`.
+
+        Raises:
+            ServiceOverloadedError: If `max_in_flight` searches are already running
+        """
+        key = self._key(queries, kwargs)
+        task = self._in_flight.get(key)
+        if task is not None:
+            self._coalesced += 1
+            SEARCHES_COALESCED.inc()
+            logger.debug("Coalescing search for %d queries onto an in-flight one", len(queries))
+        elif len(self._in_flight) >= self.max_in_flight:
+            self._rejected += 1
+            SEARCHES_REJECTED.inc()
+            logger.warning(f"Rejecting search, {len(self._in_flight)} searches in flight")
+            raise ServiceOverloadedError()
+        else:
+            task = asyncio.ensure_future(self._run(queries, kwargs))
+            self._in_flight[key] = task
+            task.add_done_callback(partial(self._finished, key))
+
+        # Shielded, so a client disconnecting never cancels a search others wait on
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Tuple, task: asyncio.Task):
+        del self._in_flight[key]
+        if not task.cancelled():
+            # Mark any error retrieved, every waiter may have gone away
+            task.exception()
+
+    async def _run(self, queries: List[str], kwargs: Dict[str, Any]) -> List[List[Dict]]:
+        if kwargs.get("mode", "vector") != "lexical":
+            try:
+                # Passed to the search below, so it only touches the index
+                with tracing.span("search.embed"):
+                    vectors = await self.search_system.aembed_queries([normalize_query(query) for query in queries])
+                if len(vectors) == len(queries):
+                    kwargs = {**kwargs, "query_vectors": vectors}
+            except Exception as e:
+                logger.warning(f"Async query embedding failed: {str(e)}")
+        # Run in a copy of the context so a traced request keeps its trace in the executor
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            partial(contextvars.copy_context().run, self.search_system.search_many, queries, **kwargs)
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._in_flight),
+            "max_in_flight": self.max_in_flight,
+            "coalesced": self._coalesced,
+            "rejected": self._rejected,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional
+
+import metrics
+from logging_config import setup_logging
+
+from ..core.config import Settings
+from .email_service import EmailService
+
+logger = setup_logging(__name__)
+
+WARMUP_STATES = ("pending", "warming", "ready", "failed")
+
+COLD_START_SECONDS = metrics.gauge(
+    "email_service_cold_start_seconds", "Time spent per warmup stage at startup", ["stage"]
+)
+
+
+class Warmup:
+    """
+    Prepare the default email service in the background once the API starts.
+
+    Loading the index and the embedding model happens here rather than inside the
+    first request; requests arriving meanwhile wait for the same service to be
+    created. A failed embedding pre-warm is recorded but does not fail the warmup,
+    lexical searches still work and the client retries on the next request.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.state = "pending"
+        self.stages: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.duration: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def _stage(self, name: str, step: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            return step()
+        finally:
+            self.stages[name] = round(time.perf_counter() - start, 3)
+            COLD_START_SECONDS.labels(stage=name).set(self.stages[name])
+
+    def run_sync(self):
+        """Create the default service, then load the embedding model with one request."""
+        service = self._stage("service", lambda: EmailService.get_instance(self.settings))
+        try:
+            self._stage("embeddings", lambda: service.embeddings.embed_query("warmup"))
+        except Exception as e:
+            self.errors["embeddings"] = str(e)
+            logger.warning(f"Embedding pre-warm failed, vector searches will retry: {e}")
+
+    async def run(self):
+        self.state = "warming"
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.run_sync)
+        except Exception as e:
+            self.state = "failed"
+            self.errors["service"] = str(e)
+            logger.error(f"Warmup failed: {e}", exc_info=True)
+            return
+        self.duration = round(time.perf_counter() - start, 3)
+        COLD_START_SECONDS.labels(stage="total").set(self.duration)
+        self.state = "ready"
+        if self.duration > self.settings.cold_start_budget:
+            logger.warning(
+                f"Warmup took {self.duration}s, over the {self.settings.cold_start_budget}s "
+                f"cold start budget: {self.stages}"
+            )
+        else:
+            logger.info(f"Warmup finished in {self.duration}s: {self.stages}")
+
+    def skip(self):
+        """Serve without warming up, the service is then created by the first request."""
+        self.state = "ready"
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "status": self.state,
+            "duration": self.duration,
+            "budget": self.settings.cold_start_budget,
+            "stages": self.stages,
+            "errors": self.errors,
+        }
@@ -0,0 +1,237 @@
+"""
+Bulk import of newsletters from local mail archives, without the Gmail API.
+
+Reads mbox files (e.g. from Google Takeout), Maildir directories, single `.eml`
+files and directories of `.eml` files. Messages are streamed from disk; bodies are
+extracted with the same rules as EmailFetcher.get_body and parsed in a pool of
+processes, while the previous chunk is embedded and indexed.
+
+Archived emails are identified by their Message-ID header, as Gmail API IDs are
+not part of exported messages, and are skipped when already in processed_emails.
+The indexer records the Message-ID of fetched emails there too, so an archive
+overlapping mail indexed from Gmail only adds what Gmail did not.
+
+    PYTHONPATH=src python -m emails.archive_import takeout/TLDR.mbox --base-dir .email_search
+"""
+
+import argparse
+import hashlib
+import mailbox
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import timezone
+from email.parser import BytesHeaderParser, BytesParser
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import metrics
+import tracing
+from logging_config import setup_logging
+
+from .article import Article
+from .mime import extract_message_body, parse_message_id
+from .parsers.tldr_content_parser import TLDRContentParser
+
+logger = setup_logging(__name__)
+
+ARCHIVE_MESSAGES = metrics.counter(
+    "email_archive_messages", "Archived messages read by the bulk importer", ["outcome"]
+)
+
+_header_parser = BytesHeaderParser()
+_parser: Optional[TLDRContentParser] = None
+
+
+def iter_archive(path: str) -> Iterator[bytes]:
+    """
+    Stream the raw messages of an archive.
+
+    Args:
+        path: An mbox file, a `.eml` file, a Maildir directory or a directory
+            searched recursively for `.eml` files
+
+    Returns:
+        Iterator[bytes]: Each message as read from disk
+    """
+    if os.path.isfile(path):
+        if path.lower().endswith(".eml"):
+            with open(path, "rb") as f:
+                yield f.read()
+            return
+        archive = mailbox.mbox(path, create=False)
+    elif all(os.path.isdir(os.path.join(path, name)) for name in ("cur", "new", "tmp")):
+        archive = mailbox.Maildir(path, factory=None, create=False)
+    elif os.path.isdir(path):
+        for root, _, names in os.walk(path):
+            for name in sorted(names):
+                if name.lower().endswith(".eml"):
+                    with open(os.path.join(root, name), "rb") as f:
+                        yield f.read()
+        return
+    else:
+        raise FileNotFoundError(f"No mail archive at {path}")
+
+    try:
+        for key in archive.iterkeys():
+            yield archive.get_bytes(key)
+    finally:
+        archive.close()
+
+
+def message_id(raw: bytes) -> str:
+    """The Message-ID of a raw message, or a digest of its bytes when it has none."""
+    headers = _header_parser.parsebytes(raw)
+    return parse_message_id(headers.get("Message-ID")) or hashlib.sha256(raw).hexdigest()
+
+
+def _message_date(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.astimezone(timezone.utc).isoformat()
+
+
+def parse_message(raw: bytes) -> Tuple[str, List[Article]]:
+    """
+    Extract the articles of one raw message, stamped with its ID and date.
+
+    Runs in worker processes, each building the content parser once.
+    """
+    global _parser
+    if _parser is None:
+        _parser = TLDRContentParser()
+    message = BytesParser().parsebytes(raw)
+    email_id = message_id(raw)
+    body = extract_message_body(message)
+    if not body:
+        return email_id, []
+    date = _message_date(message.get("Date"))
+    articles = _parser.parse_content(body)
+    for article in articles:
+        article.email_id = email_id
+        article.message_id = email_id
+        article.date = date
+    return email_id, articles
+
+
+def _parse_chunk(chunk: List[bytes]) -> List[Tuple[str, List[Article]]]:
+    return [parse_message(raw) for raw in chunk]
+
+
+class ArchiveImporter:
+    """
+    Index local archives through an EmailIndexingService, at local disk speed.
+    """
+
+    def __init__(self, indexing_service, workers: Optional[int] = None, chunk_size: int = 200):
+        """
+        Args:
+            indexing_service: EmailIndexingService whose search system, retention
+                policy and processed emails are used
+            workers: Processes parsing messages, defaults to the number of CPUs
+            chunk_size: Messages parsed, and then indexed, together
+        """
+        self.indexing_service = indexing_service
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    def _chunks(self, paths: List[str], stats: Dict[str, int]) -> Iterator[List[bytes]]:
+        """Unprocessed raw messages in chunks, also skipping repeats within the archives."""
+        seen = set()
+        chunk = []
+        for path in paths:
+            logger.info(f"Reading {path}")
+            for raw in iter_archive(path):
+                stats["messages"] += 1
+                email_id = message_id(raw)
+                if (
+                    email_id in seen
+                    or email_id in self.indexing_service.processed_emails
+                    or email_id in self.indexing_service.expired_emails
+                ):
+                    stats["skipped"] += 1
+                    ARCHIVE_MESSAGES.labels(outcome="skipped").inc()
+                    continue
+                seen.add(email_id)
+                chunk.append(raw)
+                if len(chunk) == self.chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    def _index(self, parsed: List[Tuple[str, List[Article]]], stats: Dict[str, int]):
+        articles = [article for _, email_articles in parsed for article in email_articles]
+        articles, expired_emails = self.indexing_service.drop_expired(articles)
+        with tracing.span("archive.index"):
+            stats["articles"] += self.indexing_service.search_system.add_articles(articles)
+        # Messages without articles are recorded too, they would not yield any next time
+        self.indexing_service.mark_processed(
+            email_id for email_id, _ in parsed if email_id not in expired_emails
+        )
+        stats["imported"] += len(parsed)
+        ARCHIVE_MESSAGES.labels(outcome="imported").inc(len(parsed))
+        logger.info(f"Indexed {stats['articles']} articles from {stats['imported']} archived emails so far")
+
+    def run(self, paths: List[str]) -> Dict[str, float]:
+        """
+        Import every message of the archives that was not indexed yet.
+
+        While one chunk is embedded and indexed, the next ones are parsed, with
+        up to one chunk per worker in flight.
+
+        Returns:
+            Dict[str, float]: Counts of messages read, skipped as already
+                processed and imported, articles indexed, and the seconds taken
+        """
+        stats = {"messages": 0, "skipped": 0, "imported": 0, "articles": 0}
+        start = time.perf_counter()
+        pending: List[Future] = []
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for chunk in self._chunks(paths, stats):
+                pending.append(executor.submit(_parse_chunk, chunk))
+                if len(pending) > self.workers:
+                    self._index(pending.pop(0).result(), stats)
+            for future in pending:
+                self._index(future.result(), stats)
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        logger.info(f"Archive import finished: {stats}")
+        return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index newsletters from local mbox, Maildir or .eml archives")
+    parser.add_argument("paths", nargs="+", help="mbox files, Maildir directories, .eml files or directories")
+    parser.add_argument("--base-dir", default=".email_search")
+    parser.add_argument("--model-name", default="mxbai-embed-large")
+    parser.add_argument("--partition", choices=("month", "newsletter"))
+    parser.add_argument("--workers", type=int, help="Parsing processes, defaults to the number of CPUs")
+    parser.add_argument("--chunk-size", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    from .email_indexer import EmailIndexingService
+    from .email_searcher import EmailSearchSystem
+    from .sharded_searcher import ShardedEmailSearchSystem
+
+    if args.partition:
+        search_system = ShardedEmailSearchSystem(
+            base_dir=args.base_dir, model_name=args.model_name, partition=args.partition
+        )
+    else:
+        search_system = EmailSearchSystem(base_dir=args.base_dir, model_name=args.model_name)
+    indexing_service = EmailIndexingService(cache_dir=args.base_dir, search_system=search_system)
+    stats = ArchiveImporter(indexing_service, workers=args.workers, chunk_size=args.chunk_size).run(args.paths)
+    print(
+        f"Imported {stats['imported']} of {stats['messages']} emails "
+        f"({stats['skipped']} already indexed), {stats['articles']} articles in {stats['seconds']}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
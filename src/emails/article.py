@@ -0,0 +1,78 @@
+from typing import Any, Dict, Mapping, Optional
+
+METADATA_FIELDS = (
+    "title", "section", "reading_time", "newsletter_type", "link", "email_id", "date", "message_id"
+)
+
+
+class Article:
+    """
+    A parsed newsletter article, from the content parser through to the index.
+
+    Articles are slotted, so they take a fraction of the memory of a dict during
+    large backfills. The embedding text is built on demand rather than stored, and
+    articles also support read-only mapping access, e.g. `article["title"]` and
+    `article.get("date")`, for code written against plain dict articles.
+    """
+
+    __slots__ = ("title", "content") + METADATA_FIELDS[1:]
+
+    def __init__(
+        self,
+        title: str,
+        content: str,
+        section: Optional[str] = "",
+        reading_time: Optional[int] = None,
+        newsletter_type: Optional[str] = "",
+        link: Optional[str] = "",
+        email_id: Optional[str] = None,
+        date: Optional[str] = None,
+        message_id: Optional[str] = None
+    ):
+        self.title = title
+        self.content = content
+        self.section = section
+        self.reading_time = reading_time
+        self.newsletter_type = newsletter_type
+        self.link = link
+        self.email_id = email_id
+        self.date = date
+        self.message_id = message_id
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "Article":
+        """Build an article from a dict with at least a title and content."""
+        if isinstance(data, Article):
+            return data
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+    @property
+    def text(self) -> str:
+        """The text that is embedded and stored in the index for this article."""
+        return f"Title: {self.title}\n\nContent: {self.content}"
+
+    def metadata(self) -> Dict[str, Any]:
+        """The metadata stored alongside the article's vector."""
+        return {name: getattr(self, name) for name in METADATA_FIELDS}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Article):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"Article(title={self.title!r}, email_id={self.email_id!r}, date={self.date!r})"
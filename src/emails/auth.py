@@ -1,10 +1,6 @@
 import os
 import pickle
 
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-
 from logging_config import setup_logging
 
 logger = setup_logging(__name__)
@@ -20,6 +16,11 @@ class LocalAuth:
         self.service = self.get_service()
 
     def get_service(self):
+        # The Google client libraries are slow to import and only needed to fetch
+        from google.auth.transport.requests import Request
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from googleapiclient.discovery import build
+
         creds = self._read_token(self.user_credentials)
 
         if not creds or not creds.valid:
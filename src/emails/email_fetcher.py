@@ -1,12 +1,21 @@
-import base64
-from typing import Dict, List
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 
+import metrics
+import tracing
+from emails.article import Article
 from emails.auth import LocalAuth
+from emails.mime import extract_body, get_header, parse_message_id
 from emails.parsers.content_parser_interface import ContentParserInterface
 from logging_config import setup_logging
 
 logger = setup_logging(__name__)
 
+FETCH_STAGE_SECONDS = metrics.histogram(
+    "email_fetch_stage_seconds", "Time spent per Gmail request or decode step", ["stage"]
+)
+EMAILS_FETCHED = metrics.counter("email_fetch_emails", "Emails downloaded and decoded")
+
 
 class EmailFetcher:
     """
@@ -17,6 +26,7 @@ class EmailFetcher:
         self,
         user_credentials: str = "secrets/user_token.pickle",
         app_credentials: str = "secrets/app_credentials.json",
+        service=None,
     ):
         """
         Constructs all the necessary attributes for the EmailFetcher object.
@@ -24,9 +34,14 @@ class EmailFetcher:
         Args:
             user_credentials (str): Path to the token pickle file.
             app_credentials (str): Path to the client secret JSON file.
+            service: An already built Gmail API service, e.g. one pointed at a
+                stand-in server, used instead of authenticating.
         """
-        self.auth = LocalAuth(user_credentials, app_credentials)
-        self.service = self.auth.service
+        self.auth = None
+        if service is None:
+            self.auth = LocalAuth(user_credentials, app_credentials)
+            service = self.auth.service
+        self.service = service
 
     def fetch_emails(self, query: str, max_results: int = None) -> List[Dict]:
         """
@@ -43,8 +58,9 @@ class EmailFetcher:
         request = self.service.users().messages().list(userId="me", q=query)
 
         while request is not None:
-            response = request.execute()
-            logger.log(1, f"Response: {response}")
+            with FETCH_STAGE_SECONDS.labels(stage="list").time(), tracing.span("fetch.list"):
+                response = request.execute()
+            logger.log(1, "Response: %s", response)
             all_emails.extend(response.get("messages", []))
             logger.info(f"Fetched {len(all_emails)} emails so far.")
 
@@ -53,7 +69,7 @@ class EmailFetcher:
                 break
 
             request = self.service.users().messages().list_next(request, response)
-            logger.log(1, f"Next request: {request}")
+            logger.log(1, "Next request: %s", request)
 
         return all_emails[:max_results]
 
@@ -67,8 +83,9 @@ class EmailFetcher:
         Returns:
             The email data.
         """
-        logger.debug(f"Retrieving data for email ID: {email_id}")
-        return self.service.users().messages().get(userId="me", id=email_id).execute()
+        logger.debug("Retrieving data for email ID: %s", email_id)
+        with FETCH_STAGE_SECONDS.labels(stage="get").time(), tracing.span("fetch.get"):
+            return self.service.users().messages().get(userId="me", id=email_id).execute()
 
     def fetch_labels(self) -> List[Dict]:
         """
@@ -103,38 +120,81 @@ class EmailFetcher:
         logger.error(f"No label found with the name {label_name}")
         raise ValueError(f"No label found with the name {label_name}")
 
+    def get_attachment_data(self, email_id: str, attachment_id: str) -> str:
+        """
+        Downloads the base64url data of an attachment, or of a body too large to
+        be included in the message.
+
+        Args:
+            email_id: The email ID.
+            attachment_id: The attachment ID from the message part.
+
+        Returns:
+            The attachment data.
+        """
+        logger.debug("Retrieving attachment %s of email ID: %s", attachment_id, email_id)
+        with FETCH_STAGE_SECONDS.labels(stage="attachment").time(), tracing.span("fetch.attachment"):
+            return self.service.users().messages().attachments().get(
+                userId="me", messageId=email_id, id=attachment_id
+            ).execute()["data"]
+
     def get_body(self, email_data: Dict) -> str:
-        """Extract the email body from the email data."""
+        """
+        Extract the email body from the email data.
+
+        The plain text part is preferred over HTML anywhere in nested multiparts,
+        only the chosen part is decoded, with its declared charset.
+        """
         logger.debug("Extracting and decoding email body")
         
         try:
-            # Get the message payload
-            payload = email_data['payload']
-            
-            # For simple messages
-            if 'body' in payload and 'data' in payload['body']:
-                return base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
-            
-            # For multipart messages
-            if 'parts' in payload:
-                # Get the first text part (usually the email body)
-                for part in payload['parts']:
-                    if part.get('mimeType', '').startswith('text/'):
-                        if 'data' in part['body']:
-                            return base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-            
-            logger.warning("No readable content found in email")
-            return ""
-            
+            body = extract_body(
+                email_data['payload'],
+                lambda attachment_id: self.get_attachment_data(email_data['id'], attachment_id)
+            )
         except Exception as e:
             logger.error(f"Failed to extract email body: {e}")
             return ""
+        if body is None:
+            logger.warning("No readable content found in email")
+            return ""
+        return body
+
+    def get_email_date(self, email_data: Dict) -> Optional[str]:
+        """
+        Get the date the email was received as an ISO 8601 UTC timestamp.
+
+        Args:
+            email_data: The email data, carrying Gmail's millisecond `internalDate`.
+
+        Returns:
+            The timestamp, or None if the email has no internal date.
+        """
+        internal_date = email_data.get("internalDate")
+        if internal_date is None:
+            return None
+        return datetime.fromtimestamp(int(internal_date) / 1000, tz=timezone.utc).isoformat()
+
+    def get_message_id(self, email_data: Dict) -> Optional[str]:
+        """
+        Get the Message-ID header of an email, which identifies it in exported
+        archives too, unlike the Gmail ID.
+
+        Args:
+            email_data: The email data.
+
+        Returns:
+            The Message-ID without angle brackets, or None if the email has none.
+        """
+        return parse_message_id(get_header(email_data.get("payload", {}), "Message-ID"))
 
     def get_articles_from_emails(
         self, emails: List[Dict], content_parser: ContentParserInterface
-    ) -> List:
+    ) -> List[Article]:
         """
         Extracts articles from a list of emails using a specific content parser.
+        Each article is stamped with the ID, Message-ID and date of the email it
+        came from, and the Message-ID is also set as `message_id` on the emails.
 
         Args:
             emails: The list of emails.
@@ -146,7 +206,15 @@ class EmailFetcher:
         articles = []
         for email in emails:
             email_data = self.get_email_data(email["id"])
-            content = self.get_body(email_data)
-            articles += content_parser.parse_content(content)
+            with FETCH_STAGE_SECONDS.labels(stage="decode").time(), tracing.span("fetch.decode"):
+                content = self.get_body(email_data)
+            date = self.get_email_date(email_data)
+            email["message_id"] = self.get_message_id(email_data)
+            EMAILS_FETCHED.inc()
+            for article in content_parser.parse_content(content):
+                article.email_id = email["id"]
+                article.message_id = email["message_id"]
+                article.date = date
+                articles.append(article)
         logger.info(f"Extracted {len(articles)} articles from emails.")
         return articles
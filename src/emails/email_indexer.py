@@ -1,27 +1,52 @@
 import json
+import threading
 from pathlib import Path
-from typing import Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from logging_config import setup_logging
 
+from .article import Article
 from .email_fetcher import EmailFetcher
 from .email_searcher import EmailSearchSystem
 from .parsers.tldr_content_parser import TLDRContentParser
+from .retention import RetentionPolicy, apply_retention
 
 logger = setup_logging(__name__)
 
 
 class EmailIndexingService:
-    def __init__(self, cache_dir: str = ".email_search", search_system: EmailSearchSystem = None):
+    def __init__(
+        self,
+        cache_dir: str = ".email_search",
+        search_system: EmailSearchSystem = None,
+        retention_policy: Optional[RetentionPolicy] = None,
+        user_credentials: str = "secrets/user_token.pickle",
+        email_fetcher: Optional[EmailFetcher] = None
+    ):
         self.cache_dir = Path(cache_dir)
-        self.cache_dir.mkdir(exist_ok=True)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
         self.processed_emails_path = self.cache_dir / "processed_emails.json"
         self.processed_emails: Set[str] = self._load_processed_emails()
+        # Emails whose articles had all expired, skipped like processed ones but
+        # not persisted, see drop_expired
+        self.expired_emails: Set[str] = set()
+        # Guards processed_emails, retention runs on a background thread
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self.retention_policy = retention_policy or RetentionPolicy()
         
-        self.email_fetcher = EmailFetcher()
+        # Gmail is only authenticated on first fetch, searching needs no token
+        self.user_credentials = user_credentials
+        self._email_fetcher: Optional[EmailFetcher] = email_fetcher
         self.content_parser = TLDRContentParser()
         self.search_system = search_system if search_system else EmailSearchSystem()
     
+    @property
+    def email_fetcher(self) -> EmailFetcher:
+        if self._email_fetcher is None:
+            self._email_fetcher = EmailFetcher(user_credentials=self.user_credentials)
+        return self._email_fetcher
+    
     def _load_processed_emails(self) -> Set[str]:
         logger.debug(f"Loading processed emails from {self.processed_emails_path}")
         if self.processed_emails_path.exists():
@@ -49,35 +74,122 @@ class EmailIndexingService:
         logger.info(f"Starting email indexing with query='{query}', max_results={max_results}")
         
         try:
+            return self.index_batch(query, max_results)["new_articles"]
+        except Exception as e:
+            logger.error(f"Failed to index new emails: {e}", exc_info=True)
+            return 0
+
+    def index_batch(self, query: str, max_results: int = 100, max_new: Optional[int] = None) -> Dict[str, int]:
+        """
+        List up to `max_results` emails matching `query` and index the unprocessed ones.
+
+        Runs are serialized, so a scheduled run and a requested one never index
+        the same email twice.
+
+        Args:
+            query: Gmail search query
+            max_results: Emails to list, newest first
+            max_new: Index at most this many of the unprocessed emails, the rest
+                are left for the next batch
+
+        Returns:
+            Dict[str, int]: Emails `listed`, `unprocessed` among them, `new_emails`
+                handled by this batch, including those whose articles had all
+                expired, and `new_articles` added to the index
+
+        Raises:
+            Exception: Gmail, parsing and embedding errors are left to the caller
+        """
+        with self._index_lock:
             emails = self.email_fetcher.fetch_emails(query, max_results)
             logger.debug(f"Fetched {len(emails)} total emails")
             
             new_emails = []
             for email in emails:
                 email_id = email["id"]
-                if email_id not in self.processed_emails:
+                if email_id not in self.processed_emails and email_id not in self.expired_emails:
                     new_emails.append(email)
                 else:
-                    logger.debug(f"Skipping already processed email {email_id}")
+                    logger.debug("Skipping already processed email %s", email_id)
             
             logger.info(f"Found {len(new_emails)} new unprocessed emails")
+            result = {"listed": len(emails), "unprocessed": len(new_emails), "new_emails": 0, "new_articles": 0}
+            new_emails = new_emails[:max_new]
             
             if not new_emails:
                 logger.info("No new emails to process")
-                return 0
+                return result
             
             logger.debug("Extracting articles from emails")
             articles = self.email_fetcher.get_articles_from_emails(new_emails, self.content_parser)
             logger.info(f"Extracted {len(articles)} articles from {len(new_emails)} emails")
             
-            new_count = self.search_system.add_articles(articles)
+            # Emails imported from an archive were recorded by their Message-ID
+            imported = {email["id"] for email in new_emails if email.get("message_id") in self.processed_emails}
+            if imported:
+                logger.info(f"Skipping {len(imported)} emails already imported from an archive")
+                articles = [article for article in articles if article.email_id not in imported]
             
-            self.processed_emails.update(email["id"] for email in new_emails)
-            self._save_processed_emails()
+            articles, expired_emails = self.drop_expired(articles)
+            new_count = self.search_system.add_articles(articles)
+            # Recording Message-IDs too lets archive imports skip these emails
+            self.mark_processed(
+                email_id for email in new_emails if email["id"] not in expired_emails
+                for email_id in (email["id"], email.get("message_id")) if email_id
+            )
             
             logger.info(f"Successfully indexed {new_count} new articles")
-            return new_count
-            
-        except Exception as e:
-            logger.error(f"Failed to index new emails: {e}", exc_info=True)
-            return 0
\ No newline at end of file
+            return {**result, "new_emails": len(new_emails), "new_articles": new_count}
+
+    def drop_expired(self, articles: List[Article]) -> Tuple[List[Article], Set[str]]:
+        """
+        Drop articles already past the retention policy before they are indexed.
+
+        Returns:
+            The articles to index, and the IDs of emails whose articles all expired.
+            Those are not recorded as processed, retention would otherwise never
+            prune them from processed_emails, but added to expired_emails so they
+            are not fetched again by this process
+        """
+        if not self.retention_policy.enabled:
+            return articles, set()
+        kept = [article for article in articles if not self.retention_policy.is_expired(article)]
+        kept_emails = {article.get("email_id") for article in kept}
+        expired_emails = {article.get("email_id") for article in articles} - kept_emails
+        with self._lock:
+            self.expired_emails.update(expired_emails)
+        if len(kept) < len(articles):
+            logger.info(f"Skipping {len(articles) - len(kept)} articles past retention")
+        return kept, expired_emails
+
+    def mark_processed(self, email_ids: Iterable[str]):
+        """Record emails as indexed, so they are skipped from now on."""
+        with self._lock:
+            self.processed_emails.update(email_ids)
+            self._save_processed_emails()
+
+    def apply_retention(self) -> int:
+        """
+        Delete expired articles from the index and forget the emails they came from.
+
+        Only emails of articles that aged out are forgotten, since index_new_emails
+        skips them if they are fetched again; emails of articles deleted to stay under
+        max_articles stay recorded so they are not re-indexed.
+
+        Returns:
+            int: Number of articles deleted
+        """
+        if not self.retention_policy.enabled:
+            return 0
+        deleted = apply_retention(self.search_system, self.retention_policy)
+        aged_out = {
+            email_id for metadata in deleted if self.retention_policy.is_expired(metadata)
+            for email_id in (metadata.get("email_id"), metadata.get("message_id"))
+        }
+        aged_out.discard(None)
+        if aged_out:
+            with self._lock:
+                self.processed_emails.difference_update(aged_out)
+                self._save_processed_emails()
+            logger.info(f"Pruned {len(aged_out)} expired emails from processed emails")
+        return len(deleted)
@@ -1,18 +1,193 @@
+import json
+import logging
 import os
-from typing import Dict, List
+import pickle
+import shutil
+import threading
+import uuid
+from typing import (Any, Callable, Dict, List, NamedTuple, Optional, Tuple,
+                    Union)
 
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-from langchain_ollama import OllamaEmbeddings
+from langchain_core.embeddings import Embeddings
 
+import metrics
+import tracing
 from logging_config import setup_logging
 
+from .article import Article
+from .embedding_backends import create_embeddings
+from .lexical_index import BM25Index, CorpusStats
+from .neighbor_graph import NeighborGraph, NeighborGraphUnavailable
+from .query_cache import LRUCache, normalize_query
+from .vector_storage import (VECTOR_STORAGES, ExactVectorStore, build_index,
+                             min_training_vectors, needs_retraining,
+                             reconstruct_all, rerank, storage_of)
+
 logger = setup_logging(__name__)
 
+INDEX_STAGE_SECONDS = metrics.histogram(
+    "email_search_index_stage_seconds", "Time spent per add_articles stage", ["stage"]
+)
+SEARCH_STAGE_SECONDS = metrics.histogram(
+    "email_search_search_stage_seconds", "Time spent per search stage, for a batch of queries", ["stage"]
+)
+ARTICLES_INDEXED = metrics.counter("email_search_articles_indexed", "Articles added to the index")
+SEARCHES = metrics.counter("email_search_queries", "Queries searched, including cached ones", ["mode"])
+
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+# Rank constant of reciprocal rank fusion, as in Cormack et al.
+RRF_K = 60
+
+# Vectors searched at once when building the neighbor graph of a whole index
+NEIGHBOR_BATCH_SIZE = 1024
+
+# Room reserved in a FAISS index for appending articles in place, as a multiple of
+# its size. Once it is full the index is copied into a larger one
+INDEX_GROWTH = 1.5
+
+
+def saved_article_count(base_dir: str) -> int:
+    """
+    Number of articles in the index saved in a directory, read from the FAISS
+    index header with the vectors memory-mapped rather than loaded.
+    """
+    path = os.path.join(base_dir, "faiss_index", "index.faiss")
+    if not os.path.exists(path):
+        return 0
+    return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY).ntotal
+
+
+def search_depth(k: int, mode: str) -> int:
+    """Hits each ranking contributes to the k results of a search."""
+    return k if mode != "hybrid" else max(20, k * 2)
+
+
+def merge_hits(
+    vector_hits: Optional[List[Tuple[str, float]]],
+    lexical_hits: Optional[List[Tuple[str, float]]],
+    k: int
+) -> List[Tuple[str, float]]:
+    """
+    Rank the top k hits of one query from its vector hits, scored by cosine
+    similarity, and its lexical hits, scored by BM25. Either may be None.
+    
+    BM25 scores are scaled so the best lexical match scores 1. When both are
+    given they are combined with reciprocal rank fusion, scaled so an article
+    ranked first by both searches scores 1.
+    """
+    if lexical_hits is None:
+        return vector_hits[:k]
+    if vector_hits is None:
+        if not lexical_hits:
+            return []
+        top_score = lexical_hits[0][1]
+        return [(doc_id, score / top_score) for doc_id, score in lexical_hits[:k]]
+    fused: Dict[str, float] = {}
+    for hits in (vector_hits, lexical_hits):
+        for rank, (doc_id, _) in enumerate(hits, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1 / (RRF_K + rank)
+    max_score = 2 / (RRF_K + 1)
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+    return [(doc_id, score / max_score) for doc_id, score in ranked]
+
+
+def _cached_and_missing(
+    cache: LRUCache, model_name: str, queries: List[str]
+) -> Tuple[List[Optional[List[float]]], List[str]]:
+    embeddings = [cache.get((model_name, query)) for query in queries]
+    missing = list(dict.fromkeys(
+        query for query, embedding in zip(queries, embeddings) if embedding is None
+    ))
+    return embeddings, missing
+
+
+def _fill_missing(
+    cache: LRUCache,
+    model_name: str,
+    queries: List[str],
+    embeddings: List[Optional[List[float]]],
+    missing: List[str],
+    vectors: List[List[float]]
+) -> List[List[float]]:
+    computed = dict(zip(missing, vectors))
+    for query, embedding in computed.items():
+        cache.put((model_name, query), embedding)
+    return [
+        embedding if embedding is not None else computed[query]
+        for query, embedding in zip(queries, embeddings)
+    ]
+
+
+def embed_cached(embeddings: Embeddings, cache: LRUCache, model_name: str, queries: List[str]) -> List[List[float]]:
+    """
+    Embed normalized queries through a cache keyed by model name and query,
+    sending the queries not found in it to the model in a single request.
+    """
+    cached, missing = _cached_and_missing(cache, model_name, queries)
+    if not missing:
+        return cached
+    logger.debug("Embedding %d queries not found in cache", len(missing))
+    return _fill_missing(cache, model_name, queries, cached, missing, embeddings.embed_documents(missing))
+
+
+async def aembed_cached(
+    embeddings: Embeddings, cache: LRUCache, model_name: str, queries: List[str]
+) -> List[List[float]]:
+    """Like embed_cached, but awaits the embedding model instead of blocking."""
+    cached, missing = _cached_and_missing(cache, model_name, queries)
+    if not missing:
+        return cached
+    logger.debug("Embedding %d queries not found in cache", len(missing))
+    vectors = await embeddings.aembed_documents(missing)
+    return _fill_missing(cache, model_name, queries, cached, missing, vectors)
+
+
+class IndexState(NamedTuple):
+    """
+    One immutable version of the index. Searches read a single state from start to
+    finish while writers build the next one, so indexing never blocks searching.
+
+    New articles are appended to the FAISS index and docstore of the previous
+    state, so a state only reads the first `size` vectors of its vector store.
+    """
+    vector_store: Optional[FAISS]
+    lexical_index: BM25Index
+    exact_vectors: Optional[ExactVectorStore]
+    neighbor_graph: Optional[NeighborGraph]
+    version: int
+    size: int
+
+
+class SearchCandidates(NamedTuple):
+    """
+    The unmerged hits of a batch of queries, for ranking them together with the
+    hits of other indexes, e.g. the other shards of a sharded index.
+    """
+    vector_hits: Optional[List[List[Tuple[str, float]]]]
+    lexical_hits: Optional[List[List[Tuple[str, float]]]]
+    complete: bool
+    # Results without a score, by document ID
+    documents: Dict[str, Dict[str, Any]]
+
+
 class EmailSearchSystem:
     def __init__(
         self, 
         base_dir: str = ".email_search",
-        model_name: str = "mxbai-embed-large"
+        model_name: str = "mxbai-embed-large",
+        embedding_cache_size: int = 1024,
+        result_cache_size: int = 256,
+        vector_storage: str = "flat",
+        rerank_factor: int = 0,
+        read_only: bool = False,
+        embeddings: Optional[Embeddings] = None,
+        neighbor_count: int = 10,
+        on_neighbor_graph: Optional[Callable[[], None]] = None
     ):
         """
         Initialize the email search system.
@@ -20,19 +195,63 @@ class EmailSearchSystem:
         Args:
             base_dir: Base directory to store all search system files
             model_name: Name of the Ollama model to use for embeddings
+            embedding_cache_size: Number of query embeddings kept in memory
+            result_cache_size: Number of search result lists kept in memory
+            vector_storage: How vectors are stored in the FAISS index: "flat"
+                float32, "float16" or "int8" scalar quantization, or "pq" product
+                quantization. A flat index is converted once it holds enough
+                vectors to train the compressed storage, and retrained from the
+                full-precision vectors kept on disk as it grows
+            rerank_factor: When greater than 0, compressed indexes fetch
+                k * rerank_factor candidates and re-rank them by exact distance
+                using the full-precision vectors memory-mapped from disk
+            read_only: Memory-map the vector codes of an existing index instead
+                of loading them, so processes serving the same files share one
+                copy of the codes in the page cache. Documents, BM25 postings and
+                the neighbor graph are still loaded by each process. A read-only
+                system cannot add articles
+            embeddings: Embedding client to use, defaults to a pooled Ollama
+                client for `model_name`, see embedding_backends
+            neighbor_count: Related articles precomputed per article in a
+                neighbor graph, 0 to look them up in the vector index instead.
+                A missing or stale graph is rebuilt in the background, read-only
+                systems wait for the writer to save one
+            on_neighbor_graph: Called from the background thread once it has
+                built the neighbor graph, e.g. to publish a snapshot holding it
         """
         logger.info(f"Initializing EmailSearchSystem with base_dir={base_dir}, model={model_name}")
+        if vector_storage not in VECTOR_STORAGES:
+            raise ValueError(
+                f"Unknown vector storage '{vector_storage}', expected one of {VECTOR_STORAGES}"
+            )
         # Create base directory if it doesn't exist
         os.makedirs(base_dir, exist_ok=True)
         
         # Store all paths relative to base directory
         self.index_path = os.path.join(base_dir, "faiss_index")
-        self.embeddings = OllamaEmbeddings(model=model_name)
+        self.lexical_index_path = os.path.join(base_dir, "lexical_index.json")
+        self.exact_vectors_path = os.path.join(base_dir, "exact_vectors.f32")
+        self.neighbor_graph_path = os.path.join(base_dir, "neighbor_graph.json")
+        self.neighbor_count = neighbor_count
+        self.on_neighbor_graph = on_neighbor_graph
+        self.vector_storage = vector_storage
+        self.rerank_factor = rerank_factor
+        self.read_only = read_only
+        self.model_name = model_name
+        self.embeddings = embeddings if embeddings is not None else create_embeddings("ollama", model_name)
+        
+        # Query embeddings never go stale, search results do whenever the
+        # index changes, so results are keyed by the index version
+        self.embedding_cache = LRUCache(embedding_cache_size, name="embedding")
+        self.result_cache = LRUCache(result_cache_size, name="result")
         
         # Load or create vector store with cosine similarity
-        if os.path.exists(self.index_path):
+        if os.path.exists(self.index_path) and read_only:
+            logger.info(f"Memory-mapping existing FAISS index from {self.index_path}")
+            vector_store = self._load_memory_mapped()
+        elif os.path.exists(self.index_path):
             logger.info(f"Loading existing FAISS index from {self.index_path}")
-            self.vector_store = FAISS.load_local(
+            vector_store = FAISS.load_local(
                 self.index_path, 
                 self.embeddings,
                 allow_dangerous_deserialization=True,
@@ -41,95 +260,1001 @@ class EmailSearchSystem:
             logger.debug("FAISS index loaded successfully")
         else:
             logger.info("No existing index found, starting fresh")
-            self.vector_store = None
+            vector_store = None
+        
+        lexical_index = self._load_lexical_index(vector_store)
+        
+        # Vectors the live FAISS index can hold before appending would move its codes
+        self._capacity = 0
+        exact_vectors = None
+        size = 0
+        if vector_store is not None:
+            exact_vectors = self._load_exact_vectors(vector_store)
+            if not read_only:
+                rebuilt, exact_vectors = self._maybe_compress(vector_store, exact_vectors)
+                if rebuilt is not None:
+                    vector_store = rebuilt
+                    vector_store.save_local(self.index_path)
+            size = vector_store.index.ntotal
+        neighbor_graph = self._load_neighbor_graph(size)
+        
+        # Writers are serialized; searches never take the lock
+        self._write_lock = threading.Lock()
+        self._state = IndexState(vector_store, lexical_index, exact_vectors, neighbor_graph, 0, size)
+        
+        # Building the graph searches every article, keep it out of startup
+        self._neighbor_graph_builder: Optional[threading.Thread] = None
+        if neighbor_count and neighbor_graph is None and not read_only:
+            self._neighbor_graph_builder = threading.Thread(
+                target=self._build_neighbor_graph, name="neighbor-graph", daemon=True
+            )
+            self._neighbor_graph_builder.start()
+
+    @property
+    def vector_store(self) -> Optional[FAISS]:
+        return self._state.vector_store
+
+    @property
+    def lexical_index(self) -> BM25Index:
+        return self._state.lexical_index
+
+    @property
+    def exact_vectors(self) -> Optional[ExactVectorStore]:
+        return self._state.exact_vectors
+
+    @property
+    def index_version(self) -> int:
+        return self._state.version
+
+    def _load_memory_mapped(self) -> FAISS:
+        """
+        Open the FAISS index files written by save_local with the vector codes
+        memory-mapped in place. IO_FLAG_MMAP alone would copy them into private
+        memory of each process.
+        """
+        index = faiss.read_index(
+            os.path.join(self.index_path, "index.faiss"),
+            faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+        )
+        with open(os.path.join(self.index_path, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(
+            self.embeddings,
+            index,
+            docstore,
+            index_to_docstore_id,
+            normalize_L2=True  # Enable cosine similarity
+        )
+
+    def save_to(self, base_dir: str):
+        """
+        Write every index file to another directory using the same layout, so it
+        can be opened with EmailSearchSystem(base_dir=...), e.g. as a snapshot.
+        Writes wait meanwhile, they append to the saved FAISS index and docstore.
+        """
+        logger.info(f"Saving search system files to {base_dir}")
+        os.makedirs(base_dir, exist_ok=True)
+        with self._write_lock:
+            state = self._state
+            if state.vector_store is not None:
+                state.vector_store.save_local(os.path.join(base_dir, "faiss_index"))
+            state.lexical_index.save(os.path.join(base_dir, "lexical_index.json"))
+            if state.exact_vectors is not None:
+                shutil.copyfile(self.exact_vectors_path, os.path.join(base_dir, "exact_vectors.f32"))
+            if state.neighbor_graph is not None:
+                state.neighbor_graph.save(os.path.join(base_dir, "neighbor_graph.json"))
+
+    def _load_exact_vectors(self, vector_store: FAISS) -> Optional[ExactVectorStore]:
+        """Open the on-disk full-precision vectors a compressed index is retrained and re-ranked with."""
+        index = vector_store.index
+        if storage_of(index) == "flat":
+            return None
+        exact_vectors = ExactVectorStore(self.exact_vectors_path, index.d)
+        if len(exact_vectors) != index.ntotal:
+            logger.warning(
+                f"Found {len(exact_vectors)} exact vectors for {index.ntotal} indexed, "
+                "re-ranking and retraining disabled"
+            )
+            return None
+        return exact_vectors
+
+    def _maybe_compress(
+        self,
+        vector_store: FAISS,
+        exact_vectors: Optional[ExactVectorStore],
+        added: int = 0
+    ) -> Tuple[Optional[FAISS], Optional[ExactVectorStore]]:
+        """
+        Convert the flat index of a vector store to the configured compressed
+        storage once it holds enough vectors to train it, and retrain a
+        compressed index whenever it doubles in size, so vectors added after
+        training do not fall outside what the quantizer learned.
+        
+        Args:
+            vector_store: Vector store holding the index
+            exact_vectors: Full-precision vectors of a compressed index
+            added: Vectors just added to the index
+        
+        Returns:
+            A vector store with the rebuilt index, sharing the documents of
+            `vector_store`, or None if it was kept, and the exact vectors of the
+            index returned
+        """
+        index = vector_store.index
+        current = storage_of(index)
+        if self.vector_storage == "flat":
+            return None, exact_vectors
+        if current == self.vector_storage:
+            if exact_vectors is None or not needs_retraining(
+                current, index.d, index.ntotal - added, index.ntotal
+            ):
+                return None, exact_vectors
+            logger.info(f"Retraining {current} storage on {index.ntotal} vectors")
+            rebuilt = build_index(current, exact_vectors.get(np.arange(index.ntotal)))
+            return self._with_index(vector_store, rebuilt), exact_vectors
+        if current != "flat":
+            logger.warning(
+                f"Index is stored as {current} and cannot be converted to "
+                f"{self.vector_storage} without re-embedding"
+            )
+            return None, exact_vectors
+        if index.ntotal < min_training_vectors(self.vector_storage, index.d):
+            logger.debug(f"Keeping flat storage until {self.vector_storage} can be trained")
+            return None, exact_vectors
+        
+        logger.info(f"Converting {index.ntotal} vectors to {self.vector_storage} storage")
+        vectors = reconstruct_all(index)
+        rebuilt = build_index(self.vector_storage, vectors)
+        exact_vectors = ExactVectorStore(self.exact_vectors_path, index.d)
+        exact_vectors.reset(vectors)
+        return self._with_index(vector_store, rebuilt), exact_vectors
 
-    def add_articles(self, articles: List[Dict]) -> int:
+    def _reserve(self, index: faiss.Index, size: int) -> None:
+        """
+        Make room in the codes of the index that articles will be appended to for
+        INDEX_GROWTH times `size` vectors, so appending never reallocates codes
+        that searches of older states are reading.
+        """
+        self._capacity = max(size, int(size * INDEX_GROWTH))
+        # Shrinking a std::vector keeps its allocation
+        index.codes.resize(self._capacity * index.code_size)
+        index.codes.resize(index.ntotal * index.code_size)
+
+    def _with_index(self, vector_store: FAISS, index: faiss.Index) -> FAISS:
+        """A vector store with another index for the same documents, e.g. a retrained one."""
+        self._reserve(index, index.ntotal)
+        return FAISS(
+            self.embeddings,
+            index,
+            vector_store.docstore,
+            vector_store.index_to_docstore_id,
+            normalize_L2=True  # Enable cosine similarity
+        )
+
+    def _copy_vector_store(self, vector_store: FAISS, size: int) -> FAISS:
+        """
+        Copy a vector store so the copy can be written while searches read the
+        original, with room to append articles in place up to INDEX_GROWTH
+        times `size`.
+        """
+        index = faiss.clone_index(vector_store.index)
+        self._reserve(index, size)
+        return FAISS(
+            self.embeddings,
+            index,
+            InMemoryDocstore(dict(vector_store.docstore._dict)),
+            dict(vector_store.index_to_docstore_id),
+            normalize_L2=True  # Enable cosine similarity
+        )
+
+    def _rollback_append(self, state: IndexState, ids: List[str]) -> None:
+        """
+        Remove articles appended to the vector store and exact vectors of a state
+        by a write that failed before replacing it.
+        """
+        vector_store = state.vector_store
+        index = vector_store.index
+        if index.ntotal > state.size:
+            index.remove_ids(faiss.IDSelectorRange(state.size, index.ntotal))
+        for position in [i for i in vector_store.index_to_docstore_id if i >= state.size]:
+            del vector_store.index_to_docstore_id[position]
+        appended = [doc_id for doc_id in ids if doc_id in vector_store.docstore._dict]
+        if appended:
+            vector_store.docstore.delete(appended)
+        if state.exact_vectors is not None and len(state.exact_vectors) > state.size:
+            state.exact_vectors.truncate(state.size)
+
+    def _load_lexical_index(self, vector_store: Optional[FAISS]) -> BM25Index:
+        """Load the BM25 index, rebuilding it from the docstore if it is missing or stale."""
+        total = len(vector_store.index_to_docstore_id) if vector_store is not None else 0
+        if os.path.exists(self.lexical_index_path):
+            lexical_index = BM25Index.load(self.lexical_index_path)
+            if len(lexical_index) == total:
+                return lexical_index
+            logger.warning("Lexical index is out of sync with the vector store, rebuilding")
+        
+        lexical_index = BM25Index()
+        if vector_store is not None:
+            logger.info("Building lexical index from the vector store docstore")
+            for doc_id in vector_store.index_to_docstore_id.values():
+                lexical_index.add(doc_id, vector_store.docstore.search(doc_id).page_content)
+            if not self.read_only:
+                lexical_index.save(self.lexical_index_path)
+        return lexical_index
+
+    def _load_neighbor_graph(self, size: int) -> Optional[NeighborGraph]:
+        """Load the neighbor graph of an index of `size` articles, None if it is missing or stale."""
+        if not self.neighbor_count:
+            return None
+        if not size:
+            return NeighborGraph(k=self.neighbor_count)
+        if os.path.exists(self.neighbor_graph_path):
+            neighbor_graph = NeighborGraph.load(self.neighbor_graph_path)
+            if len(neighbor_graph) == size and neighbor_graph.k == self.neighbor_count:
+                return neighbor_graph
+            logger.warning("Neighbor graph is out of sync with the vector store")
+        elif self.read_only:
+            logger.warning(f"No neighbor graph in {self.neighbor_graph_path}, related articles unavailable")
+        return None
+
+    def _build_neighbor_graph(self):
+        """
+        Build the neighbor graph of the whole index while searches and writes go on.
+
+        Articles added meanwhile are added to the graph before it is installed;
+        after a deletion, which moves articles in the index, it is built again.
+        """
+        try:
+            while True:
+                state = self._state
+                logger.info(f"Building neighbor graph of {state.size} articles")
+                neighbor_graph = NeighborGraph(k=self.neighbor_count)
+                for start in range(0, state.size, NEIGHBOR_BATCH_SIZE):
+                    batch = np.arange(start, min(start + NEIGHBOR_BATCH_SIZE, state.size))
+                    neighbor_graph.add(self._neighbor_hits(state, batch))
+                with self._write_lock:
+                    current = self._state
+                    if state.size and (
+                        current.size < state.size
+                        or self._doc_ids(current)[:state.size] != self._doc_ids(state)
+                    ):
+                        continue
+                    if current.size > state.size:
+                        neighbor_graph.add(self._neighbor_hits(current, np.arange(state.size, current.size)))
+                    neighbor_graph.save(self.neighbor_graph_path)
+                    self._state = current._replace(neighbor_graph=neighbor_graph)
+                break
+            logger.info(f"Neighbor graph of {len(neighbor_graph)} articles built")
+            if self.on_neighbor_graph is not None:
+                self.on_neighbor_graph()
+        except Exception as e:
+            logger.error(f"Failed to build the neighbor graph: {e}", exc_info=True)
+
+    def wait_for_neighbor_graph(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a neighbor graph being built in the background, returning whether one is available."""
+        if self._neighbor_graph_builder is not None:
+            self._neighbor_graph_builder.join(timeout)
+        return self._state.neighbor_graph is not None
+
+    def _doc_ids(self, state: IndexState) -> List[str]:
+        """Document IDs of a state in index order, without those appended since."""
+        ids = state.vector_store.index_to_docstore_id
+        return [ids[i] for i in range(state.size)]
+
+    def _vectors_at(self, state: IndexState, positions: np.ndarray) -> np.ndarray:
+        """Stored vectors at index positions, full precision when exact vectors are kept."""
+        if state.exact_vectors is not None:
+            return state.exact_vectors.get(positions)
+        return state.vector_store.index.reconstruct_batch(np.asarray(positions, dtype=np.int64))
+
+    def _neighbor_hits(
+        self,
+        state: IndexState,
+        positions: np.ndarray,
+        vectors: Optional[List[List[float]]] = None,
+        k: Optional[int] = None
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Search the index for the nearest neighbors of indexed articles, with
+        their own vectors rather than embedded text.
+
+        Args:
+            state: Index state holding the articles
+            positions: Index positions of the articles
+            vectors: Their vectors if already at hand, read from the index otherwise
+            k: Neighbors per article, twice the graph's neighbor count by default,
+                see NeighborGraph.add
+
+        Returns:
+            Dict[str, List[Tuple[str, float]]]: (doc_id, score) hits by document
+                ID, which include the article itself
+        """
+        if vectors is None:
+            vectors = self._vectors_at(state, positions)
+        # One extra for the article itself
+        depth = (k or self.neighbor_count * 2) + 1
+        hits = self._search_vectors(state, vectors, depth)
+        ids = state.vector_store.index_to_docstore_id
+        return {ids[int(i)]: article_hits for i, article_hits in zip(positions, hits)}
+
+    def add_articles(self, articles: List[Union[Article, Dict]]) -> int:
+        """
+        Embed and index articles.
+        
+        Args:
+            articles: Articles, or dicts with the same fields
+            
+        Returns:
+            int: Number of articles added
+        """
         logger.debug(f"Processing {len(articles)} articles for indexing")
         
+        if self.read_only:
+            raise RuntimeError("Cannot add articles to a read-only search system")
+        
         if not articles:
             logger.warning("No articles provided for indexing")
             return 0
-            
-        new_articles = []
-        texts = []
-        metadatas = []
-        
-        for i, article in enumerate(articles):
-            logger.debug(f"Processing article {i+1}/{len(articles)}")
-            full_text = f"Title: {article['title']}\n\nContent: {article['content']}"
-            metadata = {
-                "title": article["title"],
-                "section": article.get("section", ""),
-                "reading_time": article.get("reading_time"),
-                "newsletter_type": article.get("newsletter_type", ""),
-                "link": article.get("link", "")
-            }
-            
-            texts.append(full_text)
-            metadatas.append(metadata)
-            new_articles.append(article)
+        
+        new_articles = [Article.from_dict(article) for article in articles]
+        # Each text is built once and shared by the embedder, docstore and BM25
+        texts = [article.text for article in new_articles]
+        metadatas = [article.metadata() for article in new_articles]
 
         if texts:
-            if self.vector_store is None:
-                logger.info("Creating new FAISS index")
-                self.vector_store = FAISS.from_texts(
-                    texts, 
-                    self.embeddings, 
-                    metadatas=metadatas,
-                    normalize_L2=True  # Enable cosine similarity
+            ids = [str(uuid.uuid4()) for _ in texts]
+            # Embed before taking the write lock, it is by far the slowest step
+            with INDEX_STAGE_SECONDS.labels(stage="embed").time(), tracing.span("index.embed"):
+                vectors = self.embeddings.embed_documents(texts)
+            text_embeddings = list(zip(texts, vectors))
+            
+            with self._write_lock, INDEX_STAGE_SECONDS.labels(stage="index").time(), tracing.span("index.faiss"):
+                state = self._state
+                # Articles are appended to the live store, undo that if anything fails
+                capacity = self._capacity
+                try:
+                    if state.vector_store is None:
+                        logger.info("Creating new FAISS index")
+                        vector_store = FAISS.from_embeddings(
+                            text_embeddings,
+                            self.embeddings, 
+                            metadatas=metadatas,
+                            ids=ids,
+                            normalize_L2=True  # Enable cosine similarity
+                        )
+                        self._reserve(vector_store.index, len(ids))
+                    else:
+                        vector_store = state.vector_store
+                        size = vector_store.index.ntotal + len(ids)
+                        if size > self._capacity:
+                            logger.info(f"Copying the FAISS index to grow it to {size} vectors")
+                            vector_store = self._copy_vector_store(vector_store, size)
+                        # Appended in place, older states read no further than their size
+                        vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+                
+                    exact_vectors = state.exact_vectors
+                    if exact_vectors is not None:
+                        # Appending is safe, older states never read past their own vectors
+                        matrix = np.asarray(vectors, dtype=np.float32)
+                        faiss.normalize_L2(matrix)
+                        exact_vectors.append(matrix)
+                    rebuilt, exact_vectors = self._maybe_compress(vector_store, exact_vectors, len(ids))
+                    if rebuilt is not None:
+                        vector_store = rebuilt
+                    size = vector_store.index.ntotal
+                
+                    lexical_index = state.lexical_index.copy()
+                    for doc_id, text in zip(ids, texts):
+                        lexical_index.add(doc_id, text)
+                
+                    # Without a graph, either it is disabled or the builder will add these
+                    neighbor_graph = None
+                    if state.neighbor_graph is not None:
+                        with INDEX_STAGE_SECONDS.labels(stage="neighbors").time(), tracing.span("index.neighbors"):
+                            neighbor_graph = state.neighbor_graph.copy()
+                            neighbor_graph.add(self._neighbor_hits(
+                                IndexState(vector_store, lexical_index, exact_vectors, None, state.version, size),
+                                np.arange(size - len(ids), size),
+                                vectors
+                            ))
+                
+                    logger.info(f"Saving index to {self.index_path}")
+                    with INDEX_STAGE_SECONDS.labels(stage="save").time(), tracing.span("index.save"):
+                        vector_store.save_local(self.index_path)
+                        lexical_index.save(self.lexical_index_path)
+                        if neighbor_graph is not None:
+                            neighbor_graph.save(self.neighbor_graph_path)
+                    logger.debug("Index saved successfully")
+                except BaseException:
+                    self._capacity = capacity
+                    if state.vector_store is not None:
+                        self._rollback_append(state, ids)
+                    raise
+                
+                self._state = IndexState(
+                    vector_store, lexical_index, exact_vectors, neighbor_graph, state.version + 1, size
                 )
+                self.result_cache.clear()
+                logger.debug(f"Index version bumped to {self._state.version}")
+            ARTICLES_INDEXED.inc(len(new_articles))
+
+        return len(new_articles)
+
+    def article_metadata(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the metadata of every indexed article by document id.
+        
+        Returns:
+            Dict mapping document ids to the metadata stored by add_articles
+        """
+        state = self._state
+        if state.vector_store is None:
+            return {}
+        return {
+            doc_id: state.vector_store.docstore.search(doc_id).metadata
+            for doc_id in self._doc_ids(state)
+        }
+
+    def export_to(self, path: str) -> Dict[str, Any]:
+        """
+        Write the index in the portable export format: `vectors.npy` holds the
+        vectors as one contiguous float32 array in index order, `metadata.json` the
+        document ids, texts and metadata fields as columns, `lexical_index.json`
+        the BM25 index and `neighbor_graph.json` the related articles. Nothing is
+        pickled, see index_export.
+
+        Returns:
+            Dict[str, Any]: Article count, dimensions, source storage and whether
+                the vectors are exact or decoded from a compressed index
+        """
+        state = self._state
+        os.makedirs(path, exist_ok=True)
+        if state.vector_store is None:
+            vectors, doc_ids, docs = np.empty((0, 0), dtype=np.float32), [], []
+            storage = self.vector_storage
+        else:
+            index = state.vector_store.index
+            storage = storage_of(index)
+            if state.exact_vectors is not None:
+                vectors = state.exact_vectors.get(np.arange(state.size))
+            else:
+                vectors = index.reconstruct_n(0, state.size)
+            doc_ids = self._doc_ids(state)
+            docs = [state.vector_store.docstore.search(doc_id) for doc_id in doc_ids]
+
+        np.save(os.path.join(path, "vectors.npy"), np.ascontiguousarray(vectors, dtype=np.float32))
+        fields = list(dict.fromkeys(name for doc in docs for name in doc.metadata))
+        with open(os.path.join(path, "metadata.json"), "w") as f:
+            json.dump({
+                "doc_ids": doc_ids,
+                "texts": [doc.page_content for doc in docs],
+                "fields": {name: [doc.metadata.get(name) for doc in docs] for name in fields},
+            }, f)
+        state.lexical_index.save(os.path.join(path, "lexical_index.json"))
+        if state.neighbor_graph is not None:
+            state.neighbor_graph.save(os.path.join(path, "neighbor_graph.json"))
+        return {
+            "count": len(doc_ids),
+            "dimensions": int(vectors.shape[1]),
+            "vector_storage": storage,
+            "exact_vectors": storage == "flat" or state.exact_vectors is not None,
+        }
+
+    def delete_articles(self, doc_ids: List[str]) -> int:
+        """
+        Delete articles from the vector, lexical and exact-vector indexes.
+        
+        The FAISS index is compacted on a copy, so space is reclaimed right away
+        and searches keep reading the previous state until the copy is swapped in.
+        Unlike adding articles, this copies the whole index.
+        
+        Args:
+            doc_ids: Document ids, as returned by article_metadata; unknown ids are ignored
+            
+        Returns:
+            int: Number of articles deleted
+        """
+        if self.read_only:
+            raise RuntimeError("Cannot delete articles from a read-only search system")
+        
+        with self._write_lock:
+            state = self._state
+            if state.vector_store is None:
+                return 0
+            positions = {doc_id: i for i, doc_id in enumerate(self._doc_ids(state))}
+            doomed = [doc_id for doc_id in dict.fromkeys(doc_ids) if doc_id in positions]
+            if not doomed:
+                return 0
+            
+            logger.info(f"Deleting {len(doomed)} of {len(positions)} articles")
+            if len(doomed) == len(positions):
+                vector_store = None
+                shutil.rmtree(self.index_path, ignore_errors=True)
             else:
-                logger.info("Adding texts to existing FAISS index")
-                self.vector_store.add_texts(texts, metadatas=metadatas)
+                vector_store = self._copy_vector_store(state.vector_store, state.size)
+                vector_store.delete(doomed)
+                vector_store.save_local(self.index_path)
+            
+            exact_vectors = state.exact_vectors
+            if exact_vectors is not None:
+                if vector_store is None:
+                    exact_vectors = None
+                    os.remove(self.exact_vectors_path)
+                else:
+                    kept = np.setdiff1d(
+                        np.arange(len(positions)), [positions[doc_id] for doc_id in doomed]
+                    )
+                    exact_vectors = exact_vectors.rewrite(exact_vectors.get(kept))
             
-            logger.info(f"Saving index to {self.index_path}")
-            self.vector_store.save_local(self.index_path)
-            logger.debug("Index saved successfully")
+            lexical_index = state.lexical_index.copy()
+            lexical_index.remove(doomed)
+            lexical_index.save(self.lexical_index_path)
+            
+            neighbor_graph = None
+            if state.neighbor_graph is not None:
+                neighbor_graph = state.neighbor_graph.copy()
+                affected = neighbor_graph.remove(doomed)
+                if affected and vector_store is not None:
+                    # Refill the lists that lost a neighbor
+                    positions = {doc_id: i for i, doc_id in vector_store.index_to_docstore_id.items()}
+                    neighbor_graph.add(self._neighbor_hits(
+                        IndexState(
+                            vector_store, lexical_index, exact_vectors, None, state.version,
+                            vector_store.index.ntotal
+                        ),
+                        np.array(sorted(positions[doc_id] for doc_id in affected))
+                    ))
+                neighbor_graph.save(self.neighbor_graph_path)
+            
+            self._state = IndexState(
+                vector_store, lexical_index, exact_vectors, neighbor_graph, state.version + 1,
+                vector_store.index.ntotal if vector_store is not None else 0
+            )
+            self.result_cache.clear()
+            logger.debug(f"Index version bumped to {self._state.version}")
+        
+        return len(doomed)
 
-        return len(new_articles)
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed normalized queries, reusing cached embeddings and sending all
+        remaining queries to the model in a single request.
+        """
+        return embed_cached(self.embeddings, self.embedding_cache, self.model_name, queries)
+
+    async def aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Like embed_queries, but awaits the embedding model instead of blocking, so
+        the FAISS part of a later search finds every query embedding cached.
+        """
+        return await aembed_cached(self.embeddings, self.embedding_cache, self.model_name, queries)
+
+    def _make_filter(
+        self,
+        state: IndexState,
+        filters: Optional[Dict[str, Any]],
+        date_from: Optional[str],
+        date_to: Optional[str]
+    ) -> Optional[Callable[[str], bool]]:
+        """
+        Build a predicate on docstore IDs from metadata filters and an inclusive
+        date range. Dates are ISO 8601 prefixes such as "2024-11" or "2024-11-02".
+        """
+        if not filters and not date_from and not date_to:
+            return None
+        
+        def accept(doc_id: str) -> bool:
+            metadata = state.vector_store.docstore.search(doc_id).metadata
+            if filters and any(metadata.get(key) != value for key, value in filters.items()):
+                return False
+            if date_from or date_to:
+                date = metadata.get("date")
+                if not date:
+                    return False
+                if date_from and date[:len(date_from)] < date_from:
+                    return False
+                if date_to and date[:len(date_to)] > date_to:
+                    return False
+            return True
+        
+        return accept
+
+    def _search_vectors(
+        self,
+        state: IndexState,
+        vectors: List[List[float]],
+        k: int,
+        accept: Optional[Callable[[str], bool]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Run a single FAISS search for a matrix of query vectors. Squared L2
+        distances between unit vectors are converted to cosine similarities.
+        """
+        matrix = np.asarray(vectors, dtype=np.float32)
+        faiss.normalize_L2(matrix)  # The index stores L2-normalized vectors
+        fetch_k = k if accept is None else max(20, k * 4)
+        if self.rerank_factor and state.exact_vectors is not None:
+            _, candidates = self._index_search(state, matrix, fetch_k * self.rerank_factor)
+            scores, indices = rerank(matrix, candidates, state.exact_vectors, fetch_k)
+        else:
+            scores, indices = self._index_search(state, matrix, fetch_k)
+        
+        all_hits = []
+        for row_scores, row_indices in zip(scores, indices):
+            hits = []
+            for score, i in zip(row_scores, row_indices):
+                if i == -1:
+                    # Fewer vectors indexed than requested
+                    continue
+                doc_id = state.vector_store.index_to_docstore_id[i]
+                if accept is not None and not accept(doc_id):
+                    continue
+                hits.append((doc_id, 1 - float(score) / 2))
+                if len(hits) == k:
+                    break
+            all_hits.append(hits)
+        return all_hits
+
+    def _index_search(self, state: IndexState, matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the FAISS index of a state for the k nearest positions per query.
+
+        Vectors appended for later states are fetched on top of the k and
+        dropped, as not every storage supports search-time ID selectors. The
+        search is repeated if articles were added while it ran.
+        """
+        index = state.vector_store.index
+        while True:
+            added = index.ntotal - state.size
+            distances, positions = index.search(matrix, k + added)
+            if index.ntotal - state.size == added:
+                break
+        if not added:
+            return distances, positions
+        # Stable sort moves newer positions last, keeping the order of the others
+        newer = positions >= state.size
+        order = np.argsort(newer, axis=1, kind="stable")[:, :k]
+        distances = np.take_along_axis(np.where(newer, np.inf, distances), order, axis=1)
+        positions = np.take_along_axis(np.where(newer, -1, positions), order, axis=1)
+        return distances, positions
+
+    def _search_lexical(
+        self,
+        state: IndexState,
+        query: str,
+        k: int,
+        accept: Optional[Callable[[str], bool]] = None,
+        stats: Optional[CorpusStats] = None
+    ) -> List[Tuple[str, float]]:
+        """Rank articles with BM25, without calling the embedding model."""
+        return state.lexical_index.search(query, k=k, accept=accept, stats=stats)
+
+    def _candidates(
+        self,
+        state: IndexState,
+        queries: List[str],
+        k: int,
+        accept: Optional[Callable[[str], bool]],
+        mode: str,
+        lexical_stats: Optional[List[CorpusStats]] = None,
+        query_vectors: Optional[List[List[float]]] = None
+    ) -> Tuple[Optional[List[List[Tuple[str, float]]]], Optional[List[List[Tuple[str, float]]]], bool]:
+        """
+        Get the vector and lexical (doc_id, score) hits merge_hits ranks the
+        results of each query from, with raw cosine and BM25 scores. Queries are
+        embedded unless their query_vectors are given.
+        
+        Returns:
+            The vector hits and lexical hits per query, None for a ranking the
+            mode does not use, and whether they are complete. Vector and hybrid
+            searches fall back to lexical hits when the embedding model fails,
+            in which case the hits are marked incomplete.
+        """
+        depth = search_depth(k, mode)
+        stats = lexical_stats or [None] * len(queries)
+        lexical_hits = None
+        if mode in ("lexical", "hybrid"):
+            with SEARCH_STAGE_SECONDS.labels(stage="lexical").time(), tracing.span("search.lexical"):
+                lexical_hits = [
+                    self._search_lexical(state, query, depth, accept, query_stats)
+                    for query, query_stats in zip(queries, stats)
+                ]
+            if mode == "lexical":
+                return None, lexical_hits, True
+        
+        try:
+            vectors = query_vectors
+            if vectors is None:
+                with SEARCH_STAGE_SECONDS.labels(stage="embed").time(), tracing.span("search.embed"):
+                    vectors = self.embed_queries(queries)
+            with SEARCH_STAGE_SECONDS.labels(stage="vector").time(), tracing.span("search.faiss"):
+                vector_hits = self._search_vectors(state, vectors, depth, accept)
+        except Exception as e:
+            logger.warning(f"Vector search failed, falling back to lexical search: {str(e)}")
+            if lexical_hits is None:
+                lexical_hits = [
+                    self._search_lexical(state, query, k, accept, query_stats)
+                    for query, query_stats in zip(queries, stats)
+                ]
+            return None, lexical_hits, False
+        
+        return vector_hits, lexical_hits, True
 
-    def search(self, query: str, k: int = 5) -> List[Dict]:
+    def _retrieve(
+        self,
+        state: IndexState,
+        queries: List[str],
+        k: int,
+        accept: Optional[Callable[[str], bool]],
+        mode: str,
+        query_vectors: Optional[List[List[float]]] = None
+    ) -> Tuple[List[List[Tuple[str, float]]], bool]:
+        """
+        Get the ranked (doc_id, score) hits of each query in the given mode.
+        
+        Returns:
+            The hits per query and whether they are complete, see _candidates
+        """
+        vector_hits, lexical_hits, complete = self._candidates(
+            state, queries, k, accept, mode, query_vectors=query_vectors
+        )
+        return [
+            merge_hits(vector, lexical, k)
+            for vector, lexical in zip(vector_hits or [None] * len(queries), lexical_hits or [None] * len(queries))
+        ], complete
+
+    def _format_results(
+        self,
+        state: IndexState,
+        hits: List[Tuple[str, float]],
+        min_score: Optional[float]
+    ) -> List[Dict]:
+        formatted_results = []
+        for doc_id, score in hits:
+            doc = state.vector_store.docstore.search(doc_id)
+            formatted_results.append({
+                "id": doc_id,
+                "content": doc.page_content,
+                "metadata": doc.metadata,
+                "similarity_score": round(float(score), 3)
+            })
+        if min_score is not None:
+            formatted_results = [
+                result for result in formatted_results
+                if result["similarity_score"] >= min_score
+            ]
+        formatted_results.sort(key=lambda x: x["similarity_score"], reverse=True)
+        
+        # Checked once rather than per result, this runs for every query
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, result in enumerate(formatted_results):
+                logger.debug(
+                    "Result %d: Score=%s, Title=%s",
+                    i + 1, result["similarity_score"], result["metadata"]["title"]
+                )
+        
+        return formatted_results
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        min_score: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        mode: str = "vector",
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None
+    ) -> List[Dict]:
         """
         Search for relevant article content using cosine similarity.
         
         Args:
             query: Search query
             k: Number of results to return
+            min_score: Optional minimum similarity score a result needs to be returned
+            filters: Optional metadata values results must match, e.g.
+                {"newsletter_type": "TLDR AI"}
+            mode: "vector" for embedding search, "lexical" for BM25 search that
+                never calls the embedding model, or "hybrid" to fuse both rankings
+            date_from: Optional inclusive lower bound on the email date, as an
+                ISO 8601 prefix such as "2024-11" or "2024-11-02"
+            date_to: Optional inclusive upper bound on the email date
             
         Returns:
             List of relevant documents with their metadata, sorted by similarity
             (scores between -1 and 1, where 1 is most similar)
         """
-        logger.info(f"Searching for: '{query}' with k={k}")
+        logger.debug("Searching for: '%s' with k=%d, mode=%s", query, k, mode)
+        return self.search_many(
+            [query],
+            k=k,
+            min_score=min_score,
+            filters=filters,
+            mode=mode,
+            date_from=date_from,
+            date_to=date_to
+        )[0]
+
+    def search_many(
+        self,
+        queries: List[str],
+        k: int = 5,
+        min_score: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        mode: str = "vector",
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        query_vectors: Optional[List[List[float]]] = None
+    ) -> List[List[Dict]]:
+        """
+        Search for several queries at once with one embedding request and one
+        FAISS search over the matrix of query vectors.
+        
+        Args:
+            queries: Search queries
+            k: Number of results to return per query
+            min_score: Optional minimum similarity score a result needs to be returned
+            filters: Optional metadata values results must match
+            mode: One of "vector", "lexical" or "hybrid", see `search`
+            date_from: Optional inclusive lower bound on the email date
+            date_to: Optional inclusive upper bound on the email date
+            query_vectors: Optional embeddings of the queries, e.g. awaited with
+                aembed_queries, so the embedding model and cache are not asked again
+            
+        Returns:
+            One list of results per query, in the same order as the queries
+        """
+        logger.debug("Searching for %d queries with k=%d, mode=%s", len(queries), k, mode)
+        
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+        SEARCHES.labels(mode=mode).inc(len(queries))
         
-        if self.vector_store is None:
+        # Every step of this search reads the same version of the index
+        state = self._state
+        if state.vector_store is None:
             logger.error("Search attempted but no articles have been indexed yet")
-            return []
+            return [[] for _ in queries]
         
-        try:
-            results = self.vector_store.similarity_search_with_score(query, k=k)
-            logger.debug(f"Raw search returned {len(results)} results")
-            
-            formatted_results = [
-                {
-                    "content": doc.page_content,
-                    "metadata": doc.metadata,
-                    "similarity_score": round(float(score), 3)
-                }
-                for doc, score in results
-            ]
-            
-            formatted_results.sort(key=lambda x: x["similarity_score"], reverse=True)
+        queries = [normalize_query(query) for query in queries]
+        filter_key = tuple(sorted(filters.items())) if filters else None
+        cache_keys = [
+            (state.version, query, k, filter_key, min_score, mode, date_from, date_to)
+            for query in queries
+        ]
+        
+        results = [self.result_cache.get(cache_key) for cache_key in cache_keys]
+        pending = [i for i, cached in enumerate(results) if cached is None]
+        logger.debug("%d queries served from the result cache", len(queries) - len(pending))
+        
+        if pending:
+            try:
+                all_hits, complete = self._retrieve(
+                    state,
+                    [queries[i] for i in pending],
+                    k,
+                    self._make_filter(state, filters, date_from, date_to),
+                    mode,
+                    [query_vectors[i] for i in pending] if query_vectors is not None else None
+                )
+            except Exception as e:
+                logger.error(f"Search failed with error: {str(e)}", exc_info=True)
+                return [[] for _ in queries]
             
-            for i, result in enumerate(formatted_results):
-                logger.debug(f"Result {i+1}: Score={result['similarity_score']}, "
-                           f"Title={result['metadata']['title']}")
+            with SEARCH_STAGE_SECONDS.labels(stage="format").time(), tracing.span("search.format"):
+                for i, hits in zip(pending, all_hits):
+                    logger.debug("Raw search returned %d results for query %d", len(hits), i + 1)
+                    results[i] = self._format_results(state, hits, min_score)
+                    if complete:
+                        self.result_cache.put(cache_keys[i], results[i])
+        
+        return [list(result) for result in results]
+
+    def search_candidates(
+        self,
+        queries: List[str],
+        k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        mode: str = "vector",
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        lexical_stats: Optional[List[CorpusStats]] = None,
+        query_vectors: Optional[List[List[float]]] = None
+    ) -> SearchCandidates:
+        """
+        Get the raw vector and lexical hits of several queries, before they are
+        ranked by merge_hits. Hits of several indexes can be concatenated and
+        merged as if they came from one index, provided lexical hits are scored
+        with the same statistics. Results are not cached.
+        
+        Args:
+            queries: Search queries
+            k: Number of results that will be ranked from the hits
+            filters: Optional metadata values results must match
+            mode: One of "vector", "lexical" or "hybrid", see `search`
+            date_from: Optional inclusive lower bound on the email date
+            date_to: Optional inclusive upper bound on the email date
+            lexical_stats: BM25 statistics per query, e.g. merged over every
+                shard with lexical_index.merge_stats, this index's own by default
+            query_vectors: Optional embeddings of the queries, embedded otherwise
+        
+        Returns:
+            SearchCandidates: The hits, with scores, and the documents they refer to
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+        state = self._state
+        if state.vector_store is None:
+            empty = [[] for _ in queries]
+            return SearchCandidates(
+                empty if mode != "lexical" else None, empty if mode != "vector" else None, True, {}
+            )
+        queries = [normalize_query(query) for query in queries]
+        vector_hits, lexical_hits, complete = self._candidates(
+            state, queries, k, self._make_filter(state, filters, date_from, date_to), mode, lexical_stats,
+            query_vectors
+        )
+        documents = {}
+        for hits in (vector_hits or []) + (lexical_hits or []):
+            for doc_id, _ in hits:
+                if doc_id not in documents:
+                    doc = state.vector_store.docstore.search(doc_id)
+                    documents[doc_id] = {"id": doc_id, "content": doc.page_content, "metadata": doc.metadata}
+        return SearchCandidates(vector_hits, lexical_hits, complete, documents)
+
+    def related(self, doc_id: str, k: int = 10, min_score: Optional[float] = None) -> Optional[List[Dict]]:
+        """
+        Get the articles most similar to an indexed article, without calling the
+        embedding model. They are read from the neighbor graph, or searched with
+        the article's stored vector when more are asked for than it keeps.
+        
+        Args:
+            doc_id: Document id of the article, as in search results
+            k: Number of related articles to return
+            min_score: Optional minimum similarity score
             
-            return formatted_results
+        Returns:
+            Optional[List[Dict]]: Results shaped like search results, or None if
+                the article is not indexed
+        
+        Raises:
+            NeighborGraphUnavailable: While the neighbor graph is not built yet
+        """
+        state = self._state
+        if state.vector_store is None:
+            return None
+        if state.neighbor_graph is None and self.neighbor_count:
+            raise NeighborGraphUnavailable(self.neighbor_graph_path)
+        if state.neighbor_graph is not None and k <= state.neighbor_graph.k:
+            if doc_id not in state.neighbor_graph:
+                return None
+            hits = state.neighbor_graph.get(doc_id, k)
+        else:
+            positions = {value: i for i, value in enumerate(self._doc_ids(state))}
+            if doc_id not in positions:
+                return None
+            hits = self._neighbor_hits(state, np.array([positions[doc_id]]), k=k)[doc_id]
+            hits = [hit for hit in hits if hit[0] != doc_id][:k]
+        return self._format_results(state, hits, min_score)
+
+    def near_duplicates(self, min_score: float = 0.9) -> List[List[str]]:
+        """
+        Group articles telling the same story, e.g. one covered by several newsletters.
+        
+        Args:
+            min_score: Similarity at which two articles count as duplicates
             
-        except Exception as e:
-            logger.error(f"Search failed with error: {str(e)}", exc_info=True)
-            return []
+        Returns:
+            List[List[str]]: Clusters of document ids, largest first; empty when
+                the neighbor graph is disabled
+        
+        Raises:
+            NeighborGraphUnavailable: While the neighbor graph is not built yet
+        """
+        neighbor_graph = self._state.neighbor_graph
+        if neighbor_graph is None and self.neighbor_count:
+            raise NeighborGraphUnavailable(self.neighbor_graph_path)
+        return neighbor_graph.clusters(min_score) if neighbor_graph is not None else []
 
     def get_total_articles(self) -> int:
         """
@@ -139,7 +1264,40 @@ class EmailSearchSystem:
             int: Total number of indexed articles, or 0 if no articles are indexed
         """
         logger.info("Getting total number of indexed articles")
-        if self.vector_store is None:
+        state = self._state
+        if state.vector_store is None:
             logger.debug("No articles indexed yet")
             return 0
-        return len(self.vector_store.index_to_docstore_id)
\ No newline at end of file
+        return state.size
+
+    def approximate_memory_bytes(self) -> int:
+        """
+        Estimate the memory held by the index: FAISS vector codes, document texts
+        and metadata, and BM25 postings. Memory-mapped codes are counted too, as
+        they are resident once searched, even though processes share them.
+        
+        Returns:
+            int: Estimated size in bytes
+        """
+        state = self._state
+        # Rough CPython costs of a metadata dict and of one posting dict entry
+        total = sum(len(postings) for postings in state.lexical_index.postings.values()) * 100
+        if state.vector_store is not None:
+            index = state.vector_store.index
+            total += state.size * index.sa_code_size()
+            docstore = state.vector_store.docstore
+            total += sum(len(docstore.search(doc_id).page_content) + 1000 for doc_id in self._doc_ids(state))
+        return total
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get hit-rate and eviction counters for the query caches.
+        
+        Returns:
+            Dict with the current index version and per-cache statistics
+        """
+        return {
+            "index_version": self.index_version,
+            "embedding_cache": self.embedding_cache.stats(),
+            "result_cache": self.result_cache.stats()
+        }
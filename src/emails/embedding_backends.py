@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import httpx
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from logging_config import setup_logging
+
+from .lexical_index import tokenize
+
+logger = setup_logging(__name__)
+
+EMBEDDING_BACKENDS = ("ollama", "local")
+
+
+class OllamaEmbeddingClient(Embeddings):
+    """
+    Embeddings from an Ollama server over pooled keep-alive HTTP connections.
+
+    Texts are sent to `/api/embed` in batches of `batch_size`. Batches of one call
+    run in parallel, and at most `max_connections` requests are open at a time.
+    Every request shares a connection pool, so no request pays a new TCP handshake.
+    """
+
+    def __init__(
+        self,
+        model: str = "mxbai-embed-large",
+        base_url: str = "http://localhost:11434",
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 4,
+        batch_size: int = 32,
+        keep_alive: Optional[str] = "5m"
+    ):
+        """
+        Args:
+            model: Name of the Ollama model to use for embeddings
+            base_url: URL of the Ollama server
+            timeout: Seconds to wait for a response
+            connect_timeout: Seconds to wait for a connection
+            max_connections: Concurrent requests, and connections kept alive
+            batch_size: Texts embedded per request
+            keep_alive: How long Ollama keeps the model loaded after a request
+        """
+        self.model = model
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.keep_alive = keep_alive
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        )
+        self._client = httpx.Client(base_url=base_url, timeout=self._timeout, limits=self._limits)
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="embed")
+        # An async client's connections belong to the event loop that opened them
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _payload(self, texts: List[str]) -> dict:
+        payload = {"model": self.model, "input": texts}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = self._client.post("/api/embed", json=self._payload(texts))
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = self._batches(texts)
+        logger.debug(f"Embedding {len(texts)} texts in {len(batches)} requests")
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+        return [
+            vector
+            for batch_vectors in self._executor.map(self._embed_batch, batches)
+            for vector in batch_vectors
+        ]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url, timeout=self._timeout, limits=self._limits
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    async def _aembed_batch(self, client: httpx.AsyncClient, texts: List[str]) -> List[List[float]]:
+        response = await client.post("/api/embed", json=self._payload(texts))
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        client = self._get_async_client()
+        # The pool limits keep at most max_connections of these requests open
+        results = await asyncio.gather(
+            *(self._aembed_batch(client, batch) for batch in self._batches(texts))
+        )
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def close(self):
+        self._client.close()
+        self._executor.shutdown(wait=False)
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Deterministic in-process embeddings for offline tests and benchmarks.
+
+    Each token is hashed into a signed bucket of a `size`-d vector, which is then
+    L2 normalized. Texts sharing words therefore score as similar, and the same text
+    always gets the same vector across processes, at a negligible cost per text.
+    """
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in tokenize(text):
+            digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vector[digest % self.size] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def create_embeddings(
+    backend: str = "ollama",
+    model_name: str = "mxbai-embed-large",
+    base_url: str = "http://localhost:11434",
+    timeout: float = 30.0,
+    max_connections: int = 4,
+    batch_size: int = 32,
+    size: int = 1024
+) -> Embeddings:
+    """
+    Create the embedding client of a backend.
+
+    Args:
+        backend: "ollama" for an Ollama server, or "local" for deterministic
+            in-process embeddings that need no server
+        model_name: Ollama model name
+        base_url: Ollama server URL
+        timeout: Ollama request timeout in seconds
+        max_connections: Concurrent Ollama requests
+        batch_size: Texts per Ollama request
+        size: Dimension of local embeddings
+
+    Returns:
+        Embeddings: The embedding client
+    """
+    if backend == "ollama":
+        return OllamaEmbeddingClient(
+            model=model_name,
+            base_url=base_url,
+            timeout=timeout,
+            max_connections=max_connections,
+            batch_size=batch_size
+        )
+    if backend == "local":
+        return LocalEmbeddings(size=size)
+    raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
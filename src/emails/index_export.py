@@ -0,0 +1,256 @@
+"""
+Portable exports of a whole search state, for bootstrapping new serving nodes.
+
+An export is a directory holding, per index (the root, or `shards/<key>` for a
+sharded index):
+
+- `vectors.npy`: the vectors as one contiguous float32 array in index order
+- `metadata.json`: document ids, texts and metadata fields stored as columns
+- `lexical_index.json`: the BM25 index
+- `neighbor_graph.json`: the related articles of every article
+
+plus `processed_emails.json` and a `manifest.json` naming the embedding model and
+holding a SHA-256 checksum of every file. Nothing is pickled, so exports can be
+checked and read without trusting the node that wrote them.
+
+Importing memory-maps the vectors and writes the native index layout without
+embedding anything, so a replica can open it read-only and serve right away.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+EXPORT_FORMAT = "email-search-export"
+EXPORT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+PROCESSED_EMAILS_FILE = "processed_emails.json"
+CHUNK_SIZE = 1 << 20
+
+
+class ExportError(ValueError):
+    """An export is incomplete, corrupt or incompatible with the importing node."""
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _files(path: str) -> Iterable[str]:
+    for root, _, names in os.walk(path):
+        for name in sorted(names):
+            if name != MANIFEST_FILE:
+                yield os.path.relpath(os.path.join(root, name), path)
+
+
+def export_index(search_system: Any, path: str, processed_emails: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Export a search system, written next to `path` and renamed into place when complete.
+
+    Args:
+        search_system: An EmailSearchSystem or ShardedEmailSearchSystem
+        path: Directory to create, an existing export there is replaced
+        processed_emails: IDs of the emails already indexed, so the new node does
+            not fetch them again
+
+    Returns:
+        Dict[str, Any]: The manifest
+    """
+    staging = f"{path.rstrip(os.sep)}.staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    logger.info(f"Exporting search index to {path}")
+    summary = search_system.export_to(staging)
+    with open(os.path.join(staging, PROCESSED_EMAILS_FILE), "w") as f:
+        json.dump(sorted(processed_emails), f)
+
+    manifest = {
+        "format": EXPORT_FORMAT,
+        "version": EXPORT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "model_name": search_system.model_name,
+        "partition": getattr(search_system, "partition", None),
+        **summary,
+        "files": {
+            name: {"sha256": _sha256(os.path.join(staging, name)),
+                   "bytes": os.path.getsize(os.path.join(staging, name))}
+            for name in _files(staging)
+        },
+    }
+    with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(staging, path)
+    logger.info(f"Exported {manifest['count']} articles to {path}")
+    return manifest
+
+
+def read_manifest(path: str, verify: bool = True) -> Dict[str, Any]:
+    """
+    Read the manifest of an export, checking every file against its checksum.
+
+    Raises:
+        ExportError: If the manifest is missing or foreign, or a file is missing or corrupt
+    """
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), "r") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        raise ExportError(f"No readable manifest in {path}: {e}")
+    if manifest.get("format") != EXPORT_FORMAT or manifest.get("version") != EXPORT_VERSION:
+        raise ExportError(f"{path} is not a version {EXPORT_VERSION} {EXPORT_FORMAT}")
+    if verify:
+        for name, expected in manifest["files"].items():
+            file_path = os.path.join(path, name)
+            if not os.path.exists(file_path) or _sha256(file_path) != expected["sha256"]:
+                raise ExportError(f"Export file {name} is missing or does not match its checksum")
+    return manifest
+
+
+def _import_index_dir(export_dir: str, base_dir: str):
+    """Write the native files of one index from its exported vectors and columns."""
+    vectors = np.load(os.path.join(export_dir, "vectors.npy"), mmap_mode="r")
+    with open(os.path.join(export_dir, "metadata.json"), "r") as f:
+        columns = json.load(f)
+
+    os.makedirs(base_dir, exist_ok=True)
+    shutil.copyfile(
+        os.path.join(export_dir, "lexical_index.json"), os.path.join(base_dir, "lexical_index.json")
+    )
+    # Without the graph the importing node rebuilds it when opening the index
+    if os.path.exists(os.path.join(export_dir, "neighbor_graph.json")):
+        shutil.copyfile(
+            os.path.join(export_dir, "neighbor_graph.json"), os.path.join(base_dir, "neighbor_graph.json")
+        )
+    doc_ids = columns["doc_ids"]
+    if not doc_ids:
+        return
+
+    # Exported vectors are already normalized, they are read from the page cache
+    # in one pass and never held twice
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    fields = columns["fields"]
+    docstore = InMemoryDocstore({
+        doc_id: Document(
+            page_content=text,
+            metadata={name: values[i] for name, values in fields.items()}
+        )
+        for i, (doc_id, text) in enumerate(zip(doc_ids, columns["texts"]))
+    })
+    # Same files as FAISS.save_local, so EmailSearchSystem opens them as usual
+    index_path = os.path.join(base_dir, "faiss_index")
+    os.makedirs(index_path, exist_ok=True)
+    faiss.write_index(index, os.path.join(index_path, "index.faiss"))
+    with open(os.path.join(index_path, "index.pkl"), "wb") as f:
+        pickle.dump((docstore, dict(enumerate(doc_ids))), f)
+
+
+def import_index(
+    path: str,
+    base_dir: str,
+    model_name: Optional[str] = None,
+    verify: bool = True
+) -> Dict[str, Any]:
+    """
+    Turn an export into the index files of `base_dir`, replacing any index there.
+
+    The index is written with flat storage; a writer configured for compressed
+    storage converts it when it opens it. Open the result with EmailSearchSystem
+    (or ShardedEmailSearchSystem with the manifest's partition) on `base_dir`.
+
+    Args:
+        path: Export directory
+        base_dir: Base directory of the importing node
+        model_name: Embedding model of the importing node; vectors of another
+            model would not be comparable with its query embeddings
+        verify: Check every file against the manifest checksums first
+
+    Returns:
+        Dict[str, Any]: The manifest
+
+    Raises:
+        ExportError: If the export is corrupt or was made with another model
+    """
+    manifest = read_manifest(path, verify=verify)
+    if model_name is not None and manifest["model_name"] != model_name:
+        raise ExportError(
+            f"Export was embedded with {manifest['model_name']}, this node uses {model_name}"
+        )
+
+    logger.info(f"Importing {manifest['count']} articles from {path} into {base_dir}")
+    for name in ("faiss_index", "shards", "lexical_index.json", "neighbor_graph.json", "exact_vectors.f32"):
+        target = os.path.join(base_dir, name)
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        elif os.path.exists(target):
+            os.remove(target)
+
+    if "shards" in manifest:
+        for key in manifest["shards"]:
+            _import_index_dir(os.path.join(path, "shards", key), os.path.join(base_dir, "shards", key))
+    else:
+        _import_index_dir(path, base_dir)
+    shutil.copyfile(
+        os.path.join(path, PROCESSED_EMAILS_FILE), os.path.join(base_dir, PROCESSED_EMAILS_FILE)
+    )
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import a portable search index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Export the index of a base directory")
+    export_parser.add_argument("base_dir")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--model-name", default="mxbai-embed-large")
+    export_parser.add_argument("--partition", choices=("month", "newsletter"))
+    import_parser = commands.add_parser("import", help="Import an export into a base directory")
+    import_parser.add_argument("path")
+    import_parser.add_argument("base_dir")
+    import_parser.add_argument("--model-name")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        manifest = import_index(args.path, args.base_dir, model_name=args.model_name)
+        print(f"Imported {manifest['count']} articles into {args.base_dir}")
+        return
+
+    from .email_searcher import EmailSearchSystem
+    from .sharded_searcher import ShardedEmailSearchSystem
+
+    # Exporting reads stored vectors only, nothing is embedded
+    kwargs = dict(base_dir=args.base_dir, model_name=args.model_name, read_only=True)
+    if args.partition:
+        search_system = ShardedEmailSearchSystem(partition=args.partition, **kwargs)
+    else:
+        search_system = EmailSearchSystem(**kwargs)
+    processed_path = os.path.join(args.base_dir, PROCESSED_EMAILS_FILE)
+    processed_emails = []
+    if os.path.exists(processed_path):
+        with open(processed_path, "r") as f:
+            processed_emails = json.load(f)
+    manifest = export_index(search_system, args.path, processed_emails)
+    print(f"Exported {manifest['count']} articles to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Continuous indexing: poll Gmail queries on a schedule and index what arrived.
+
+Each query is polled on its own schedule. After a poll finds new emails the
+query is polled again after `min_interval`; every empty poll multiplies the wait
+by `backoff`, up to `max_interval`, so quiet mailboxes cost a listing call every
+half hour rather than every minute.
+
+Polls only list emails received since the previous poll (Gmail's `after:`
+operator) and index at most `batch_size` of them at a time. When more arrived,
+the next batch runs right away, and the listing goes deeper until it reaches
+emails that were already indexed.
+
+Run it next to the API with EMAIL_SEARCH_INDEXING_QUERIES, or on its own:
+
+    PYTHONPATH=src python -m emails.indexing_daemon "from:dan@tldrnewsletter.com"
+"""
+
+import argparse
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+# Emails can be delivered with an internal date slightly before the poll that
+# should have seen them, polls therefore look back a little further
+LOOKBACK_SECONDS = 3600
+
+INDEXING_POLLS = metrics.counter(
+    "email_indexing_polls", "Scheduled indexing polls by outcome", ["query", "outcome"]
+)
+INDEXING_INTERVAL = metrics.gauge(
+    "email_indexing_interval_seconds", "Current wait between polls of a query", ["query"]
+)
+
+
+@dataclass
+class QuerySchedule:
+    """Polling state of one query."""
+    query: str
+    interval: float
+    next_run: float = 0.0
+    depth: int = 0  # Emails listed per poll, grows while catching up
+    since: Optional[float] = None  # Start of the last poll that caught up
+    catch_up_started: Optional[float] = None
+    last_run: Optional[float] = None
+    last_result: Dict[str, int] = field(default_factory=dict)
+    last_error: Optional[str] = None
+
+    def gmail_query(self) -> str:
+        if self.since is None:
+            return self.query
+        return f"{self.query} after:{int(self.since - LOOKBACK_SECONDS)}"
+
+
+class IndexingDaemon:
+    """
+    A daemon thread indexing new emails for a list of queries, with adaptive polling.
+    """
+
+    def __init__(
+        self,
+        index_batch: Callable[..., Dict[str, int]],
+        queries: List[str],
+        min_interval: float = 60.0,
+        max_interval: float = 1800.0,
+        backoff: float = 2.0,
+        batch_size: int = 20,
+        start: bool = True
+    ):
+        """
+        Args:
+            index_batch: Indexes one batch, called with the query, `max_results`
+                and `max_new`, e.g. EmailIndexingService.index_batch
+            queries: Gmail search queries to poll
+            min_interval: Seconds between polls while emails keep arriving
+            max_interval: Longest wait between polls of a quiet query
+            backoff: Factor the wait grows by after each empty or failed poll
+            batch_size: Emails listed and indexed per poll
+            start: Start polling right away, otherwise call start() or run_pending()
+        """
+        if not queries:
+            raise ValueError("The indexing daemon needs at least one query")
+        if min_interval <= 0 or max_interval < min_interval or backoff < 1 or batch_size < 1:
+            raise ValueError(
+                "Expected 0 < min_interval <= max_interval, backoff >= 1 and batch_size >= 1"
+            )
+        self.index_batch = index_batch
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.schedules = [
+            QuerySchedule(query=query, interval=min_interval, depth=batch_size) for query in queries
+        ]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="indexing", daemon=True)
+        if start:
+            self.start()
+
+    def start(self):
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            wait = min(schedule.next_run for schedule in self.schedules) - time.monotonic()
+            self._stop.wait(max(wait, 0.0))
+
+    def run_pending(self) -> int:
+        """
+        Poll every query that is due.
+
+        Returns:
+            int: Articles added to the index
+        """
+        added = 0
+        for schedule in self.schedules:
+            if self._stop.is_set():
+                break
+            if schedule.next_run <= time.monotonic():
+                added += self.poll(schedule)
+        return added
+
+    def poll(self, schedule: QuerySchedule) -> int:
+        """Run one batch of a query and schedule its next poll."""
+        started = time.time()
+        if schedule.catch_up_started is None:
+            schedule.catch_up_started = started
+        schedule.last_run = started
+        try:
+            result = self.index_batch(
+                schedule.gmail_query(), max_results=schedule.depth, max_new=self.batch_size
+            )
+        except Exception as e:
+            schedule.last_error = str(e)
+            INDEXING_POLLS.labels(query=schedule.query, outcome="error").inc()
+            logger.error(f"Indexing poll of '{schedule.query}' failed: {e}", exc_info=True)
+            self._back_off(schedule)
+            return 0
+
+        schedule.last_result = result
+        schedule.last_error = None
+        INDEXING_POLLS.labels(query=schedule.query, outcome="new" if result["new_emails"] else "empty").inc()
+        if result["new_emails"] and result["unprocessed"] > result["new_emails"]:
+            # More new emails were listed than one batch handles
+            schedule.next_run = time.monotonic()
+        elif result["new_emails"] and result["listed"] >= schedule.depth:
+            # Every listed email may be new, older ones could be further back
+            schedule.depth *= 2
+            schedule.next_run = time.monotonic()
+        else:
+            schedule.since = schedule.catch_up_started
+            schedule.catch_up_started = None
+            schedule.depth = self.batch_size
+            if result["new_emails"]:
+                schedule.interval = self.min_interval
+                schedule.next_run = time.monotonic() + schedule.interval
+            else:
+                self._back_off(schedule)
+        INDEXING_INTERVAL.labels(query=schedule.query).set(schedule.interval)
+        return result["new_articles"]
+
+    def _back_off(self, schedule: QuerySchedule):
+        schedule.next_run = time.monotonic() + schedule.interval
+        schedule.interval = min(schedule.interval * self.backoff, self.max_interval)
+        INDEXING_INTERVAL.labels(query=schedule.query).set(schedule.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            schedule.query: {
+                "interval": schedule.interval,
+                "next_run_in": round(max(schedule.next_run - now, 0.0), 3),
+                "last_run": schedule.last_run,
+                "last_result": schedule.last_result,
+                "last_error": schedule.last_error,
+            }
+            for schedule in self.schedules
+        }
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop polling, waiting up to `timeout` seconds for a running batch to finish."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep the search index up to date with new emails")
+    parser.add_argument("queries", nargs="+", help="Gmail search queries to poll")
+    parser.add_argument("--base-dir", default=".email_search")
+    parser.add_argument("--model-name", default="mxbai-embed-large")
+    parser.add_argument("--partition", choices=("month", "newsletter"))
+    parser.add_argument("--user-credentials", default="secrets/user_token.pickle")
+    parser.add_argument("--min-interval", type=float, default=60.0)
+    parser.add_argument("--max-interval", type=float, default=1800.0)
+    parser.add_argument("--backoff", type=float, default=2.0)
+    parser.add_argument("--batch-size", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    from .email_indexer import EmailIndexingService
+    from .email_searcher import EmailSearchSystem
+    from .sharded_searcher import ShardedEmailSearchSystem
+
+    if args.partition:
+        search_system = ShardedEmailSearchSystem(
+            base_dir=args.base_dir, model_name=args.model_name, partition=args.partition
+        )
+    else:
+        search_system = EmailSearchSystem(base_dir=args.base_dir, model_name=args.model_name)
+    indexing_service = EmailIndexingService(
+        cache_dir=args.base_dir, search_system=search_system, user_credentials=args.user_credentials
+    )
+    daemon = IndexingDaemon(
+        indexing_service.index_batch,
+        args.queries,
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        backoff=args.backoff,
+        batch_size=args.batch_size
+    )
+    logger.info(f"Polling {len(args.queries)} queries, press Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        logger.info("Stopping, waiting for the running batch")
+        daemon.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import heapq
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from typing import (Callable, Dict, Iterable, List, NamedTuple, Optional,
+                    Set, Tuple)
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class CorpusStats(NamedTuple):
+    """
+    The collection statistics BM25 scores depend on, for the terms of one query.
+    Indexes searched with the same statistics give comparable scores.
+    """
+    n_docs: int
+    total_length: int
+    doc_freqs: Dict[str, int]
+
+
+def merge_stats(stats: Iterable[CorpusStats]) -> CorpusStats:
+    """Statistics of the union of several indexes, e.g. the shards of a sharded index."""
+    n_docs, total_length, doc_freqs = 0, 0, Counter()
+    for part in stats:
+        n_docs += part.n_docs
+        total_length += part.total_length
+        doc_freqs.update(part.doc_freqs)
+    return CorpusStats(n_docs, total_length, dict(doc_freqs))
+
+
+class BM25Index:
+    """
+    An in-memory inverted index ranking documents with Okapi BM25.
+
+    Documents are identified by the same IDs used in the vector store docstore,
+    so lexical hits can be resolved and fused with vector hits directly.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            k1: Term frequency saturation parameter
+            b: Document length normalization parameter
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        # Terms whose posting dict this index may modify in place; None means all.
+        # After copy() posting dicts are shared until one side writes to them.
+        self._owned: Optional[Set[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_lengths
+
+    def copy(self) -> "BM25Index":
+        """
+        Copy the index in time proportional to its vocabulary and document count.
+        Posting lists are shared and only copied by whichever index changes them.
+        """
+        clone = BM25Index(k1=self.k1, b=self.b)
+        clone.postings = dict(self.postings)
+        clone.doc_lengths = dict(self.doc_lengths)
+        clone.total_length = self.total_length
+        clone._owned = set()
+        self._owned = set()
+        return clone
+
+    def _writable_postings(self, term: str) -> Dict[str, int]:
+        docs = self.postings.get(term)
+        if docs is None:
+            docs = self.postings[term] = {}
+        elif self._owned is not None and term not in self._owned:
+            docs = self.postings[term] = dict(docs)
+        if self._owned is not None:
+            self._owned.add(term)
+        return docs
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Add a document, replacing any previous version with the same ID."""
+        if doc_id in self.doc_lengths:
+            self.remove([doc_id])
+        tokens = tokenize(text)
+        for term, count in Counter(tokens).items():
+            self._writable_postings(term)[doc_id] = count
+        self.doc_lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+
+    def remove(self, doc_ids: Iterable[str]) -> None:
+        """Remove documents from the index in a single pass over the postings."""
+        removed = set()
+        for doc_id in doc_ids:
+            length = self.doc_lengths.pop(doc_id, None)
+            if length is not None:
+                self.total_length -= length
+                removed.add(doc_id)
+        if not removed:
+            return
+        for term in list(self.postings):
+            matches = removed.intersection(self.postings[term])
+            if not matches:
+                continue
+            docs = self._writable_postings(term)
+            for doc_id in matches:
+                del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+
+    def stats(self, query: str) -> CorpusStats:
+        """Get the statistics scoring a query depends on."""
+        return CorpusStats(
+            len(self.doc_lengths),
+            self.total_length,
+            {term: len(self.postings.get(term, ())) for term in set(tokenize(query))}
+        )
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        accept: Optional[Callable[[str], bool]] = None,
+        stats: Optional[CorpusStats] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Rank documents against a query.
+
+        Args:
+            query: Search query
+            k: Number of results to return
+            accept: Optional predicate on document IDs; rejected documents are skipped
+            stats: Statistics to score with instead of this index's own, see merge_stats
+
+        Returns:
+            List of (doc_id, score) tuples, highest score first
+        """
+        if not self.doc_lengths:
+            return []
+        if stats is None:
+            stats = self.stats(query)
+        n_docs = stats.n_docs
+        avg_length = stats.total_length / n_docs
+
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            doc_freq = stats.doc_freqs.get(term, len(docs))
+            idf = math.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        candidates = scores.items()
+        if accept is not None:
+            candidates = [(doc_id, score) for doc_id, score in candidates if accept(doc_id)]
+        return heapq.nlargest(k, candidates, key=lambda item: item[1])
+
+    def save(self, path: str) -> None:
+        logger.debug(f"Saving lexical index with {len(self)} documents to {path}")
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "k1": self.k1,
+                    "b": self.b,
+                    "postings": self.postings,
+                    "doc_lengths": self.doc_lengths,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        logger.debug(f"Loading lexical index from {path}")
+        with open(path, "r") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        index.postings.update(data["postings"])
+        index.doc_lengths = data["doc_lengths"]
+        index.total_length = sum(index.doc_lengths.values())
+        return index
@@ -0,0 +1,178 @@
+"""
+Body extraction from Gmail API message payloads.
+
+A payload is a tree of MIME parts: newsletters usually arrive as
+`multipart/alternative`, often nested in a `multipart/mixed` with attachments.
+The walker visits the tree once, picks the best text part and decodes only
+that one. Bodies Gmail leaves out of `messages.get` responses, which carry an
+`attachmentId` instead of `data`, are downloaded only when they are picked.
+Messages read from local archives go through the same part selection.
+"""
+
+import base64
+import codecs
+import html
+import re
+from email.message import Message
+from typing import Any, Callable, Dict, List, Optional
+
+# Most preferred first, the parsers read plain text
+TEXT_TYPES = ("text/plain", "text/html")
+DEFAULT_CHARSET = "utf-8"
+
+_CHARSET_PATTERN = re.compile(r'charset\s*=\s*"?([^";\s]+)', re.IGNORECASE)
+_HIDDEN_HTML_PATTERN = re.compile(r"<(script|style|head)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_BREAK_PATTERN = re.compile(r"<(br|/p|/div|/tr|/h[1-6]|/li)\b[^>]*>", re.IGNORECASE)
+_TAG_PATTERN = re.compile(r"<[^>]+>")
+_BLANK_LINES_PATTERN = re.compile(r"\n\s*\n\s*\n+")
+
+
+def get_header(part: Dict, name: str) -> Optional[str]:
+    """The value of a header of a part, header names are case insensitive."""
+    name = name.lower()
+    for header in part.get("headers", ()):
+        if header["name"].lower() == name:
+            return header["value"]
+    return None
+
+
+def parse_message_id(value: Optional[str]) -> Optional[str]:
+    """A Message-ID header value without its angle brackets, None if it is empty."""
+    if not value:
+        return None
+    return str(value).strip().strip("<>") or None
+
+
+def is_attachment(part: Dict) -> bool:
+    if part.get("filename"):
+        return True
+    disposition = get_header(part, "Content-Disposition")
+    return disposition is not None and disposition.lower().startswith("attachment")
+
+
+def _find_text_part(
+    root: Any,
+    children: Callable[[Any], Optional[List[Any]]],
+    mime_type: Callable[[Any], str],
+    attachment: Callable[[Any], bool]
+) -> Any:
+    """The part selection of find_body_part over any representation of MIME parts."""
+    fallback = None
+    stack = [root]
+    while stack:
+        part = stack.pop()
+        part_children = children(part)
+        if part_children:
+            # Reversed so parts are visited in document order
+            stack.extend(reversed(part_children))
+            continue
+        part_type = mime_type(part)
+        if part_type not in TEXT_TYPES or attachment(part):
+            continue
+        if part_type == TEXT_TYPES[0]:
+            return part
+        if fallback is None:
+            fallback = part
+    return fallback
+
+
+def find_body_part(payload: Dict) -> Optional[Dict]:
+    """
+    Find the part holding the body of a message in one depth-first traversal.
+
+    The first `text/plain` part that is not an attachment ends the walk, the
+    first `text/html` one is kept as a fallback in case there is no plain text.
+
+    Args:
+        payload: The `payload` of a Gmail API message
+
+    Returns:
+        Optional[Dict]: The part, or None if the message has no text body
+    """
+    return _find_text_part(
+        payload,
+        lambda part: part.get("parts"),
+        lambda part: part.get("mimeType", "").lower(),
+        is_attachment
+    )
+
+
+def _known_charset(charset: Optional[str]) -> str:
+    if not charset:
+        return DEFAULT_CHARSET
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return DEFAULT_CHARSET
+
+
+def get_charset(part: Dict) -> str:
+    """The charset of a part, UTF-8 when it is missing or unknown to Python."""
+    content_type = get_header(part, "Content-Type")
+    match = _CHARSET_PATTERN.search(content_type) if content_type else None
+    return _known_charset(match.group(1) if match else None)
+
+
+def decode_data(data: str, charset: str = DEFAULT_CHARSET) -> str:
+    """Decode base64url body data, which Gmail may send without padding."""
+    raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    return raw.decode(charset, errors="replace")
+
+
+def html_to_text(markup: str) -> str:
+    """Cheap markup removal for HTML-only messages, keeping line breaks between blocks."""
+    text = _HIDDEN_HTML_PATTERN.sub("", markup)
+    text = _BREAK_PATTERN.sub("\n", text)
+    text = html.unescape(_TAG_PATTERN.sub("", text))
+    return _BLANK_LINES_PATTERN.sub("\n\n", text).strip()
+
+
+def extract_body(
+    payload: Dict, fetch_attachment: Optional[Callable[[str], str]] = None
+) -> Optional[str]:
+    """
+    Extract the text body of a message, as plain text.
+
+    Args:
+        payload: The `payload` of a Gmail API message
+        fetch_attachment: Downloads the base64url data of an attachment ID, for
+            bodies Gmail did not inline. Such bodies are skipped without it.
+
+    Returns:
+        Optional[str]: The body, or None if the message has no readable text body
+    """
+    part = find_body_part(payload)
+    if part is None:
+        return None
+    body = part.get("body", {})
+    data = body.get("data")
+    if data is None:
+        attachment_id = body.get("attachmentId")
+        if attachment_id is None or fetch_attachment is None:
+            return None
+        data = fetch_attachment(attachment_id)
+    text = decode_data(data, get_charset(part))
+    if part.get("mimeType", "").lower() == "text/html":
+        return html_to_text(text)
+    return text
+
+
+def extract_message_body(message: Message) -> Optional[str]:
+    """
+    Like extract_body, for a message parsed with the `email` package, e.g. one
+    read from an mbox file or Maildir. Parts are picked and decoded by the same
+    rules; the transfer encoding is undone by the `email` package.
+    """
+    part = _find_text_part(
+        message,
+        lambda part: part.get_payload() if part.is_multipart() else None,
+        lambda part: part.get_content_type(),
+        lambda part: part.get_content_disposition() == "attachment" or bool(part.get_filename())
+    )
+    if part is None:
+        return None
+    raw = part.get_payload(decode=True) or b""
+    text = raw.decode(_known_charset(part.get_content_charset()), errors="replace")
+    if part.get_content_type() == "text/html":
+        return html_to_text(text)
+    return text
@@ -0,0 +1,140 @@
+import json
+from typing import Dict, Iterable, List, Set, Tuple
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+Neighbors = List[Tuple[str, float]]
+
+
+class NeighborGraphUnavailable(RuntimeError):
+    """The neighbor graph of an index is being built, or was not saved by its writer."""
+
+
+class NeighborGraph:
+    """
+    The k nearest neighbors of every indexed article by cosine similarity.
+
+    Documents are identified by the same IDs used in the vector store docstore.
+    The graph is kept up to date as articles are added, so related articles are
+    looked up without embedding anything or searching the vector index.
+    """
+
+    def __init__(self, k: int = 10):
+        """
+        Args:
+            k: Neighbors kept per article
+        """
+        self.k = k
+        # Neighbor lists are never modified in place, so copies can share them
+        self.neighbors: Dict[str, Neighbors] = {}
+
+    def __len__(self) -> int:
+        return len(self.neighbors)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.neighbors
+
+    def copy(self) -> "NeighborGraph":
+        clone = NeighborGraph(k=self.k)
+        clone.neighbors = dict(self.neighbors)
+        return clone
+
+    def get(self, doc_id: str, k: int = None) -> Neighbors:
+        """The neighbors of an article, most similar first; empty for unknown articles."""
+        return self.neighbors.get(doc_id, [])[:k or self.k]
+
+    def add(self, hits: Dict[str, Neighbors]) -> Set[str]:
+        """
+        Add articles with the nearest neighbors found for them in the index, and
+        link each one into the lists of its neighbors it is closer to than their
+        current k-th neighbor.
+
+        Links are only added in the direction a search found them, so an older
+        article may miss a new neighbor that did not rank it in turn. Searching
+        deeper than k keeps this rare.
+
+        Args:
+            hits: Neighbor hits by document ID, which may include the article itself
+
+        Returns:
+            Set[str]: IDs of the older articles whose neighbors changed
+        """
+        changed = set()
+        for doc_id, doc_hits in hits.items():
+            self.neighbors[doc_id] = [hit for hit in doc_hits if hit[0] != doc_id][:self.k]
+        for doc_id, doc_hits in hits.items():
+            for neighbor_id, score in doc_hits:
+                if neighbor_id == doc_id or neighbor_id in hits or neighbor_id not in self.neighbors:
+                    continue
+                current = self.neighbors[neighbor_id]
+                if len(current) < self.k or score > current[-1][1]:
+                    updated = sorted(current + [(doc_id, score)], key=lambda hit: hit[1], reverse=True)
+                    self.neighbors[neighbor_id] = updated[:self.k]
+                    changed.add(neighbor_id)
+        return changed
+
+    def remove(self, doc_ids: Iterable[str]) -> Set[str]:
+        """
+        Remove articles and every link to them.
+
+        Returns:
+            Set[str]: IDs of the remaining articles that lost a neighbor; they hold
+                fewer than k until they are searched again
+        """
+        removed = {doc_id for doc_id in doc_ids if self.neighbors.pop(doc_id, None) is not None}
+        affected = set()
+        if not removed:
+            return affected
+        for doc_id, neighbors in self.neighbors.items():
+            if any(neighbor_id in removed for neighbor_id, _ in neighbors):
+                affected.add(doc_id)
+        for doc_id in affected:
+            self.neighbors[doc_id] = [hit for hit in self.neighbors[doc_id] if hit[0] not in removed]
+        return affected
+
+    def clusters(self, min_score: float) -> List[List[str]]:
+        """
+        Group near-duplicate articles: the connected components of the graph
+        restricted to links scoring at least `min_score`.
+
+        Returns:
+            List[List[str]]: Clusters of two or more articles, largest first
+        """
+        parent = {doc_id: doc_id for doc_id in self.neighbors}
+
+        def find(doc_id: str) -> str:
+            while parent[doc_id] != doc_id:
+                parent[doc_id] = parent[parent[doc_id]]
+                doc_id = parent[doc_id]
+            return doc_id
+
+        for doc_id, neighbors in self.neighbors.items():
+            for neighbor_id, score in neighbors:
+                if score < min_score:
+                    break
+                if neighbor_id in parent:
+                    parent[find(neighbor_id)] = find(doc_id)
+
+        groups: Dict[str, List[str]] = {}
+        for doc_id in self.neighbors:
+            groups.setdefault(find(doc_id), []).append(doc_id)
+        return sorted((group for group in groups.values() if len(group) > 1), key=len, reverse=True)
+
+    def save(self, path: str) -> None:
+        logger.debug(f"Saving neighbor graph of {len(self)} articles to {path}")
+        with open(path, "w") as f:
+            json.dump({"k": self.k, "neighbors": self.neighbors}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "NeighborGraph":
+        logger.debug(f"Loading neighbor graph from {path}")
+        with open(path, "r") as f:
+            data = json.load(f)
+        graph = cls(k=data["k"])
+        graph.neighbors = {
+            doc_id: [(neighbor_id, score) for neighbor_id, score in neighbors]
+            for doc_id, neighbors in data["neighbors"].items()
+        }
+        return graph
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from typing import List
+
+from emails.article import Article
 
 
 class ContentParserInterface(ABC):
@@ -8,7 +10,7 @@ class ContentParserInterface(ABC):
     """
 
     @abstractmethod
-    def parse_content(self, content: str) -> List[Dict[str, str]]:
+    def parse_content(self, content: str) -> List[Article]:
         """
         Parse content and extract articles.
 
@@ -16,7 +18,7 @@ class ContentParserInterface(ABC):
             content: Raw email content
 
         Returns:
-            List of dictionaries containing:
+            List of articles with:
                 - title: Article title
                 - content: Article content
                 - section: Section the article belongs to
@@ -1,11 +1,20 @@
 import re
+import sys
 from typing import Dict, List, Tuple
 
+import metrics
+import tracing
+from emails.article import Article
 from emails.parsers.content_parser_interface import ContentParserInterface
 from logging_config import setup_logging
 
 logger = setup_logging(__name__)
 
+PARSE_SECONDS = metrics.histogram("email_parse_seconds", "Time spent parsing one newsletter")
+ARTICLES_PARSED = metrics.counter(
+    "email_parse_articles", "Articles extracted from newsletters", ["newsletter_type"]
+)
+
 
 class TLDRContentParser(ContentParserInterface):
     """
@@ -45,7 +54,14 @@ class TLDRContentParser(ContentParserInterface):
 
         logger.info("TLDRContentParser initialized with patterns")
 
-    def parse_content(self, content: str) -> List[Dict[str, str]]:
+    def parse_content(self, content: str) -> List[Article]:
+        with PARSE_SECONDS.time(), tracing.span("parse"):
+            articles = self._parse_content(content)
+        if articles:
+            ARTICLES_PARSED.labels(newsletter_type=articles[0].newsletter_type).inc(len(articles))
+        return articles
+
+    def _parse_content(self, content: str) -> List[Article]:
         logger.info("Starting content parsing")
         newsletter_type = "TLDR AI" if "TLDR AI" in content else "TLDR"
         logger.debug(f"Detected newsletter type: {newsletter_type}")
@@ -67,18 +83,19 @@ class TLDRContentParser(ContentParserInterface):
                 continue
 
             if self._is_section_header(line):
-                current_section = line
-                logger.debug(f"Found section header: {current_section}")
+                # Interned, so all articles of a section share one string
+                current_section = sys.intern(line)
+                logger.debug("Found section header: %s", current_section)
                 i += 1
                 continue
             
             if self._is_article_start(line):
-                logger.debug(f"Found article start at line {i}")
+                logger.debug("Found article start at line %d", i)
                 article, i = self._parse_article(
                     lines, i, current_section, newsletter_type, link_mappings
                 )
                 if article:
-                    logger.debug(f"Successfully parsed article: {article['title']}")
+                    logger.debug("Successfully parsed article: %s", article.title)
                     articles.append(article)
                 continue
             
@@ -165,7 +182,7 @@ class TLDRContentParser(ContentParserInterface):
 
     def _parse_article(
         self, lines: List[str], start_index: int, current_section: str, newsletter_type: str, link_mappings: Dict[str, str]
-    ) -> Tuple[Dict[str, str], int]:
+    ) -> Tuple[Article, int]:
         """Parse an article starting from the given index."""
         i = start_index
         line = lines[i].strip()
@@ -192,14 +209,14 @@ class TLDRContentParser(ContentParserInterface):
         # Clean and assemble content
         cleaned_content = self.emoji_pattern.sub('', ' '.join(content_lines)).strip()
 
-        article = {
-            'title': title,
-            'content': cleaned_content,
-            'section': current_section,
-            'reading_time': reading_time,
-            'newsletter_type': newsletter_type,
-            'link': link
-        }
+        article = Article(
+            title=title,
+            content=cleaned_content,
+            section=current_section,
+            reading_time=reading_time,
+            newsletter_type=newsletter_type,
+            link=link
+        )
 
         return article, i
 
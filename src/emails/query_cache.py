@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import metrics
+
+CACHE_HITS = metrics.counter("email_search_cache_hits", "Cache hits", ["cache"])
+CACHE_MISSES = metrics.counter("email_search_cache_misses", "Cache misses", ["cache"])
+
+
+def normalize_query(text: str) -> str:
+    """Collapse whitespace so trivially different spellings share a cache entry."""
+    return " ".join(text.split())
+
+
+class LRUCache:
+    """
+    A thread-safe least-recently-used cache that keeps hit, miss and eviction counters.
+    """
+
+    def __init__(self, maxsize: int = 1024, name: Optional[str] = None):
+        """
+        Args:
+            maxsize: Maximum number of entries kept before the least recently
+                used one is evicted. A value of 0 disables caching.
+            name: Label of the cache in the hit and miss counters exported as
+                metrics, which add up every cache of the same name
+        """
+        self.maxsize = maxsize
+        self._hit_counter = CACHE_HITS.labels(cache=name) if name else None
+        self._miss_counter = CACHE_MISSES.labels(cache=name) if name else None
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                if self._miss_counter is not None:
+                    self._miss_counter.inc()
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            if self._hit_counter is not None:
+                self._hit_counter.inc()
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every entry, counting it as an invalidation rather than an eviction."""
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the cache counters.
+
+        Returns:
+            Dict with size, maxsize, hits, misses, hit_rate, evictions and invalidations
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,125 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+
+class RetentionPolicy(NamedTuple):
+    """
+    Which articles to keep in the index.
+
+    Ages are measured from the article's email date; undated articles never expire
+    by age. When the index holds more than `max_articles`, the oldest articles are
+    deleted first, undated ones before any dated one.
+    """
+
+    max_age_days: Optional[int] = None
+    max_articles: Optional[int] = None
+    # Per newsletter type overrides of max_age_days, e.g. {"TLDR Crypto": 30}
+    newsletter_max_age_days: Optional[Dict[str, int]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(
+            self.max_age_days is not None
+            or self.max_articles is not None
+            or self.newsletter_max_age_days
+        )
+
+    def max_age_for(self, newsletter_type: Optional[str]) -> Optional[int]:
+        overrides = self.newsletter_max_age_days or {}
+        return overrides.get(newsletter_type, self.max_age_days)
+
+    def is_expired(self, metadata: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+        """Whether an article is past the maximum age of its newsletter type."""
+        max_age = self.max_age_for(metadata.get("newsletter_type"))
+        date = metadata.get("date")
+        if max_age is None or not date:
+            return False
+        cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=max_age)
+        # Dates are ISO strings, so they compare in order as text
+        return date < cutoff.isoformat()
+
+    def select_expired(
+        self,
+        articles: Dict[str, Dict[str, Any]],
+        now: Optional[datetime] = None
+    ) -> List[str]:
+        """
+        Get the ids of the articles to delete.
+
+        Args:
+            articles: Article metadata by document id
+            now: Reference time for ages, defaults to the current time
+
+        Returns:
+            List[str]: Ids of aged out articles, then of the oldest articles over max_articles
+        """
+        now = now or datetime.now(timezone.utc)
+        expired = [doc_id for doc_id, metadata in articles.items() if self.is_expired(metadata, now)]
+        if self.max_articles is not None:
+            expired_set = set(expired)
+            remaining = [doc_id for doc_id in articles if doc_id not in expired_set]
+            excess = len(remaining) - self.max_articles
+            if excess > 0:
+                remaining.sort(key=lambda doc_id: articles[doc_id].get("date") or "")
+                expired.extend(remaining[:excess])
+        return expired
+
+
+def apply_retention(
+    search_system: Any,
+    policy: RetentionPolicy,
+    now: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """
+    Delete the articles a policy expires from a search system.
+
+    Args:
+        search_system: Search system with `article_metadata` and `delete_articles`
+        policy: Retention policy to enforce
+        now: Reference time for ages, defaults to the current time
+
+    Returns:
+        List[Dict[str, Any]]: Metadata of the deleted articles
+    """
+    articles = search_system.article_metadata()
+    expired = policy.select_expired(articles, now)
+    if not expired:
+        logger.debug(f"No articles expired out of {len(articles)}")
+        return []
+    search_system.delete_articles(expired)
+    logger.info(f"Retention deleted {len(expired)} of {len(articles)} articles")
+    return [articles[doc_id] for doc_id in expired]
+
+
+class RetentionWorker:
+    """
+    A daemon thread enforcing retention periodically. Deletions build and swap in a
+    compacted copy of the index, so searches keep running on the previous state.
+    """
+
+    def __init__(self, run: Callable[[], Any], interval: float = 3600.0):
+        """
+        Args:
+            run: Applies the retention policy once, e.g. EmailIndexingService.apply_retention
+            interval: Seconds between runs
+        """
+        self.run = run
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="retention", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run()
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}", exc_info=True)
+
+    def close(self):
+        self._stop.set()
@@ -0,0 +1,600 @@
+import contextvars
+import heapq
+import os
+import re
+import shutil
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from logging_config import setup_logging
+
+from .email_searcher import (SEARCH_MODES, SEARCHES, EmailSearchSystem,
+                             SearchCandidates, aembed_cached, embed_cached,
+                             merge_hits, saved_article_count, search_depth)
+from .embedding_backends import create_embeddings
+from .lexical_index import CorpusStats, merge_stats
+from .neighbor_graph import NeighborGraphUnavailable
+from .query_cache import LRUCache, normalize_query
+
+logger = setup_logging(__name__)
+
+PARTITIONS = ("month", "newsletter")
+UNDATED_SHARD = "undated"
+
+
+def newsletter_shard_key(newsletter_type: Optional[str]) -> str:
+    """Turn a newsletter type such as "TLDR AI" into a shard key such as "tldr-ai"."""
+    return re.sub(r"[^a-z0-9]+", "-", (newsletter_type or "unknown").lower()).strip("-")
+
+
+class ShardedEmailSearchSystem:
+    """
+    A search system that partitions articles into independent shards by email month
+    or newsletter type. Each shard is a regular EmailSearchSystem in its own directory,
+    so shards can be loaded, evicted, dropped and rebuilt independently. Searches embed
+    the query once and fan out to the relevant shards in parallel.
+    """
+
+    def __init__(
+        self,
+        base_dir: str = ".email_search",
+        model_name: str = "mxbai-embed-large",
+        partition: str = "month",
+        max_loaded_shards: int = 12,
+        max_workers: int = 4,
+        embedding_cache_size: int = 1024,
+        result_cache_size: int = 256,
+        **shard_kwargs
+    ):
+        """
+        Initialize the sharded search system.
+
+        Args:
+            base_dir: Base directory; shards live in `<base_dir>/shards/<key>`
+            model_name: Name of the Ollama model to use for embeddings
+            partition: "month" to shard by email date (YYYY-MM) or "newsletter"
+                to shard by newsletter type
+            max_loaded_shards: Number of shards kept in memory before the least
+                recently used one is evicted
+            max_workers: Number of shards searched in parallel
+            embedding_cache_size: Number of query embeddings kept in memory
+            result_cache_size: Number of merged search result lists kept in memory
+            **shard_kwargs: Extra EmailSearchSystem arguments used for every shard
+        """
+        logger.info(f"Initializing ShardedEmailSearchSystem with base_dir={base_dir}, partition={partition}")
+        if partition not in PARTITIONS:
+            raise ValueError(f"Unknown partition '{partition}', expected one of {PARTITIONS}")
+
+        self.shards_dir = os.path.join(base_dir, "shards")
+        os.makedirs(self.shards_dir, exist_ok=True)
+        self.model_name = model_name
+        self.partition = partition
+        self.max_loaded_shards = max_loaded_shards
+        self.shard_kwargs = shard_kwargs
+
+        # Shards share one embedding client and cache, so a query is only
+        # embedded once however many shards it fans out to
+        self.embedding_cache = LRUCache(embedding_cache_size, name="embedding")
+        # Results are ranked over every shard, so they are cached here rather than by shards
+        self.result_cache = LRUCache(result_cache_size, name="result")
+        shard_kwargs["result_cache_size"] = 0
+        # Created here rather than by the first shard, so queries are embedded
+        # without loading any shard
+        self.embeddings = shard_kwargs.pop("embeddings", None) or create_embeddings("ollama", model_name)
+        self._shards: "OrderedDict[str, EmailSearchSystem]" = OrderedDict()
+        # Shards being loaded, and the number of users of each loaded shard
+        self._loading: Dict[str, Future] = {}
+        self._pins: Counter = Counter()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard-search")
+        # Bumped by every write, shard versions are only known while they are loaded
+        self._version = 0
+
+    @property
+    def index_version(self) -> int:
+        return self._version
+
+    def shard_key(self, article: Dict) -> str:
+        """Get the key of the shard an article belongs to."""
+        if self.partition == "newsletter":
+            return newsletter_shard_key(article.get("newsletter_type"))
+        date = article.get("date")
+        return date[:7] if date else UNDATED_SHARD
+
+    def list_shards(self) -> List[str]:
+        """Get the keys of all shards on disk, sorted."""
+        return sorted(
+            name for name in os.listdir(self.shards_dir)
+            if os.path.isdir(os.path.join(self.shards_dir, name))
+        )
+
+    def _load_shard(self, key: str) -> EmailSearchSystem:
+        logger.info(f"Loading shard {key}")
+        shard = EmailSearchSystem(
+            base_dir=os.path.join(self.shards_dir, key),
+            model_name=self.model_name,
+            embeddings=self.embeddings,
+            **self.shard_kwargs
+        )
+        shard.embedding_cache = self.embedding_cache
+        return shard
+
+    def _acquire(self, key: str) -> EmailSearchSystem:
+        """
+        Get a shard and pin it in memory until _release. A shard missing from
+        memory is loaded without holding the lock, other shards stay available
+        meanwhile and concurrent callers wait for the same load.
+        """
+        while True:
+            with self._lock:
+                shard = self._shards.get(key)
+                if shard is not None:
+                    self._shards.move_to_end(key)
+                    self._pins[key] += 1
+                    return shard
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = Future()
+                    break
+            # Loaded by another caller, which may have failed; pin it on the next pass
+            loading.result()
+
+        try:
+            shard = self._load_shard(key)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[key]
+            self._shards[key] = shard
+            self._pins[key] += 1
+            self._evict_unpinned()
+        loading.set_result(shard)
+        return shard
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            self._pins[key] -= 1
+            if not self._pins[key]:
+                del self._pins[key]
+            self._evict_unpinned()
+
+    def _evict_unpinned(self) -> None:
+        """Evict least recently used shards over the limit, skipping pinned ones. Holds the lock."""
+        excess = len(self._shards) - self.max_loaded_shards
+        for key in [key for key in self._shards if key not in self._pins][:max(excess, 0)]:
+            del self._shards[key]
+            logger.info(f"Evicted shard {key}")
+
+    @contextmanager
+    def pinned_shards(self, keys: List[str]) -> Iterator[List[EmailSearchSystem]]:
+        """
+        Use shards, loading them as needed. They are not evicted until the block
+        exits, so a writer is never evicted and reloaded as a second writer on
+        the same directory, and searches keep their shards loaded.
+        """
+        acquired, shards = [], []
+        try:
+            for key in keys:
+                shards.append(self._acquire(key))
+                acquired.append(key)
+            yield shards
+        finally:
+            for key in acquired:
+                self._release(key)
+
+    def _each_shard(self, keys: Optional[List[str]] = None) -> Iterator[Tuple[str, EmailSearchSystem]]:
+        """Visit shards, all of them by default, one at a time and pinned while visited."""
+        for key in self.list_shards() if keys is None else keys:
+            with self.pinned_shards([key]) as [shard]:
+                yield key, shard
+
+    def get_shard(self, key: str) -> EmailSearchSystem:
+        """
+        Get a shard, loading it and evicting the least recently used one if needed.
+        The shard is not pinned, use pinned_shards to work with it for longer.
+        """
+        with self.pinned_shards([key]) as [shard]:
+            return shard
+
+    def evict_shard(self, key: str) -> None:
+        """Drop a shard from memory; it is reloaded from disk on next use."""
+        with self._lock:
+            if self._shards.pop(key, None) is not None:
+                logger.info(f"Evicted shard {key}")
+
+    def drop_shard(self, key: str) -> None:
+        """Delete a shard from memory and disk, e.g. to rebuild or expire a month."""
+        self.evict_shard(key)
+        self._version += 1
+        shard_dir = os.path.join(self.shards_dir, key)
+        if os.path.isdir(shard_dir):
+            logger.info(f"Deleting shard {key}")
+            shutil.rmtree(shard_dir)
+
+    def save_to(self, base_dir: str):
+        """Write every shard to another directory using the same layout, e.g. as a snapshot."""
+        for key, shard in self._each_shard():
+            shard.save_to(os.path.join(base_dir, "shards", key))
+
+    def export_to(self, path: str) -> Dict[str, Any]:
+        """Export every shard under `shards/<key>` in the portable format, see EmailSearchSystem."""
+        shards = {
+            key: shard.export_to(os.path.join(path, "shards", key))
+            for key, shard in self._each_shard()
+        }
+        return {"count": sum(shard["count"] for shard in shards.values()), "shards": shards}
+
+    def add_articles(self, articles: List[Dict]) -> int:
+        logger.debug(f"Partitioning {len(articles)} articles into shards")
+
+        if not articles:
+            logger.warning("No articles provided for indexing")
+            return 0
+
+        by_shard = defaultdict(list)
+        for article in articles:
+            by_shard[self.shard_key(article)].append(article)
+
+        added = 0
+        try:
+            for key, shard in self._each_shard(list(by_shard)):
+                added += shard.add_articles(by_shard[key])
+        finally:
+            self._version += 1
+        return added
+
+    def article_metadata(self) -> Dict[str, Dict[str, Any]]:
+        """Get the metadata of every indexed article across all shards by document id."""
+        metadata = {}
+        for _, shard in self._each_shard():
+            metadata.update(shard.article_metadata())
+        return metadata
+
+    def delete_articles(self, doc_ids: List[str]) -> int:
+        """Delete articles from whichever shards hold them, dropping shards left empty."""
+        doc_ids = list(doc_ids)
+        deleted = 0
+        emptied = []
+        for key, shard in self._each_shard():
+            count = shard.delete_articles(doc_ids)
+            if count and not shard.get_total_articles():
+                emptied.append(key)
+            deleted += count
+        if deleted:
+            self._version += 1
+        for key in emptied:
+            self.drop_shard(key)
+        return deleted
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed normalized queries through the embedding cache shared by all shards, loading none."""
+        return embed_cached(self.embeddings, self.embedding_cache, self.model_name, queries)
+
+    async def aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Async variant of embed_queries."""
+        return await aembed_cached(self.embeddings, self.embedding_cache, self.model_name, queries)
+
+    def select_shards(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None
+    ) -> List[str]:
+        """Get the shards that can hold articles matching the filters and date range."""
+        keys = self.list_shards()
+        if self.partition == "newsletter":
+            if filters and "newsletter_type" in filters:
+                wanted = newsletter_shard_key(filters["newsletter_type"])
+                return [key for key in keys if key == wanted]
+            return keys
+
+        if not date_from and not date_to:
+            return keys
+        # Compare month keys on the precision of the bounds, so "2024" covers 2024-01..12
+        lower = date_from[:7] if date_from else None
+        upper = date_to[:7] if date_to else None
+        return [
+            key for key in keys
+            if key != UNDATED_SHARD
+            and (not lower or key[:len(lower)] >= lower)
+            and (not upper or key[:len(upper)] <= upper)
+        ]
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        min_score: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        mode: str = "vector",
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None
+    ) -> List[Dict]:
+        """Search the relevant shards and merge their top-k results, see EmailSearchSystem.search."""
+        logger.debug("Searching for: '%s' with k=%d, mode=%s", query, k, mode)
+        return self.search_many(
+            [query],
+            k=k,
+            min_score=min_score,
+            filters=filters,
+            mode=mode,
+            date_from=date_from,
+            date_to=date_to
+        )[0]
+
+    def search_many(
+        self,
+        queries: List[str],
+        k: int = 5,
+        min_score: Optional[float] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        mode: str = "vector",
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        query_vectors: Optional[List[List[float]]] = None
+    ) -> List[List[Dict]]:
+        """
+        Search the relevant shards in parallel and rank their hits together.
+
+        Shards return raw hits rather than results: lexical scores are computed
+        with BM25 statistics merged over the searched shards, and hybrid rankings
+        are fused over the merged hit lists, so scores and ranks are those a
+        single index holding every article would give.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+        keys = self.select_shards(filters, date_from, date_to)
+        logger.debug("Searching %d queries across %d shards", len(queries), len(keys))
+        SEARCHES.labels(mode=mode).inc(len(queries))
+        if not keys:
+            return [[] for _ in queries]
+
+        queries = [normalize_query(query) for query in queries]
+        if len(keys) > self.max_loaded_shards:
+            return self._search_in_batches(
+                keys, queries, k, min_score, filters, mode, date_from, date_to, query_vectors
+            )
+        with self.pinned_shards(keys) as shards:
+            return self._search_shards(
+                keys, shards, queries, k, min_score, filters, mode, date_from, date_to, query_vectors
+            )
+
+    def _search_shards(
+        self,
+        keys: List[str],
+        shards: List[EmailSearchSystem],
+        queries: List[str],
+        k: int,
+        min_score: Optional[float],
+        filters: Optional[Dict[str, Any]],
+        mode: str,
+        date_from: Optional[str],
+        date_to: Optional[str],
+        query_vectors: Optional[List[List[float]]]
+    ) -> List[List[Dict]]:
+        filter_key = tuple(sorted(filters.items())) if filters else None
+        versions = tuple((key, shard.index_version) for key, shard in zip(keys, shards))
+        cache_keys = [
+            (versions, query, k, filter_key, min_score, mode, date_from, date_to) for query in queries
+        ]
+        results = [self.result_cache.get(cache_key) for cache_key in cache_keys]
+        pending = [i for i, cached in enumerate(results) if cached is None]
+        if not pending:
+            return [list(result) for result in results]
+        pending_queries = [queries[i] for i in pending]
+
+        search_mode, complete, vectors = self._embed_for_search(
+            pending_queries, mode, [query_vectors[i] for i in pending] if query_vectors is not None else None
+        )
+        lexical_stats = None
+        if search_mode != "vector":
+            lexical_stats = [
+                merge_stats(shard.lexical_index.stats(query) for shard in shards)
+                for query in pending_queries
+            ]
+        per_shard = self._shard_candidates(
+            shards, pending_queries, k, filters, search_mode, date_from, date_to, lexical_stats, vectors
+        )
+        complete = complete and all(candidates.complete for candidates in per_shard)
+        merged = self._merge_candidates(per_shard, len(pending_queries), k, min_score, search_mode)
+        for i, result in zip(pending, merged):
+            results[i] = result
+            if complete:
+                self.result_cache.put(cache_keys[i], result)
+        return [list(result) for result in results]
+
+    def _search_in_batches(
+        self,
+        keys: List[str],
+        queries: List[str],
+        k: int,
+        min_score: Optional[float],
+        filters: Optional[Dict[str, Any]],
+        mode: str,
+        date_from: Optional[str],
+        date_to: Optional[str],
+        query_vectors: Optional[List[List[float]]]
+    ) -> List[List[Dict]]:
+        """
+        Search more shards than fit in memory, pinning at most max_loaded_shards
+        of them at a time. Lexical statistics are merged over every shard in a
+        first pass, so scores stay those of a single index. Results are not
+        cached, the versions of shards that are not loaded are unknown.
+        """
+        batches = [keys[i:i + self.max_loaded_shards] for i in range(0, len(keys), self.max_loaded_shards)]
+        search_mode, complete, vectors = self._embed_for_search(queries, mode, query_vectors)
+        lexical_stats = None
+        if search_mode != "vector":
+            shard_stats = [[] for _ in queries]
+            for batch in batches:
+                with self.pinned_shards(batch) as shards:
+                    for query, stats in zip(queries, shard_stats):
+                        stats.extend(shard.lexical_index.stats(query) for shard in shards)
+            lexical_stats = [merge_stats(stats) for stats in shard_stats]
+            # Start with the batch still loaded from the first pass
+            batches.reverse()
+
+        per_shard = []
+        for batch in batches:
+            with self.pinned_shards(batch) as shards:
+                per_shard.extend(self._shard_candidates(
+                    shards, queries, k, filters, search_mode, date_from, date_to, lexical_stats, vectors
+                ))
+        return self._merge_candidates(per_shard, len(queries), k, min_score, search_mode)
+
+    def _embed_for_search(
+        self,
+        queries: List[str],
+        mode: str,
+        query_vectors: Optional[List[List[float]]]
+    ) -> Tuple[str, bool, Optional[List[List[float]]]]:
+        """
+        Embed the queries of a search once for every shard, unless their
+        query_vectors are given. Returns the mode to search with, whether it is
+        the one asked for, and the query vectors.
+        """
+        if mode == "lexical" or query_vectors is not None:
+            return mode, True, query_vectors
+        try:
+            vectors = self.embed_queries(queries)
+        except Exception as e:
+            # Every shard would fail the same way, they all search lexically instead
+            logger.warning(f"Vector search failed, falling back to lexical search: {str(e)}")
+            return "lexical", False, None
+        return mode, True, vectors
+
+    def _shard_candidates(
+        self,
+        shards: List[EmailSearchSystem],
+        queries: List[str],
+        k: int,
+        filters: Optional[Dict[str, Any]],
+        mode: str,
+        date_from: Optional[str],
+        date_to: Optional[str],
+        lexical_stats: Optional[List[CorpusStats]],
+        query_vectors: Optional[List[List[float]]]
+    ) -> List[SearchCandidates]:
+        """Search shards in parallel for their unmerged hits."""
+        futures = [
+            self._executor.submit(
+                contextvars.copy_context().run,
+                shard.search_candidates,
+                queries,
+                k=k,
+                filters=filters,
+                mode=mode,
+                date_from=date_from,
+                date_to=date_to,
+                lexical_stats=lexical_stats,
+                query_vectors=query_vectors
+            )
+            for shard in shards
+        ]
+        return [future.result() for future in futures]
+
+    def _merge_candidates(
+        self,
+        per_shard: List[SearchCandidates],
+        n_queries: int,
+        k: int,
+        min_score: Optional[float],
+        mode: str
+    ) -> List[List[Dict]]:
+        """Rank the hits of every shard together, as one index holding their articles would."""
+        documents = {}
+        for candidates in per_shard:
+            documents.update(candidates.documents)
+
+        depth = search_depth(k, mode)
+
+        def merged(name: str, i: int) -> Optional[List]:
+            shard_hits = [getattr(candidates, name) for candidates in per_shard]
+            if any(hits is None for hits in shard_hits):
+                return None
+            return heapq.nlargest(depth, (hit for hits in shard_hits for hit in hits[i]), key=lambda hit: hit[1])
+
+        results = []
+        for i in range(n_queries):
+            hits = merge_hits(merged("vector_hits", i), merged("lexical_hits", i), k)
+            results.append([
+                {**documents[doc_id], "similarity_score": round(float(score), 3)}
+                for doc_id, score in hits
+                if min_score is None or round(float(score), 3) >= min_score
+            ])
+        return results
+
+    def related(self, doc_id: str, k: int = 10, min_score: Optional[float] = None) -> Optional[List[Dict]]:
+        """Get the articles most similar to an article within its shard, see EmailSearchSystem.related."""
+        unavailable = None
+        for key in self.list_shards():
+            with self.pinned_shards([key]) as [shard]:
+                try:
+                    results = shard.related(doc_id, k=k, min_score=min_score)
+                except NeighborGraphUnavailable as e:
+                    # The article may still be found in another shard
+                    unavailable = e
+                    continue
+            if results is not None:
+                return results
+        if unavailable is not None:
+            raise unavailable
+        return None
+
+    def near_duplicates(self, min_score: float = 0.9) -> List[List[str]]:
+        """Group duplicate articles shard by shard, see EmailSearchSystem.near_duplicates."""
+        clusters = [
+            cluster for _, shard in self._each_shard()
+            for cluster in shard.near_duplicates(min_score)
+        ]
+        return sorted(clusters, key=len, reverse=True)
+
+    def _article_count(self, key: str) -> int:
+        """Articles in a shard, read from its saved index header unless it is loaded."""
+        with self._lock:
+            shard = self._shards.get(key)
+        if shard is not None:
+            return shard.get_total_articles()
+        try:
+            return saved_article_count(os.path.join(self.shards_dir, key))
+        except RuntimeError:
+            # Loaded and saved meanwhile, the header was read mid-write
+            with self.pinned_shards([key]) as [shard]:
+                return shard.get_total_articles()
+
+    def get_total_articles(self) -> int:
+        """
+        Get the total number of articles across all shards, without loading them.
+
+        Returns:
+            int: Total number of indexed articles
+        """
+        logger.info("Getting total number of indexed articles")
+        return sum(self._article_count(key) for key in self.list_shards())
+
+    def approximate_memory_bytes(self) -> int:
+        """Estimate the memory held by the loaded shards, see EmailSearchSystem."""
+        with self._lock:
+            shards = list(self._shards.values())
+        return sum(shard.approximate_memory_bytes() for shard in shards)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters of the shared embedding cache and every loaded shard.
+
+        Returns:
+            Dict with the embedding and result cache statistics and per-shard index versions
+        """
+        with self._lock:
+            shards = dict(self._shards)
+        return {
+            "embedding_cache": self.embedding_cache.stats(),
+            "result_cache": self.result_cache.stats(),
+            "shards": {key: {"index_version": shard.index_version} for key, shard in shards.items()}
+        }
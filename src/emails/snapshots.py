@@ -0,0 +1,194 @@
+import os
+import shutil
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+CURRENT_FILE = "CURRENT"
+
+
+class SnapshotStore:
+    """
+    A directory of numbered index snapshots plus a CURRENT file naming the live one.
+
+    A single writer process publishes a snapshot after every index change: it is
+    written next to the old ones and then CURRENT is replaced atomically, so readers,
+    e.g. uvicorn workers, only ever see complete snapshots. Readers open snapshots
+    read-only with the vector codes memory-mapped, sharing those through the page
+    cache; each reader still loads its own documents and BM25 postings.
+    """
+
+    def __init__(self, root: str, keep: int = 3):
+        """
+        Args:
+            root: Directory holding the snapshots
+            keep: Number of most recent snapshots kept on disk
+        """
+        self.root = root
+        self.keep = keep
+        self._publish_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def current_name(self) -> Optional[str]:
+        """Get the name of the live snapshot, or None if nothing was published yet."""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), "r") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def list_snapshots(self) -> List[str]:
+        """Get the names of all published snapshots, oldest first."""
+        return sorted(name for name in os.listdir(self.root) if name.startswith("v"))
+
+    def publish(self, search_system: Any) -> str:
+        """
+        Publish the current state of a search system as the new live snapshot.
+
+        Args:
+            search_system: Any search system with a `save_to(base_dir)` method
+
+        Returns:
+            str: Name of the published snapshot
+        """
+        # Indexing and retention may publish from different threads
+        with self._publish_lock:
+            current = self.current_name()
+            version = int(current[1:]) + 1 if current else 1
+            name = f"v{version:08d}"
+
+            staging = self.path(f".staging-{name}")
+            shutil.rmtree(staging, ignore_errors=True)
+            search_system.save_to(staging)
+            os.replace(staging, self.path(name))
+
+            pointer = os.path.join(self.root, f".{CURRENT_FILE}.tmp")
+            with open(pointer, "w") as f:
+                f.write(name)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(pointer, os.path.join(self.root, CURRENT_FILE))
+            logger.info(f"Published snapshot {name}")
+
+            self._prune(name)
+            return name
+
+    def _prune(self, current: str):
+        for name in self.list_snapshots()[:-self.keep]:
+            if name != current:
+                logger.debug(f"Removing old snapshot {name}")
+                shutil.rmtree(self.path(name), ignore_errors=True)
+
+
+class SnapshotSearchSystem:
+    """
+    A read-only search system serving the live snapshot of a SnapshotStore. A
+    background thread polls for newly published snapshots, opens them and swaps them
+    in with a single reference assignment, so in-flight searches finish on the
+    snapshot they started with and never wait for a load.
+    """
+
+    def __init__(
+        self,
+        store: SnapshotStore,
+        open_snapshot: Callable[[str], Any],
+        poll_interval: float = 2.0
+    ):
+        """
+        Args:
+            store: Snapshot store published by the writer process
+            open_snapshot: Opens a snapshot directory as a read-only search system
+            poll_interval: Seconds between checks for a newer snapshot
+        """
+        self.store = store
+        self.open_snapshot = open_snapshot
+        self.poll_interval = poll_interval
+        self.version: Optional[str] = None
+        self.current: Optional[Any] = None
+
+        self.refresh()
+        self._stop = threading.Event()
+        self._poller = threading.Thread(target=self._poll, name="snapshot-poller", daemon=True)
+        self._poller.start()
+
+    def refresh(self) -> bool:
+        """
+        Switch to the live snapshot if it changed.
+
+        Returns:
+            bool: Whether a new snapshot was loaded
+        """
+        name = self.store.current_name()
+        if name is None or name == self.version:
+            return False
+
+        logger.info(f"Loading snapshot {name}")
+        search_system = self.open_snapshot(self.store.path(name))
+        if self.current is not None:
+            # Query embeddings stay valid across snapshots
+            search_system.embedding_cache = self.current.embedding_cache
+        self.current, self.version = search_system, name
+        return True
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Failed to load snapshot: {e}", exc_info=True)
+
+    def close(self):
+        self._stop.set()
+
+    def add_articles(self, articles: List[Dict]) -> int:
+        raise RuntimeError("Snapshots are read-only, index articles in the writer process")
+
+    def search(self, query: str, **kwargs) -> List[Dict]:
+        current = self.current
+        return current.search(query, **kwargs) if current is not None else []
+
+    def search_many(self, queries: List[str], **kwargs) -> List[List[Dict]]:
+        current = self.current
+        if current is None:
+            return [[] for _ in queries]
+        return current.search_many(queries, **kwargs)
+
+    def related(self, doc_id: str, **kwargs) -> Optional[List[Dict]]:
+        current = self.current
+        return current.related(doc_id, **kwargs) if current is not None else None
+
+    def near_duplicates(self, **kwargs) -> List[List[str]]:
+        current = self.current
+        return current.near_duplicates(**kwargs) if current is not None else []
+
+    def article_metadata(self) -> Dict[str, Dict[str, Any]]:
+        current = self.current
+        return current.article_metadata() if current is not None else {}
+
+    async def aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        current = self.current
+        return await current.aembed_queries(queries) if current is not None else []
+
+    @property
+    def index_version(self) -> Optional[str]:
+        # Snapshots are never written to, a new one is published instead
+        return self.version
+
+    def get_total_articles(self) -> int:
+        current = self.current
+        return current.get_total_articles() if current is not None else 0
+
+    def approximate_memory_bytes(self) -> int:
+        current = self.current
+        return current.approximate_memory_bytes() if current is not None else 0
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        current = self.current
+        stats = current.get_cache_stats() if current is not None else {}
+        return {"snapshot": self.version, **stats}
@@ -0,0 +1,209 @@
+import os
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+VECTOR_STORAGES = ("flat", "float16", "int8", "pq")
+
+# Product quantization splits vectors into sub-vectors of this many dimensions
+# and encodes each one with an 8-bit codebook, e.g. 64 bytes per 1024-d vector
+PQ_SUBVECTOR_DIM = 16
+PQ_NBITS = 8
+
+# Scalar quantizers learn the range of every dimension from the training vectors,
+# so they need a sample large enough to cover the values later vectors will take.
+# k-means, which trains product quantizers, wants 39 vectors per centroid
+MIN_TRAINING_VECTORS = 2000
+PQ_TRAINING_VECTORS_PER_CENTROID = 39
+# Compressed indexes are retrained each time they double in size, from a random
+# sample of at most this many full-precision vectors
+MAX_TRAINING_VECTORS = 100000
+
+
+def min_training_vectors(storage: str, dim: int) -> int:
+    """Number of vectors needed before an index of the given storage is trained."""
+    if storage == "flat":
+        return 0
+    if storage == "pq":
+        return max(MIN_TRAINING_VECTORS, PQ_TRAINING_VECTORS_PER_CENTROID * 2 ** PQ_NBITS)
+    return max(MIN_TRAINING_VECTORS, 2 * dim)
+
+
+def needs_retraining(storage: str, dim: int, before: int, after: int) -> bool:
+    """
+    Whether an index trained when it held at least min_training_vectors should
+    be retrained after growing from `before` to `after` vectors.
+
+    Retraining happens when the size crosses a doubling of the training minimum,
+    so the cost of rebuilding stays proportional to the vectors added, until the
+    index holds MAX_TRAINING_VECTORS.
+    """
+    size = 2 * min_training_vectors(storage, dim)
+    while 0 < size <= min(after, MAX_TRAINING_VECTORS):
+        if before < size:
+            return True
+        size *= 2
+    return False
+
+
+def storage_of(index: faiss.Index) -> str:
+    """Name of the vector storage used by a FAISS index."""
+    if isinstance(index, faiss.IndexFlat):
+        return "flat"
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16:
+            return "float16"
+        if index.sq.qtype == faiss.ScalarQuantizer.QT_8bit:
+            return "int8"
+    raise ValueError(f"Unsupported FAISS index type {type(index).__name__}")
+
+
+def _pq_subquantizers(dim: int) -> int:
+    m = max(1, dim // PQ_SUBVECTOR_DIM)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def build_index(storage: str, vectors: np.ndarray) -> faiss.Index:
+    """
+    Build an L2 index of the given storage, training it on the vectors if needed.
+
+    Args:
+        storage: One of VECTOR_STORAGES
+        vectors: float32 matrix of (already normalized) vectors to add
+
+    Returns:
+        The populated FAISS index
+    """
+    dim = vectors.shape[1]
+    if storage == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif storage == "float16":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16)
+    elif storage == "int8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+    elif storage == "pq":
+        index = faiss.IndexPQ(dim, _pq_subquantizers(dim), PQ_NBITS)
+    else:
+        raise ValueError(f"Unknown vector storage '{storage}', expected one of {VECTOR_STORAGES}")
+
+    if not index.is_trained:
+        # The hard minimum of faiss, searchers wait for min_training_vectors
+        if storage == "pq" and len(vectors) < 2 ** PQ_NBITS:
+            raise ValueError(
+                f"{storage} storage needs at least {2 ** PQ_NBITS} vectors to train, got {len(vectors)}"
+            )
+        sample = vectors
+        if len(vectors) > MAX_TRAINING_VECTORS:
+            rng = np.random.default_rng(0)
+            sample = vectors[np.sort(rng.choice(len(vectors), MAX_TRAINING_VECTORS, replace=False))]
+        logger.info(f"Training {storage} index on {len(sample)} vectors")
+        index.train(sample)
+    index.add(vectors)
+    return index
+
+
+def reconstruct_all(index: faiss.Index) -> np.ndarray:
+    """Decode every vector stored in an index (exact only for flat storage)."""
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Size of the index once serialized, which tracks its resident memory."""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+class ExactVectorStore:
+    """
+    Append-only float32 vectors kept on disk and memory-mapped for reading, so
+    compressed indexes can re-rank their top candidates exactly without keeping
+    full-precision vectors resident.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self._vectors: Optional[np.memmap] = None
+
+    def __len__(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path) // (self.dim * 4)
+
+    def append(self, vectors: np.ndarray) -> None:
+        with open(self.path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self._vectors = None
+
+    def truncate(self, size: int) -> None:
+        """Drop the vectors after the first `size`, e.g. those of a failed write."""
+        with open(self.path, "r+b") as f:
+            f.truncate(size * self.dim * 4)
+        self._vectors = None
+
+    def reset(self, vectors: np.ndarray) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.append(vectors)
+
+    def rewrite(self, vectors: np.ndarray) -> "ExactVectorStore":
+        """
+        Atomically replace the file with other vectors, e.g. after deleting some.
+
+        This store keeps reading the old vectors, so searches of an older index
+        state stay aligned with it. Use the returned store for the new vectors.
+        """
+        self.get(np.empty(0, dtype=np.int64))  # Map the old file before it is unlinked
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        os.replace(tmp_path, self.path)
+        return ExactVectorStore(self.path, self.dim)
+
+    def get(self, positions: np.ndarray) -> np.ndarray:
+        # Read the attribute once, append() may reset it from another thread
+        vectors = self._vectors
+        if vectors is None:
+            vectors = self._vectors = np.memmap(
+                self.path, dtype=np.float32, mode="r", shape=(len(self), self.dim)
+            )
+        return vectors[positions]
+
+
+def rerank(
+    queries: np.ndarray,
+    candidates: np.ndarray,
+    exact_vectors: ExactVectorStore,
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Re-score candidate positions by exact squared L2 distance.
+
+    Args:
+        queries: (n, d) normalized query matrix
+        candidates: (n, c) candidate positions from a compressed index, -1 for none
+        exact_vectors: Full-precision vectors aligned with index positions
+        k: Number of results to keep per query
+
+    Returns:
+        (distances, positions) arrays shaped (n, k), padded like faiss search output
+    """
+    distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+    positions = np.full((len(queries), k), -1, dtype=np.int64)
+    for row, (query, row_candidates) in enumerate(zip(queries, candidates)):
+        valid = row_candidates[row_candidates >= 0]
+        if not len(valid):
+            continue
+        row_distances = ((exact_vectors.get(valid) - query) ** 2).sum(axis=1)
+        order = np.argsort(row_distances)[:k]
+        distances[row, :len(order)] = row_distances[order]
+        positions[row, :len(order)] = valid[order]
+    return distances, positions
@@ -1,36 +1,113 @@
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 
 from rich.logging import RichHandler
 
+# "rich" for readable development logs, "json" for production: one JSON object
+# per line, written by a background thread so logging never blocks on I/O
+LOG_FORMATS = ("rich", "json")
 
-def setup_logging(name: str, level: str = None) -> logging.Logger:
+_queue_handler = None
+_queue_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Queue records for the background listener.
+
+    Only the message is formatted in the logging thread, since its arguments may
+    change once the call returns; JSON encoding and writing happen in the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks keep frames alive, keep only their text
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _get_queue_handler() -> QueueHandler:
+    """The process-wide queue handler, starting its listener on first use."""
+    global _queue_handler
+    with _queue_lock:
+        if _queue_handler is None:
+            log_queue = queue.SimpleQueue()
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(JsonFormatter())
+            listener = QueueListener(log_queue, handler)
+            listener.start()
+            # Drain the queue on exit so the last records are not lost
+            atexit.register(listener.stop)
+            _queue_handler = _DeferredQueueHandler(log_queue)
+        return _queue_handler
+
+
+def setup_logging(name: str, level: str = None, log_format: str = None) -> logging.Logger:
     """
     Configure and return a logger with consistent formatting.
-    
+
     Args:
         name: Logger name
         level: Optional logging level override (defaults to env var or WARNING)
-        
+        log_format: Optional output format override, "rich" or "json"
+            (defaults to the LOGGER_FORMAT env var or "rich")
+
     Returns:
         Configured logger instance
     """
     log_level = level or os.getenv("LOGGER_LEVEL", "WARNING").upper()
-    
+    log_format = (log_format or os.getenv("LOGGER_FORMAT", "rich")).lower()
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format {log_format}, expected one of {LOG_FORMATS}")
+
     logger = logging.getLogger(name)
     logger.setLevel(log_level)
-    
+
     # Avoid duplicate handlers
     if not logger.handlers:
+        if log_format == "json":
+            logger.addHandler(_get_queue_handler())
+            return logger
+
         handler = RichHandler(
             rich_tracebacks=True,
             tracebacks_show_locals=True,
             show_time=True,
             omit_repeated_times=False
         )
-        
+
         formatter = logging.Formatter('%(name)s - %(message)s')
         handler.setFormatter(formatter)
         logger.addHandler(handler)
-    
-    return logger 
\ No newline at end of file
+
+    return logger
@@ -0,0 +1,166 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+_current: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+
+
+class _NoSpan:
+    """Shared no-op context manager, so spans cost one lookup when nothing is traced."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Trace:
+    """
+    The spans, and optionally the stack samples, of one traced request.
+
+    Spans may be recorded from several threads, e.g. the event loop and the search
+    executor, as long as the work runs in a copy of the request's context.
+    """
+
+    def __init__(self, name: str, profile_interval: Optional[float] = None):
+        """
+        Args:
+            name: What is traced, e.g. the request path
+            profile_interval: Seconds between stack samples, None to only record spans
+        """
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.samples: Counter = Counter()
+        self._active_threads: Counter = Counter()
+        self._lock = threading.Lock()
+        self._profiler = None
+        if profile_interval is not None:
+            self._profiler = threading.Thread(
+                target=self._sample, args=(profile_interval,), name="trace-profiler", daemon=True
+            )
+        self._stop = threading.Event()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active_threads[thread_id] += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self._active_threads[thread_id] -= 1
+                if not self._active_threads[thread_id]:
+                    del self._active_threads[thread_id]
+                self.spans.append({
+                    "name": name,
+                    "start_ms": round((start - self.start) * 1000, 3),
+                    "duration_ms": round((end - start) * 1000, 3),
+                    "thread": threading.current_thread().name,
+                })
+
+    def _sample(self, interval: float):
+        while not self._stop.wait(interval):
+            with self._lock:
+                thread_ids = list(self._active_threads)
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.samples[_fold(frame)] += 1
+
+    def folded_profile(self) -> str:
+        """Stack samples in the folded format read by flamegraph.pl and speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def server_timing(self) -> str:
+        """Total time per span name, as a Server-Timing header value."""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration_ms"]
+        return ", ".join(f"{name.replace('.', '-')};dur={total:.3f}" for name, total in totals.items())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+            "samples": sum(self.samples.values()),
+        }
+
+    def save(self, directory: str) -> str:
+        """
+        Write the spans as `<trace_id>.json` and the samples as `<trace_id>.folded`.
+
+        Returns:
+            str: Path of the spans file
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.trace_id}.json")
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        if self._profiler is not None:
+            with open(os.path.join(directory, f"{self.trace_id}.folded"), "w") as f:
+                f.write(self.folded_profile())
+        return path
+
+
+def _fold(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+@contextmanager
+def trace(name: str, profile_interval: Optional[float] = None) -> Iterator[Trace]:
+    """
+    Trace everything run in the current context, including work handed to other
+    threads in a copy of it, until the block exits.
+
+    Args:
+        name: What is traced, e.g. the request path
+        profile_interval: Seconds between stack samples, None to only record spans
+    """
+    current = Trace(name, profile_interval)
+    token = _current.set(current)
+    if current._profiler is not None:
+        current._profiler.start()
+    try:
+        with current.span(name):
+            yield current
+    finally:
+        current._stop.set()
+        current.duration = time.perf_counter() - current.start
+        _current.reset(token)
+
+
+def span(name: str):
+    """Record a span of the current trace, or do nothing when nothing is traced."""
+    current = _current.get()
+    if current is None:
+        return _NO_SPAN
+    return current.span(name)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
@@ -0,0 +1,53 @@
+"""
+Fixtures shared by the search system tests.
+"""
+
+from typing import List, Optional
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from emails.email_searcher import EmailSearchSystem
+from emails.sharded_searcher import ShardedEmailSearchSystem
+
+
+class CountingEmbeddings(Embeddings):
+    """Embeddings that count the requests made to another embedding model and record their texts"""
+
+    def __init__(self, embeddings: Optional[Embeddings] = None):
+        self.embeddings = embeddings if embeddings is not None else DeterministicFakeEmbedding(size=16)
+        self.calls = 0
+        self.texts: List[str] = []
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts.extend(texts)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def make_search_system(tmp_path):
+    """
+    Factory of search systems in tmp_path embedding with CountingEmbeddings.
+
+    Called with the articles to index, an optional `partition` for a sharded
+    system, the `embeddings` to count (16-d fake embeddings by default) and any
+    other search system arguments. Systems made by one test share a directory,
+    so a second call reopens the index of the first.
+    """
+    def make(articles=(), partition=None, embeddings=None, **kwargs):
+        counting = CountingEmbeddings(embeddings)
+        if partition is not None:
+            search_system = ShardedEmailSearchSystem(
+                base_dir=str(tmp_path), partition=partition, embeddings=counting, **kwargs
+            )
+        else:
+            search_system = EmailSearchSystem(base_dir=str(tmp_path), embeddings=counting, **kwargs)
+        if articles:
+            search_system.add_articles(list(articles))
+        return search_system
+
+    return make
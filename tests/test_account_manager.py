@@ -0,0 +1,167 @@
+"""
+Tests for serving several mailboxes from one process with LRU loading and eviction.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from api.core.config import Settings
+from api.core.errors import InvalidAccountError
+from api.services import account_manager
+from api.services.account_manager import AccountManager
+from emails.email_searcher import EmailSearchSystem
+from emails.index_export import export_index
+
+
+def make_manager(tmp_path, **overrides):
+    settings = Settings(
+        base_dir=str(tmp_path),
+        embedding_backend="local",
+        account_credentials_dir=str(tmp_path / "secrets"),
+        **overrides
+    )
+    return AccountManager(settings)
+
+
+def test_accounts_are_isolated_and_lazily_loaded(tmp_path):
+    """Test that every account gets its own index directory and credentials"""
+    manager = make_manager(tmp_path)
+    assert manager.stats()["loaded"] == {}
+
+    alice = manager.get("alice@example.com")
+    bob = manager.get("bob@example.com")
+    assert manager.get("alice@example.com") is alice
+    assert alice.search_system.embeddings is bob.search_system.embeddings
+
+    alice.search_system.add_articles([{"title": "Nvidia", "content": "AI chips"}])
+    assert alice.get_total_articles() == 1
+    assert bob.get_total_articles() == 0
+    assert os.path.isdir(tmp_path / "accounts" / "alice@example.com" / "faiss_index")
+    assert alice.indexing_service.user_credentials == str(
+        tmp_path / "secrets" / "alice@example.com" / "user_token.pickle"
+    )
+    manager.close()
+
+
+def test_new_accounts_not_bootstrapped_from_the_default_export(tmp_path):
+    """Test that the export bootstrapping the default mailbox is not imported into accounts"""
+    manager = make_manager(tmp_path, bootstrap_export=str(tmp_path / "export"))
+    source = EmailSearchSystem(base_dir=str(tmp_path / "source"), embeddings=manager.embeddings)
+    source.add_articles([{"title": "Nvidia", "content": "AI chips"}])
+    export_index(source, str(tmp_path / "export"), ["e1"])
+
+    bob = manager.get("bob")
+    assert bob.get_total_articles() == 0
+    assert bob.indexing_service.processed_emails == set()
+    manager.close()
+
+
+def test_least_recently_used_account_evicted(tmp_path):
+    """Test that loading past max_loaded_accounts unloads the least recently used account"""
+    manager = make_manager(tmp_path, max_loaded_accounts=2)
+    first = manager.get("first")
+    first.search_system.add_articles([{"title": "Kept", "content": "on disk"}])
+    manager.get("second")
+    manager.get("first")
+    manager.get("third")
+
+    assert list(manager.stats()["loaded"]) == ["first", "third"]
+    assert manager.evictions == 1
+    assert manager.get("second").get_total_articles() == 0
+    assert list(manager.stats()["loaded"]) == ["third", "second"]
+    assert manager.get("first").get_total_articles() == 1
+    manager.close()
+
+
+def test_memory_budget_and_idle_eviction(tmp_path):
+    """Test that accounts are evicted to fit the memory budget and when idle"""
+    manager = make_manager(tmp_path, account_memory_budget_mb=0.01, account_idle_timeout=0)
+    big = manager.get("big")
+    big.search_system.add_articles([
+        {"title": f"Article {i}", "content": "word " * 50} for i in range(5)
+    ])
+    assert big.approximate_memory_bytes() > manager.memory_budget_bytes
+
+    manager.get("small")
+    assert list(manager.stats()["loaded"]) == ["small"]
+
+    assert manager.evict_idle() == 1
+    assert manager.stats()["loaded"] == {}
+    manager.close()
+
+
+def test_memory_estimated_outside_the_lock(tmp_path):
+    """Test that estimating account memory, which walks every document, never holds up leases"""
+    manager = make_manager(tmp_path, account_memory_budget_mb=1)
+    service = manager.get("alice")
+    locked = []
+
+    def approximate_memory_bytes():
+        locked.append(manager._lock.locked())
+        return 0
+
+    service.approximate_memory_bytes = approximate_memory_bytes
+    manager.get("bob")
+    assert manager.stats()["loaded"]["alice"]["memory_bytes"] == 0
+    manager._enforce_limits()
+    assert len(locked) == 3 and not any(locked)
+    manager.close()
+
+
+def test_leased_account_closed_after_last_request(tmp_path):
+    """Test that an account evicted while serving a request is closed only once the request is done"""
+    manager = make_manager(tmp_path, max_loaded_accounts=1)
+    with manager.lease("first") as first:
+        first.search_system.add_articles([{"title": "Kept", "content": "while leased"}])
+        manager.get("second")
+        assert "first" in manager.stats()["loaded"]
+
+        assert manager.evict("first")
+        response = asyncio.run(first.search("kept", mode="lexical"))
+        assert response["total"] == 1
+    assert "first" not in manager.stats()["loaded"]
+    with pytest.raises(RuntimeError):
+        asyncio.run(first.search("kept", mode="lexical"))
+
+    with manager.lease("second") as second:
+        manager.evict("second")
+        with manager.lease("second") as again:
+            # Revived rather than loaded again on the same directory
+            assert again is second
+    assert asyncio.run(second.search("kept", mode="lexical"))["total"] == 0
+    manager.close()
+
+
+def test_accounts_load_outside_the_lock(tmp_path, monkeypatch):
+    """Test that a slow account load delays neither other accounts nor loads it twice"""
+    manager = make_manager(tmp_path)
+    manager.get("fast")
+    loads = []
+    service_class = account_manager.EmailService
+
+    def slow_service(settings, **kwargs):
+        loads.append(settings.base_dir)
+        time.sleep(0.5)
+        return service_class(settings, **kwargs)
+
+    monkeypatch.setattr(account_manager, "EmailService", slow_service)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        slow = [pool.submit(manager.get, "slow") for _ in range(2)]
+        time.sleep(0.1)
+        assert pool.submit(manager.get, "fast").result(timeout=0.3) is not None
+        assert slow[0].result() is slow[1].result()
+    assert len(loads) == 1
+    manager.close()
+
+
+@pytest.mark.parametrize("account", ["..", "../etc", "a/b", ""])
+def test_unsafe_account_names_rejected(tmp_path, account):
+    """Test that account names cannot escape the accounts directory"""
+    manager = make_manager(tmp_path)
+    with pytest.raises(InvalidAccountError):
+        manager.get(account)
+    manager.close()
@@ -0,0 +1,142 @@
+"""
+Tests for the bulk import of local mbox, Maildir and .eml archives.
+"""
+
+import mailbox
+import random
+from datetime import timedelta
+from email.message import EmailMessage
+
+import pytest
+
+from benchmarks.corpus import START_DATE, gmail_messages, newsletter
+from benchmarks.fake_gmail import FakeGmailServer
+from emails.archive_import import ArchiveImporter, iter_archive, parse_message
+from emails.email_fetcher import EmailFetcher
+from emails.email_indexer import EmailIndexingService
+from emails.email_searcher import EmailSearchSystem
+from emails.embedding_backends import LocalEmbeddings
+
+ARTICLES_PER_EMAIL = 3
+
+
+def archived_messages(n_emails, html=False):
+    rng = random.Random(0)
+    messages = []
+    for i in range(n_emails):
+        date = START_DATE + timedelta(days=i)
+        text = newsletter(rng, date, ARTICLES_PER_EMAIL)
+        message = EmailMessage()
+        message["From"] = "TLDR <dan@tldrnewsletter.com>"
+        message["Subject"] = f"TLDR {date:%Y-%m-%d}"
+        message["Date"] = date.strftime("%a, %d %b %Y %H:%M:%S +0000")
+        message["Message-ID"] = f"<{i}@tldrnewsletter.com>"
+        if html:
+            paragraphs = "".join(f"<p>{line}</p>" for line in text.split("\n"))
+            message.set_content(f"<html><body>{paragraphs}</body></html>", subtype="html")
+        else:
+            message.set_content(text)
+            message.add_alternative(f"<html><body><pre>{text}</pre></body></html>", subtype="html")
+        message.add_attachment(b"%PDF-1.4", maintype="application", subtype="pdf", filename="sponsor.pdf")
+        messages.append(message)
+    return messages
+
+
+def write_archive(kind, path, messages):
+    if kind == "eml":
+        path.mkdir()
+        for i, message in enumerate(messages):
+            (path / f"{i}.eml").write_bytes(message.as_bytes())
+        return str(path)
+    archive = mailbox.mbox(str(path)) if kind == "mbox" else mailbox.Maildir(str(path))
+    for message in messages:
+        archive.add(message)
+    archive.close()
+    return str(path)
+
+
+@pytest.fixture
+def indexer(tmp_path):
+    base_dir = tmp_path / "index"
+    return EmailIndexingService(
+        cache_dir=str(base_dir),
+        search_system=EmailSearchSystem(base_dir=str(base_dir), embeddings=LocalEmbeddings(size=32))
+    )
+
+
+@pytest.mark.parametrize("kind", ["mbox", "maildir", "eml"])
+def test_archive_formats_read(tmp_path, kind):
+    messages = archived_messages(3)
+    path = write_archive(kind, tmp_path / "archive", messages)
+    ids = sorted(parse_message(raw)[0] for raw in iter_archive(path))
+    assert ids == [f"{i}@tldrnewsletter.com" for i in range(3)]
+
+
+def test_parse_message_stamps_articles():
+    """Test that the plain part is parsed, and articles carry the Message-ID and date"""
+    [message] = archived_messages(1)
+    email_id, articles = parse_message(message.as_bytes())
+    assert email_id == "0@tldrnewsletter.com"
+    assert len(articles) == ARTICLES_PER_EMAIL
+    assert all(article.date == START_DATE.isoformat() for article in articles)
+    assert all(article.email_id == email_id for article in articles)
+
+
+def test_html_only_messages_parsed():
+    [message] = archived_messages(1, html=True)
+    _, articles = parse_message(message.as_bytes())
+    assert len(articles) == ARTICLES_PER_EMAIL
+
+
+def test_import_indexes_and_skips_processed(tmp_path, indexer):
+    """Test that re-importing an archive, or one overlapping it, indexes nothing twice"""
+    messages = archived_messages(7)
+    mbox_path = write_archive("mbox", tmp_path / "takeout.mbox", messages[:5])
+    importer = ArchiveImporter(indexer, workers=2, chunk_size=2)
+
+    stats = importer.run([mbox_path])
+    assert stats["imported"] == 5 and stats["skipped"] == 0
+    assert stats["articles"] == 5 * ARTICLES_PER_EMAIL
+    assert indexer.processed_emails == {f"{i}@tldrnewsletter.com" for i in range(5)}
+
+    maildir_path = write_archive("maildir", tmp_path / "Maildir", messages[3:])
+    stats = importer.run([mbox_path, maildir_path])
+    assert stats["messages"] == 9
+    assert stats["skipped"] == 7
+    assert stats["imported"] == 2
+    assert indexer.search_system.get_total_articles() == 7 * ARTICLES_PER_EMAIL
+
+
+def test_archive_overlapping_gmail_indexed_once(tmp_path):
+    """Test that mail indexed from Gmail and from an archive is matched by Message-ID both ways"""
+    messages = gmail_messages(6, articles_per_email=ARTICLES_PER_EMAIL)
+    for i, message in enumerate(messages):
+        message["payload"]["headers"].append({"name": "Message-ID", "value": f"<{i}@tldrnewsletter.com>"})
+    base_dir = tmp_path / "index"
+    with FakeGmailServer(messages[:4]) as gmail:
+        indexer = EmailIndexingService(
+            cache_dir=str(base_dir),
+            search_system=EmailSearchSystem(base_dir=str(base_dir), embeddings=LocalEmbeddings(size=32)),
+            email_fetcher=EmailFetcher(service=gmail.service())
+        )
+        indexer.index_batch("from:tldr")
+
+        archive = write_archive("mbox", tmp_path / "takeout.mbox", archived_messages(5)[2:])
+        stats = ArchiveImporter(indexer, workers=1).run([archive])
+        assert stats["skipped"] == 2 and stats["imported"] == 1
+        assert indexer.search_system.get_total_articles() == 5 * ARTICLES_PER_EMAIL
+
+        # Gmail then lists the archived email under its own ID
+        for message in messages[4:]:
+            gmail.messages.insert(0, message)
+            gmail.by_id[message["id"]] = message
+        result = indexer.index_batch("from:tldr")
+    assert result["new_emails"] == 2
+    assert result["new_articles"] == ARTICLES_PER_EMAIL
+    assert indexer.search_system.get_total_articles() == 6 * ARTICLES_PER_EMAIL
+    assert {message["id"] for message in messages} <= indexer.processed_emails
+
+
+def test_missing_archive_rejected(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        list(iter_archive(str(tmp_path / "missing")))
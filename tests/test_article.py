@@ -0,0 +1,32 @@
+"""
+Tests for the Article record passed from the content parser to the index.
+"""
+
+import pytest
+
+from emails.article import METADATA_FIELDS, Article
+
+
+def test_article_from_dict_and_mapping_access():
+    """Test that articles build from dicts and read like them"""
+    article = Article.from_dict({"title": "Nvidia", "content": "AI chips", "reading_time": 3})
+
+    assert article["title"] == "Nvidia"
+    assert article.get("section") == ""
+    assert article.get("missing", "default") == "default"
+    assert "date" in article
+    assert Article.from_dict(article) is article
+    with pytest.raises(KeyError):
+        article["missing"]
+    with pytest.raises(AttributeError):
+        article.extra = 1
+
+
+def test_article_text_and_metadata():
+    """Test the embedded text and the metadata stored in the index"""
+    article = Article("Nvidia", "AI chips", section="BIG TECH", email_id="e1", date="2024-01-01")
+
+    assert article.text == "Title: Nvidia\n\nContent: AI chips"
+    assert tuple(article.metadata()) == METADATA_FIELDS
+    assert article.metadata()["email_id"] == "e1"
+    assert Article.from_dict(article.to_dict()) == article
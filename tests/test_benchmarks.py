@@ -0,0 +1,62 @@
+"""
+Tests for the offline Gmail and Ollama stand-ins and the benchmark driver.
+"""
+
+import json
+
+from benchmarks import run
+from benchmarks.corpus import gmail_messages
+from benchmarks.fake_embeddings import FakeEmbeddingServer
+from benchmarks.fake_gmail import FakeGmailServer
+from emails.email_fetcher import EmailFetcher
+from emails.email_indexer import EmailIndexingService
+from emails.email_searcher import EmailSearchSystem
+from emails.embedding_backends import OllamaEmbeddingClient
+
+
+def test_index_from_fake_gmail_and_ollama(tmp_path):
+    """Test that the real fetcher, parser and index run against the stand-ins"""
+    with FakeGmailServer(gmail_messages(12, articles_per_email=5)) as gmail, \
+            FakeEmbeddingServer(size=64) as embedder:
+        embeddings = OllamaEmbeddingClient(model="benchmark", base_url=embedder.url)
+        indexer = EmailIndexingService(
+            cache_dir=str(tmp_path),
+            search_system=EmailSearchSystem(base_dir=str(tmp_path), embeddings=embeddings),
+            email_fetcher=EmailFetcher(service=gmail.service())
+        )
+        assert indexer.index_new_emails("from:tldr", max_results=12) == 60
+        assert gmail.requests["get"] == 12
+        assert embedder.texts >= 60
+        assert indexer.index_new_emails("from:tldr", max_results=12) == 0
+        embeddings.close()
+
+
+def test_fake_gmail_batch_requests():
+    """Test that batched gets are answered per part, including missing messages"""
+    messages = gmail_messages(3, articles_per_email=1)
+    with FakeGmailServer(messages) as gmail:
+        service = gmail.service()
+        responses = {}
+        batch = gmail.new_batch(
+            lambda request_id, response, exception: responses.update({request_id: response or exception})
+        )
+        for message_id in [message["id"] for message in messages] + ["missing"]:
+            batch.add(service.users().messages().get(userId="me", id=message_id), request_id=message_id)
+        batch.execute()
+
+    assert gmail.requests == {"list": 0, "get": 0, "attachment": 0, "batch": 1}
+    assert all(responses[message["id"]] == message for message in messages)
+    assert responses["missing"].status_code == 404
+
+
+def test_benchmark_run_saves_and_checks_baselines(tmp_path):
+    """Test that a run records baselines and a repeated run compares against them"""
+    baselines = tmp_path / "baselines.json"
+    argv = ["--sizes", "5", "--queries", "5", "--concurrency", "2", "--modes", "lexical",
+            "--dimensions", "32", "--baselines", str(baselines)]
+    assert run.main(argv + ["--save-baseline"]) == 0
+
+    stored = json.loads(baselines.read_text())["results"]["5"]
+    assert stored["index_articles_per_s"] > 0
+    assert set(stored["search"]["lexical"]) == {"qps", "p50_ms", "p95_ms", "p99_ms"}
+    assert run.main(argv + ["--tolerance", "1000"]) == 0
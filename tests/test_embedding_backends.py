@@ -0,0 +1,98 @@
+"""
+Tests for the pooled Ollama embedding client and the local stand-in backend.
+"""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from emails.email_searcher import EmailSearchSystem
+from emails.embedding_backends import (LocalEmbeddings, OllamaEmbeddingClient,
+                                       create_embeddings)
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections alive like Ollama does
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        self.server.clients.add(self.client_address)
+        payload = json.dumps({"embeddings": [[float(len(text)), 1.0] for text in body["input"]]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def ollama_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllamaHandler)
+    server.requests = []
+    server.clients = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+def test_ollama_client_batches_over_reused_connections(ollama_server):
+    """Test that texts are split into batches, kept in order and sent over pooled connections"""
+    client = OllamaEmbeddingClient(
+        model="test-model",
+        base_url=f"http://127.0.0.1:{ollama_server.server_port}",
+        max_connections=1,
+        batch_size=2
+    )
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+
+    assert [vector[0] for vector in client.embed_documents(texts)] == [1, 2, 3, 4, 5]
+    assert client.embed_query("xyz") == [3.0, 1.0]
+    assert [len(request["input"]) for request in ollama_server.requests] == [2, 2, 1, 1]
+    assert all(request["model"] == "test-model" for request in ollama_server.requests)
+    assert len(ollama_server.clients) == 1
+
+    vectors = asyncio.run(client.aembed_documents(texts))
+    assert [vector[0] for vector in vectors] == [1, 2, 3, 4, 5]
+    client.close()
+
+
+def test_local_embeddings_deterministic_and_similar():
+    """Test that local embeddings are stable, normalized and favour shared words"""
+    embeddings = LocalEmbeddings(size=256)
+    nvidia, chips, rust = embeddings.embed_documents([
+        "Nvidia launches new AI chips",
+        "AI chips from Nvidia",
+        "Rust release notes",
+    ])
+
+    assert embeddings.embed_query("Nvidia launches new AI chips") == nvidia
+    assert sum(x * x for x in nvidia) == pytest.approx(1.0)
+    assert sum(a * b for a, b in zip(nvidia, chips)) > sum(a * b for a, b in zip(nvidia, rust))
+
+
+def test_search_offline_with_local_backend(tmp_path):
+    """Test indexing and searching end to end without an embedding server"""
+    search_system = EmailSearchSystem(
+        base_dir=str(tmp_path), embeddings=create_embeddings("local", size=64)
+    )
+    search_system.add_articles([
+        {"title": "Nvidia earnings", "content": "Nvidia sold more AI chips"},
+        {"title": "Rust 2.0", "content": "A new Rust release"},
+    ])
+
+    results = search_system.search("Rust release", k=1)
+    assert results[0]["metadata"]["title"] == "Rust 2.0"
+
+
+def test_unknown_backend():
+    """Test that unknown backends are rejected"""
+    with pytest.raises(ValueError):
+        create_embeddings("openai")
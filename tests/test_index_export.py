@@ -0,0 +1,95 @@
+"""
+Tests for the portable index export and importing it on a new node.
+"""
+
+import json
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from api.core.config import Settings
+from api.services.email_service import EmailService
+from conftest import CountingEmbeddings
+from emails.email_searcher import EmailSearchSystem
+from emails.index_export import ExportError, export_index, import_index
+from emails.sharded_searcher import ShardedEmailSearchSystem
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=16)
+
+ARTICLES = [
+    {"title": "NVIDIA CHIPS", "content": "Nvidia ships new chips", "newsletter_type": "TLDR AI",
+     "date": "2024-10-03T08:00:00+00:00", "email_id": "a"},
+    {"title": "RUST RELEASE", "content": "Rust 2.0 is out", "newsletter_type": "TLDR",
+     "date": "2024-11-05T08:00:00+00:00", "email_id": "b"},
+    {"title": "SPACE LAUNCH", "content": "A rocket reached orbit", "newsletter_type": "TLDR",
+     "date": "2024-11-28T08:00:00+00:00", "email_id": "c"},
+]
+
+
+def make_system(cls, base_dir, **kwargs):
+    search_system = cls(base_dir=str(base_dir), model_name="test-model", embeddings=EMBEDDINGS, **kwargs)
+    search_system.add_articles(ARTICLES)
+    return search_system
+
+
+@pytest.mark.parametrize("cls, kwargs", [
+    (EmailSearchSystem, {}),
+    (EmailSearchSystem, {"vector_storage": "pq"}),
+    (ShardedEmailSearchSystem, {"partition": "month"}),
+])
+def test_round_trip_serves_same_results(tmp_path, cls, kwargs):
+    """Test that an imported export answers every mode like the source, without re-embedding"""
+    source = make_system(cls, tmp_path / "source", **kwargs)
+    manifest = export_index(source, str(tmp_path / "export"), processed_emails=["a", "b"])
+    assert manifest["model_name"] == "test-model"
+    assert manifest["count"] == len(ARTICLES)
+
+    import_index(str(tmp_path / "export"), str(tmp_path / "replica"), model_name="test-model")
+    replica_kwargs = {"partition": kwargs["partition"]} if "partition" in kwargs else {}
+    embeddings = CountingEmbeddings(EMBEDDINGS)
+    replica = cls(base_dir=str(tmp_path / "replica"), read_only=True, embeddings=embeddings, **replica_kwargs)
+    assert replica.get_total_articles() == len(ARTICLES)
+    for mode in ("lexical", "vector", "hybrid"):
+        expected = [(r["metadata"]["title"], r["similarity_score"]) for r in source.search("nvidia chips", k=3, mode=mode)]
+        assert [(r["metadata"]["title"], r["similarity_score"]) for r in replica.search("nvidia chips", k=3, mode=mode)] == expected
+    # Only the query was embedded, the articles reuse the exported vectors
+    assert set(embeddings.texts) == {"nvidia chips"}
+    with open(tmp_path / "replica" / "processed_emails.json") as f:
+        assert json.load(f) == ["a", "b"]
+
+
+def test_export_is_columnar_and_contiguous(tmp_path):
+    """Test the layout of the vector and metadata files"""
+    export_index(make_system(EmailSearchSystem, tmp_path / "source"), str(tmp_path / "export"))
+    vectors = np.load(tmp_path / "export" / "vectors.npy", mmap_mode="r")
+    assert vectors.shape == (len(ARTICLES), 16) and vectors.dtype == np.float32
+    assert vectors.flags["C_CONTIGUOUS"]
+    with open(tmp_path / "export" / "metadata.json") as f:
+        columns = json.load(f)
+    assert columns["fields"]["title"] == [a["title"] for a in ARTICLES]
+
+
+def test_import_rejects_corrupt_or_foreign_exports(tmp_path):
+    """Test that a tampered file or a different embedding model is refused"""
+    export_index(make_system(EmailSearchSystem, tmp_path / "source"), str(tmp_path / "export"))
+    with pytest.raises(ExportError, match="mxbai"):
+        import_index(str(tmp_path / "export"), str(tmp_path / "replica"), model_name="mxbai")
+
+    with open(tmp_path / "export" / "metadata.json", "a") as f:
+        f.write(" ")
+    with pytest.raises(ExportError, match="metadata.json"):
+        import_index(str(tmp_path / "export"), str(tmp_path / "replica"))
+
+
+def test_service_bootstraps_empty_base_dir(tmp_path):
+    """Test that a new service imports the configured export when it has no index"""
+    export_index(make_system(EmailSearchSystem, tmp_path / "source"), str(tmp_path / "export"), ["a"])
+    settings = Settings(base_dir=str(tmp_path / "node"), model_name="test-model",
+                        bootstrap_export=str(tmp_path / "export"))
+    service = EmailService(settings, embeddings=EMBEDDINGS)
+    try:
+        assert service.get_total_articles() == len(ARTICLES)
+        assert service.indexing_service.processed_emails == {"a"}
+    finally:
+        service.close()
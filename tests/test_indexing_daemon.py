@@ -0,0 +1,135 @@
+"""
+Tests for the continuous indexing daemon and its adaptive polling.
+"""
+
+import time
+
+import pytest
+
+from benchmarks.corpus import gmail_messages
+from benchmarks.fake_gmail import FakeGmailServer
+from emails.email_fetcher import EmailFetcher
+from emails.email_indexer import EmailIndexingService
+from emails.email_searcher import EmailSearchSystem
+from emails.embedding_backends import LocalEmbeddings
+from emails.indexing_daemon import IndexingDaemon
+from emails.retention import RetentionPolicy
+
+
+class FakeMailbox:
+    """An index_batch over a list of email IDs, newest first"""
+
+    def __init__(self, n_emails):
+        self.emails = [str(i) for i in range(n_emails)]
+        self.processed = set()
+        self.calls = []
+
+    def index_batch(self, query, max_results, max_new=None):
+        self.calls.append((query, max_results))
+        listed = self.emails[:max_results]
+        unprocessed = [email for email in listed if email not in self.processed]
+        batch = unprocessed[:max_new]
+        self.processed.update(batch)
+        return {"listed": len(listed), "unprocessed": len(unprocessed),
+                "new_emails": len(batch), "new_articles": 2 * len(batch)}
+
+
+def test_empty_polls_back_off_and_new_emails_reset():
+    """Test that the wait doubles per empty poll up to the maximum, and resets on new mail"""
+    mailbox = FakeMailbox(0)
+    daemon = IndexingDaemon(mailbox.index_batch, ["q"], min_interval=1, max_interval=5, start=False)
+    [schedule] = daemon.schedules
+    intervals = []
+    for _ in range(4):
+        daemon.poll(schedule)
+        intervals.append(schedule.interval)
+    assert intervals == [2, 4, 5, 5]
+
+    mailbox.emails = ["new"]
+    assert daemon.poll(schedule) == 2
+    assert schedule.interval == 1
+
+
+def test_catch_up_in_small_batches():
+    """Test that a backlog is indexed batch by batch, then polls only list recent emails"""
+    mailbox = FakeMailbox(45)
+    daemon = IndexingDaemon(mailbox.index_batch, ["q"], batch_size=10, start=False)
+    [schedule] = daemon.schedules
+    while schedule.since is None:
+        daemon.poll(schedule)
+
+    assert mailbox.processed == set(mailbox.emails)
+    assert all(query == "q" for query, _ in mailbox.calls)
+    assert schedule.depth == 10
+    daemon.poll(schedule)
+    assert mailbox.calls[-1][0].startswith("q after:")
+
+
+def test_failed_polls_back_off():
+    """Test that errors are recorded and delay the next poll"""
+    def fail(query, max_results, max_new=None):
+        raise ConnectionError("Gmail unavailable")
+
+    daemon = IndexingDaemon(fail, ["q"], min_interval=1, start=False)
+    [schedule] = daemon.schedules
+    assert daemon.poll(schedule) == 0
+    assert schedule.interval == 2
+    assert daemon.stats()["q"]["last_error"] == "Gmail unavailable"
+
+
+def test_invalid_schedule_rejected():
+    with pytest.raises(ValueError):
+        IndexingDaemon(FakeMailbox(0).index_batch, [], start=False)
+    with pytest.raises(ValueError):
+        IndexingDaemon(FakeMailbox(0).index_batch, ["q"], min_interval=10, max_interval=1, start=False)
+
+
+def test_daemon_indexes_arriving_emails(tmp_path):
+    """Test that the background thread picks up emails as they arrive in the mailbox"""
+    messages = gmail_messages(8, articles_per_email=2)
+    with FakeGmailServer(messages[:5]) as gmail:
+        indexer = EmailIndexingService(
+            cache_dir=str(tmp_path),
+            search_system=EmailSearchSystem(base_dir=str(tmp_path), embeddings=LocalEmbeddings(size=32)),
+            email_fetcher=EmailFetcher(service=gmail.service())
+        )
+        daemon = IndexingDaemon(indexer.index_batch, ["from:tldr"], min_interval=0.05, max_interval=0.1, batch_size=2)
+        try:
+            deadline = time.monotonic() + 10
+            while len(indexer.processed_emails) < 5 and time.monotonic() < deadline:
+                time.sleep(0.02)
+            assert len(indexer.processed_emails) == 5
+
+            for message in messages[5:]:
+                gmail.messages.insert(0, message)
+                gmail.by_id[message["id"]] = message
+            while len(indexer.processed_emails) < 8 and time.monotonic() < deadline:
+                time.sleep(0.02)
+        finally:
+            daemon.close(timeout=5)
+    assert indexer.processed_emails == {message["id"] for message in messages}
+    assert indexer.search_system.get_total_articles() == 16
+
+
+def test_expired_emails_do_not_keep_the_daemon_polling(tmp_path):
+    """Test that emails whose articles all expired are handled once, and polling then backs off"""
+    messages = gmail_messages(25, articles_per_email=2)
+    with FakeGmailServer(messages) as gmail:
+        indexer = EmailIndexingService(
+            cache_dir=str(tmp_path),
+            search_system=EmailSearchSystem(base_dir=str(tmp_path), embeddings=LocalEmbeddings(size=32)),
+            retention_policy=RetentionPolicy(max_age_days=30),
+            email_fetcher=EmailFetcher(service=gmail.service())
+        )
+        daemon = IndexingDaemon(indexer.index_batch, ["from:tldr"], min_interval=1, batch_size=10, start=False)
+        [schedule] = daemon.schedules
+        polls = 0
+        while schedule.since is None and polls < 10:
+            daemon.poll(schedule)
+            polls += 1
+
+    assert schedule.since is not None
+    assert schedule.next_run > time.monotonic()
+    assert indexer.expired_emails == {message["id"] for message in messages}
+    assert not indexer.processed_emails
+    assert indexer.search_system.get_total_articles() == 0
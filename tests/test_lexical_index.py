@@ -0,0 +1,132 @@
+"""
+Tests for the BM25 lexical index and the lexical and hybrid search modes.
+"""
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from emails.lexical_index import BM25Index, merge_stats, tokenize
+
+
+class UnavailableEmbeddings(DeterministicFakeEmbedding):
+    """Embeddings that fail like an unreachable model server once enabled"""
+    down: bool = False
+
+    def embed_documents(self, texts):
+        if self.down:
+            raise ConnectionError("embedding server unavailable")
+        return super().embed_documents(texts)
+
+
+ARTICLES = [
+    {"title": "NVIDIA EARNINGS", "content": "Nvidia reported record data center revenue", "newsletter_type": "TLDR"},
+    {"title": "RUST RELEASE", "content": "A new Rust version improves compile times", "newsletter_type": "TLDR"},
+    {"title": "OPENAI MODEL", "content": "OpenAI released a new reasoning model", "newsletter_type": "TLDR AI"},
+]
+
+
+def test_tokenize():
+    """Test lowercase word tokenization"""
+    assert tokenize("Nvidia's H100, GPUs!") == ["nvidia", "s", "h100", "gpus"]
+
+
+def test_bm25_ranks_matching_documents_first():
+    """Test that documents containing rare query terms rank first"""
+    index = BM25Index()
+    index.add("a", "nvidia gpu revenue")
+    index.add("b", "rust compiler release")
+    index.add("c", "gpu prices fall")
+
+    results = index.search("nvidia gpu", k=3)
+
+    assert [doc_id for doc_id, _ in results] == ["a", "c"]
+    assert results[0][1] > results[1][1]
+
+
+def test_bm25_merged_stats_score_like_one_index():
+    """Test that split indexes scored with merged statistics score like the whole"""
+    texts = {"a": "nvidia gpu revenue", "b": "rust compiler release", "c": "gpu prices fall", "d": "gpu gpu"}
+    whole, left, right = BM25Index(), BM25Index(), BM25Index()
+    for i, (doc_id, text) in enumerate(texts.items()):
+        whole.add(doc_id, text)
+        (left if i < 2 else right).add(doc_id, text)
+
+    stats = merge_stats([left.stats("gpu rust"), right.stats("gpu rust")])
+    split = left.search("gpu rust", k=4, stats=stats) + right.search("gpu rust", k=4, stats=stats)
+    assert sorted(split, key=lambda hit: -hit[1]) == whole.search("gpu rust", k=4)
+
+
+def test_bm25_remove_and_persist(tmp_path):
+    """Test removing documents and round-tripping the index through disk"""
+    index = BM25Index()
+    index.add("a", "nvidia gpu revenue")
+    index.add("b", "rust compiler release")
+    index.remove(["a"])
+
+    path = str(tmp_path / "lexical_index.json")
+    index.save(path)
+    loaded = BM25Index.load(path)
+
+    assert len(loaded) == 1
+    assert loaded.search("nvidia") == []
+    assert loaded.search("rust")[0][0] == "b"
+
+
+def test_lexical_mode_does_not_embed(make_search_system):
+    """Test that lexical search works while the embedding server is down"""
+    embeddings = UnavailableEmbeddings(size=16)
+    search_system = make_search_system(ARTICLES, embeddings=embeddings)
+    embeddings.down = True
+
+    results = search_system.search("nvidia", k=2, mode="lexical")
+
+    assert results[0]["metadata"]["title"] == "NVIDIA EARNINGS"
+    assert results[0]["similarity_score"] == 1.0
+
+
+def test_vector_mode_falls_back_to_lexical(make_search_system):
+    """Test that a failing embedding model degrades to lexical results without caching them"""
+    embeddings = UnavailableEmbeddings(size=16)
+    search_system = make_search_system(ARTICLES, embeddings=embeddings)
+    embeddings.down = True
+
+    results = search_system.search("rust", k=2)
+
+    assert [r["metadata"]["title"] for r in results] == ["RUST RELEASE"]
+    assert len(search_system.result_cache) == 0
+
+
+def test_hybrid_mode_fuses_rankings(make_search_system):
+    """Test that hybrid results include lexical matches and honour filters"""
+    search_system = make_search_system(ARTICLES)
+
+    results = search_system.search("openai", k=3, mode="hybrid")
+    filtered = search_system.search("openai", k=3, mode="hybrid", filters={"newsletter_type": "TLDR"})
+
+    assert results[0]["metadata"]["title"] == "OPENAI MODEL"
+    assert all(0 < r["similarity_score"] <= 1 for r in results)
+    assert "OPENAI MODEL" not in [r["metadata"]["title"] for r in filtered]
+
+
+def test_lexical_index_rebuilt_from_docstore(make_search_system, tmp_path):
+    """Test that an index saved without a lexical index gets one on load"""
+    make_search_system(ARTICLES)
+    (tmp_path / "lexical_index.json").unlink()
+
+    search_system = make_search_system()
+
+    assert len(search_system.lexical_index) == len(ARTICLES)
+    assert search_system.search("rust", k=1, mode="lexical")[0]["metadata"]["title"] == "RUST RELEASE"
+
+
+def test_bm25_copy_is_isolated():
+    """Test that a copy shares postings until either side changes them"""
+    index = BM25Index()
+    index.add("a", "nvidia gpu")
+    clone = index.copy()
+
+    clone.add("b", "nvidia rust")
+    clone.remove(["a"])
+
+    assert [doc_id for doc_id, _ in index.search("nvidia")] == ["a"]
+    assert [doc_id for doc_id, _ in clone.search("nvidia")] == ["b"]
+    assert index.search("rust") == []
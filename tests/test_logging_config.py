@@ -0,0 +1,69 @@
+"""
+Tests for the JSON logging mode and its background queue writer.
+"""
+
+import json
+import logging
+import sys
+
+import pytest
+
+import logging_config
+from logging_config import JsonFormatter, setup_logging
+
+
+def make_record(msg, *args, exc_info=None):
+    return logging.LogRecord("emails.test", logging.ERROR, __file__, 1, msg, args, exc_info)
+
+
+def test_json_formatter():
+    """Test that records become single-line JSON with their traceback"""
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = make_record("Failed after %d retries", 3, exc_info=sys.exc_info())
+
+    line = JsonFormatter().format(record)
+    assert "\n" not in line
+    entry = json.loads(line)
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "emails.test"
+    assert entry["message"] == "Failed after 3 retries"
+    assert "ValueError: boom" in entry["exc_info"]
+
+
+def test_queued_records_keep_message_and_traceback():
+    """Test that records are rendered before queueing and drop their frames"""
+    items = []
+    handler = logging_config._DeferredQueueHandler(None)
+    handler.enqueue = items.append
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        handler.handle(make_record("Fetched %s", ["a"], exc_info=sys.exc_info()))
+
+    [record] = items
+    assert record.exc_info is None
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Fetched ['a']"
+    assert "ValueError: boom" in entry["exc_info"]
+
+
+def test_setup_logging_json_mode_shares_queue_handler():
+    """Test that JSON loggers share one queue handler and unknown formats fail"""
+    first = setup_logging("tests.json.first", log_format="json")
+    second = setup_logging("tests.json.second", log_format="json")
+    assert first.handlers == second.handlers == [logging_config._get_queue_handler()]
+    with pytest.raises(ValueError):
+        setup_logging("tests.json.third", log_format="xml")
+
+
+def test_disabled_debug_logging_is_lazy():
+    """Test that hot-path debug messages are never formatted when disabled"""
+    class Expensive:
+        def __str__(self):
+            raise AssertionError("formatted a disabled log message")
+
+    logger = setup_logging("tests.lazy", level="INFO")
+    logger.debug("Response: %s", Expensive())
+    logger.log(1, "Response: %s", Expensive())
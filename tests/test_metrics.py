@@ -0,0 +1,75 @@
+"""
+Tests for the metrics registry and the /metrics endpoint.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import metrics
+from api.core.config import Settings
+from api.main import app
+from api.services.email_service import EmailService
+
+
+def test_render_prometheus_text_format():
+    """Test counters, gauges and histograms in the exposition format"""
+    registry = metrics.MetricsRegistry()
+    requests = registry._get_or_create(metrics.Counter, "requests", "Requests served", ["route"])
+    latency = registry._get_or_create(
+        metrics.Histogram, "latency_seconds", "Latency", [], buckets=(0.1, 1.0)
+    )
+    requests.labels(route="search").inc()
+    requests.labels(route="search").inc(2)
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests counter" in lines
+    assert 'requests_total{route="search"} 3.0' in lines
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "latency_seconds_count 3" in lines
+    assert "latency_seconds_sum 5.55" in lines
+
+
+def test_label_values_escaped():
+    """Test that quotes, backslashes and newlines in label values keep the output parseable"""
+    registry = metrics.MetricsRegistry()
+    polls = registry._get_or_create(metrics.Counter, "polls", "Polls", ["query"])
+    polls.labels(query='from:"Dan" subject:TLDR').inc()
+    polls.labels(query="a\\b\nc").inc()
+
+    lines = registry.render().splitlines()
+    assert 'polls_total{query="from:\\"Dan\\" subject:TLDR"} 1.0' in lines
+    assert 'polls_total{query="a\\\\b\\nc"} 1.0' in lines
+
+
+def test_metric_registered_once():
+    """Test that metrics are shared by name and conflicting declarations rejected"""
+    registry = metrics.MetricsRegistry()
+    first = registry._get_or_create(metrics.Counter, "events", "Events", [])
+    assert registry._get_or_create(metrics.Counter, "events", "Events", []) is first
+    with pytest.raises(ValueError):
+        registry._get_or_create(metrics.Gauge, "events", "Events", [])
+
+
+def test_metrics_endpoint_reports_stages(tmp_path, monkeypatch):
+    """Test that indexing and searching show up on /metrics"""
+    service = EmailService(Settings(base_dir=str(tmp_path), embedding_backend="local"))
+    monkeypatch.setattr(EmailService, "_instance", service)
+    service.search_system.add_articles([{"title": "Nvidia", "content": "AI chips"}])
+    client = TestClient(app)
+    client.post("/api/emails/search", json={"query": "chips", "mode": "hybrid"})
+
+    body = client.get("/metrics").text
+    assert 'email_search_index_stage_seconds_count{stage="embed"}' in body
+    assert 'email_search_search_stage_seconds_count{stage="vector"}' in body
+    assert 'email_service_request_seconds_count{operation="search"}' in body
+    assert "email_search_indexed_articles 1" in body
+    assert "# TYPE email_search_cache_misses counter" in body
+    assert 'email_search_cache_misses_total{cache="embedding"}' in body
+    assert "# TYPE email_service_searches_rejected counter" in body
+    service.close()
@@ -0,0 +1,76 @@
+"""
+Tests for picking and decoding the body part of Gmail API message payloads.
+"""
+
+import base64
+
+from benchmarks.corpus import MESSAGE_STRUCTURES, gmail_messages
+from benchmarks.fake_gmail import FakeGmailServer
+from emails.email_fetcher import EmailFetcher
+from emails.mime import extract_body, find_body_part, html_to_text
+from emails.parsers.tldr_content_parser import TLDRContentParser
+
+
+def part(mime_type, text, charset="utf-8", encoding=None, **extra):
+    return {
+        "mimeType": mime_type,
+        "headers": [{"name": "Content-Type", "value": f"{mime_type}; charset={charset}"}],
+        "body": {"data": base64.urlsafe_b64encode(text.encode(encoding or charset)).decode().rstrip("=")},
+        **extra,
+    }
+
+
+def test_plain_text_preferred_in_nested_multipart():
+    """Test that text/plain nested in mixed/alternative wins over an earlier HTML part"""
+    payload = {"mimeType": "multipart/mixed", "parts": [
+        {"mimeType": "multipart/alternative", "parts": [part("text/html", "<p>html</p>"), part("text/plain", "plain")]},
+        part("text/plain", "notes", filename="notes.txt"),
+    ]}
+    assert find_body_part(payload)["mimeType"] == "text/plain"
+    assert extract_body(payload) == "plain"
+
+
+def test_html_only_bodies_lose_their_markup():
+    """Test that HTML is only used without a plain part, and is converted to text"""
+    payload = {"mimeType": "multipart/related", "parts": [
+        part("text/html", "<html><style>p {}</style><p>Caf&eacute;</p><p>Second <b>line</b></p></html>"),
+    ]}
+    assert extract_body(payload) == "Café\nSecond line"
+    assert html_to_text("a<br/>b") == "a\nb"
+
+
+def test_charsets_and_unknown_charsets():
+    """Test that the declared charset is used and unknown ones fall back to UTF-8"""
+    assert extract_body(part("text/plain", "Café naïve", charset="iso-8859-1")) == "Café naïve"
+    assert extract_body(part("text/plain", "Café", charset="x-unknown", encoding="utf-8")) == "Café"
+
+
+def test_bodies_by_attachment_id_fetched_only_when_picked():
+    """Test that only the chosen part's attachment is downloaded"""
+    fetched = []
+    payload = {"mimeType": "multipart/mixed", "parts": [
+        {"mimeType": "text/plain", "body": {"attachmentId": "body"}},
+        {"mimeType": "application/pdf", "filename": "a.pdf", "body": {"attachmentId": "pdf"}},
+    ]}
+
+    def fetch(attachment_id):
+        fetched.append(attachment_id)
+        return base64.urlsafe_b64encode(b"large body").decode()
+
+    assert extract_body(payload, fetch) == "large body"
+    assert fetched == ["body"]
+    assert extract_body(payload) is None
+
+
+def test_every_corpus_structure_parses_like_plain_text():
+    """Test that the fetcher reads the same articles from every message structure"""
+    parser = TLDRContentParser()
+    plain = gmail_messages(len(MESSAGE_STRUCTURES), articles_per_email=3)
+    messages = gmail_messages(len(MESSAGE_STRUCTURES), articles_per_email=3, structures=True)
+    with FakeGmailServer(messages) as gmail:
+        fetcher = EmailFetcher(service=gmail.service())
+        for expected, message in zip(plain, messages):
+            articles = parser.parse_content(fetcher.get_body(fetcher.get_email_data(message["id"])))
+            expected_articles = parser.parse_content(extract_body(expected["payload"]))
+            assert [a.title for a in articles] == [a.title for a in expected_articles]
+    assert gmail.requests["attachment"] == 1
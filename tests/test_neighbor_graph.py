@@ -0,0 +1,185 @@
+"""
+Tests for the precomputed neighbor graph, related articles and near-duplicate clusters.
+"""
+
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.core.config import Settings
+from api.main import app
+from api.services.account_manager import get_email_service
+from api.services.email_service import EmailService
+from emails.email_searcher import EmailSearchSystem
+from emails.embedding_backends import LocalEmbeddings
+from emails.neighbor_graph import NeighborGraph, NeighborGraphUnavailable
+
+TOPICS = ["nvidia chips", "rust compiler", "rocket launch", "battery cars", "privacy law", "quantum computing"]
+
+
+def articles(start, stop):
+    return [
+        {"title": f"Story {i}", "content": f"{TOPICS[i % len(TOPICS)]} update number {i}",
+         "newsletter_type": "TLDR"}
+        for i in range(start, stop)
+    ]
+
+
+def neighbor_ids(graph):
+    return {doc_id: [neighbor_id for neighbor_id, _ in hits] for doc_id, hits in graph.neighbors.items()}
+
+
+def neighbor_scores(graph):
+    # Articles at the same distance may be listed in any order
+    return {doc_id: [round(score, 4) for _, score in hits] for doc_id, hits in graph.neighbors.items()}
+
+
+def test_incremental_graph_matches_a_rebuild(tmp_path, make_search_system):
+    """Test that adding articles batch by batch gives the graph built over all of them at once"""
+    search_system = make_search_system(embeddings=LocalEmbeddings(size=256), neighbor_count=4)
+    for start in range(0, 9, 3):
+        search_system.add_articles(articles(start, start + 3))
+    incremental = search_system._state.neighbor_graph
+    assert len(incremental) == 9
+
+    (tmp_path / "neighbor_graph.json").unlink()
+    rebuilt = make_search_system(embeddings=LocalEmbeddings(size=256), neighbor_count=4)
+    assert rebuilt.wait_for_neighbor_graph(timeout=10)
+    assert neighbor_scores(rebuilt._state.neighbor_graph) == neighbor_scores(incremental)
+
+
+@pytest.fixture
+def held_graph_builds(monkeypatch):
+    """Hold background neighbor graph builds until the returned event is set"""
+    release = threading.Event()
+    build = EmailSearchSystem._build_neighbor_graph
+
+    def held(self):
+        release.wait(10)
+        build(self)
+
+    monkeypatch.setattr(EmailSearchSystem, "_build_neighbor_graph", held)
+    yield release
+    release.set()
+
+
+def test_missing_graph_built_in_the_background(tmp_path, make_search_system, held_graph_builds):
+    """Test that opening an index without a graph does not build it, and it is unavailable meanwhile"""
+    make_search_system(articles(0, 9), embeddings=LocalEmbeddings(size=256), neighbor_count=3)
+    (tmp_path / "neighbor_graph.json").unlink()
+
+    search_system = make_search_system(embeddings=LocalEmbeddings(size=256), neighbor_count=3)
+    doc_id = next(iter(search_system.article_metadata()))
+    with pytest.raises(NeighborGraphUnavailable):
+        search_system.related(doc_id)
+    with pytest.raises(NeighborGraphUnavailable):
+        search_system.near_duplicates()
+    search_system.add_articles(articles(9, 12))
+    reader = make_search_system(embeddings=LocalEmbeddings(size=256), read_only=True, neighbor_count=3)
+
+    held_graph_builds.set()
+    assert search_system.wait_for_neighbor_graph(timeout=10)
+    assert len(search_system._state.neighbor_graph) == 12
+    assert len(search_system.related(doc_id, k=3)) == 3
+    # Readers never build the graph, they wait for one saved by the writer
+    assert not reader.wait_for_neighbor_graph()
+    with pytest.raises(NeighborGraphUnavailable):
+        reader.related(doc_id)
+
+
+def test_related_articles_need_no_embedding(make_search_system):
+    """Test that related articles come from stored vectors, also past the graph's depth"""
+    search_system = make_search_system(articles(0, 12), embeddings=LocalEmbeddings(size=256), neighbor_count=3)
+    embedded = len(search_system.embeddings.texts)
+    [hit] = search_system.search("nvidia chips update number 0", k=1)
+
+    related = search_system.related(hit["id"], k=3)
+    assert len(search_system.embeddings.texts) == embedded + 1  # Only the search query
+    assert hit["id"] not in [result["id"] for result in related]
+    assert related[0]["metadata"]["title"] == "Story 6"  # The other "nvidia chips" story
+
+    deeper = search_system.related(hit["id"], k=6)
+    assert [result["id"] for result in deeper[:3]] == [result["id"] for result in related]
+    assert search_system.related("missing") is None
+
+
+def test_deleted_articles_leave_the_graph(make_search_system):
+    """Test that deletions unlink articles and refill the lists that pointed at them"""
+    search_system = make_search_system(articles(0, 12), embeddings=LocalEmbeddings(size=256), neighbor_count=3)
+    doomed = list(search_system.article_metadata())[:4]
+    search_system.delete_articles(doomed)
+
+    graph = search_system._state.neighbor_graph
+    assert len(graph) == 8
+    assert all(len(hits) == 3 for hits in graph.neighbors.values())
+    assert not set(doomed) & {neighbor_id for ids in neighbor_ids(graph).values() for neighbor_id in ids}
+
+    reopened = make_search_system(embeddings=LocalEmbeddings(size=256), read_only=True, neighbor_count=3)
+    assert neighbor_ids(reopened._state.neighbor_graph) == neighbor_ids(graph)
+
+
+def test_near_duplicate_clusters():
+    """Test that clusters are the components of links above the threshold"""
+    graph = NeighborGraph(k=2)
+    graph.add({
+        "a": [("b", 0.97), ("c", 0.5)],
+        "b": [("a", 0.97), ("c", 0.93)],
+        "c": [("b", 0.93), ("a", 0.5)],
+        "d": [("a", 0.2)],
+    })
+    assert graph.clusters(0.9) == [["a", "b", "c"]]
+    assert graph.clusters(0.95) == [["a", "b"]]
+
+
+@pytest.fixture
+def client(tmp_path):
+    service = EmailService(Settings(base_dir=str(tmp_path), embedding_backend="local", neighbor_count=3))
+    service.search_system.add_articles(articles(0, 6) + [
+        {"title": "Story 0 again", "content": "nvidia chips update number 0", "newsletter_type": "TLDR AI"},
+    ])
+    app.dependency_overrides[get_email_service] = lambda: service
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    service.close()
+
+
+def test_related_and_duplicates_endpoints(client):
+    """Test the related articles endpoint and the near-duplicate clusters it builds on"""
+    response = client.post("/api/emails/search", json={"query": "nvidia chips", "limit": 1, "mode": "lexical"})
+    article_id = response.json()["results"][0]["id"]
+
+    related = client.get(f"/api/emails/{article_id}/related", params={"limit": 2}).json()
+    assert related["total"] == 2
+    assert related["results"][0]["metadata"]["title"] == "Story 0 again"
+
+    assert client.get("/api/emails/missing/related").status_code == 404
+
+    clusters = client.get("/api/emails/duplicates", params={"min_score": 0.95}).json()["clusters"]
+    assert [sorted(article["newsletter_type"] for article in cluster) for cluster in clusters] == [["TLDR", "TLDR AI"]]
+
+
+def test_related_unavailable_while_the_graph_is_built(tmp_path, held_graph_builds):
+    settings = Settings(base_dir=str(tmp_path), embedding_backend="local", neighbor_count=3)
+    service = EmailService(settings)
+    service.search_system.add_articles(articles(0, 6))
+    service.close()
+    (tmp_path / "neighbor_graph.json").unlink()
+
+    service = EmailService(settings)
+    app.dependency_overrides[get_email_service] = lambda: service
+    try:
+        client = TestClient(app)
+        article_id = next(iter(service.search_system.article_metadata()))
+        response = client.get(f"/api/emails/{article_id}/related")
+        assert response.status_code == 503
+        assert response.json()["detail"]["error_code"] == "NEIGHBOR_GRAPH_UNAVAILABLE"
+        assert client.get("/api/emails/duplicates").status_code == 503
+
+        held_graph_builds.set()
+        assert service.search_system.wait_for_neighbor_graph(timeout=10)
+        related = client.get(f"/api/emails/{article_id}/related", params={"limit": 2}).json()
+        assert related["total"] == 2
+    finally:
+        app.dependency_overrides.clear()
+        service.close()
@@ -0,0 +1,102 @@
+"""
+Tests for the query embedding and search result caches.
+"""
+
+from emails.query_cache import LRUCache, normalize_query
+
+ARTICLES = [
+    {"title": "AI CHIPS", "content": "New accelerators announced", "newsletter_type": "TLDR AI"},
+    {"title": "RUST RELEASE", "content": "A new Rust version is out", "newsletter_type": "TLDR"},
+]
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """Test that the oldest untouched entry is evicted first"""
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+
+
+def test_lru_cache_stats():
+    """Test hit rate and invalidation counters"""
+    cache = LRUCache(maxsize=4)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("missing")
+    cache.clear()
+
+    stats = cache.stats()
+    assert stats["hit_rate"] == 0.5
+    assert stats["invalidations"] == 1
+    assert stats["size"] == 0
+
+
+def test_lru_cache_disabled():
+    """Test that a zero-sized cache never stores anything"""
+    cache = LRUCache(maxsize=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+def test_normalize_query():
+    """Test that whitespace differences collapse to the same key"""
+    assert normalize_query("  ai   chips\n") == "ai chips"
+
+
+def test_search_reuses_cached_results(make_search_system):
+    """Test that repeated searches do not embed the query again"""
+    search_system = make_search_system(ARTICLES)
+    calls_before = search_system.embeddings.calls
+
+    first = search_system.search("ai chips", k=2)
+    second = search_system.search("  ai chips ", k=2)
+
+    assert first == second
+    assert search_system.embeddings.calls == calls_before + 1
+    assert search_system.get_cache_stats()["result_cache"]["hits"] == 1
+
+
+def test_add_articles_invalidates_results(make_search_system):
+    """Test that new articles invalidate cached results but keep query embeddings"""
+    search_system = make_search_system(ARTICLES)
+    search_system.search("ai chips", k=5)
+    version = search_system.index_version
+
+    search_system.add_articles([{"title": "GPU SHORTAGE", "content": "Chips are scarce"}])
+    calls_before = search_system.embeddings.calls
+    results = search_system.search("ai chips", k=5)
+
+    assert search_system.index_version == version + 1
+    assert len(results) == 3
+    assert search_system.embeddings.calls == calls_before
+
+
+def test_search_filters(make_search_system):
+    """Test that metadata filters restrict the results"""
+    search_system = make_search_system(ARTICLES)
+    results = search_system.search("news", k=5, filters={"newsletter_type": "TLDR"})
+
+    assert [r["metadata"]["title"] for r in results] == ["RUST RELEASE"]
+
+
+def test_search_many_embeds_once(make_search_system):
+    """Test that a batch of queries is embedded in a single request"""
+    search_system = make_search_system(ARTICLES)
+    calls_before = search_system.embeddings.calls
+
+    results = search_system.search_many(["ai chips", "rust", "ai chips"], k=1)
+
+    assert search_system.embeddings.calls == calls_before + 1
+    assert len(results) == 3
+    assert results[0] == results[2]
+    assert results[1] == search_system.search("rust", k=1)
@@ -0,0 +1,115 @@
+"""
+Tests for search response projection and cursor pagination.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.core.config import Settings
+from api.core.errors import InvalidCursorError
+from api.core.responses import decode_cursor, encode_cursor, project_results
+from api.main import app
+from api.services.account_manager import get_email_service
+from api.services.email_service import EmailService
+
+RESULT = {
+    "content": "Title: Nvidia\n\nContent: AI chips",
+    "metadata": {"title": "Nvidia", "link": "https://example.com", "date": None},
+    "similarity_score": 0.9,
+}
+
+
+@pytest.fixture
+def client(tmp_path):
+    service = EmailService(Settings(base_dir=str(tmp_path), embedding_backend="local"))
+    service.search_system.add_articles([
+        {"title": f"Article {i}", "content": f"chips news number {i}"} for i in range(25)
+    ])
+    app.dependency_overrides[get_email_service] = lambda: service
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    service.close()
+
+
+def test_project_results():
+    """Test that projections keep only the requested fields without modifying results"""
+    assert project_results([RESULT], None) == [RESULT]
+    assert project_results([RESULT], ["similarity_score", "metadata.title"]) == [
+        {"similarity_score": 0.9, "metadata": {"title": "Nvidia"}}
+    ]
+    assert project_results([RESULT], ["metadata", "metadata.title"]) == [{"metadata": RESULT["metadata"]}]
+    assert RESULT["metadata"]["link"] == "https://example.com"
+
+
+def test_cursor_round_trip():
+    """Test that cursors encode the search and offset and reject tampering"""
+    assert decode_cursor(None) == (None, 0)
+    assert decode_cursor(encode_cursor("abc", 40)) == ("abc", 40)
+    for cursor in ("not-a-cursor", encode_cursor("abc", -1)):
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(cursor)
+
+
+def test_search_pages_with_cursor(client):
+    """Test that following next_cursor walks through every result exactly once"""
+    titles, cursor = [], None
+    while True:
+        response = client.post("/api/emails/search", json={
+            "query": "chips news", "limit": 10, "mode": "lexical",
+            "fields": ["metadata.title"], "cursor": cursor
+        }).json()
+        titles.extend(result["metadata"]["title"] for result in response["results"])
+        assert all(set(result) == {"metadata"} for result in response["results"])
+        cursor = response["next_cursor"]
+        if cursor is None:
+            break
+
+    assert sorted(titles) == sorted(f"Article {i}" for i in range(25))
+
+
+def test_pages_sliced_from_one_ranking(client):
+    """Test that hybrid pages are sliced from a cached ranking, without repeats or re-searching each page"""
+    service = app.dependency_overrides[get_email_service]()
+    search_many = service.search_runner.search_many
+    depths = []
+
+    async def counting_search_many(queries, **kwargs):
+        depths.append(kwargs["k"])
+        return await search_many(queries, **kwargs)
+
+    service.search_runner.search_many = counting_search_many
+    ids, cursor = [], None
+    while True:
+        response = client.post("/api/emails/search", json={
+            "query": "chips news", "limit": 3, "mode": "hybrid", "fields": ["id"], "cursor": cursor
+        }).json()
+        ids.extend(result["id"] for result in response["results"])
+        cursor = response["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(ids) == len(set(ids)) == 25
+    # The ranking doubles in depth, rather than being searched again for every page
+    assert depths == [3, 6, 12, 24, 48]
+
+
+def test_stale_cursor_rejected(client):
+    """Test that a cursor cannot page through another search or a changed index"""
+    service = app.dependency_overrides[get_email_service]()
+    first = client.post("/api/emails/search", json={"query": "chips news", "limit": 10}).json()
+    cursor = first["next_cursor"]
+
+    other = client.post("/api/emails/search", json={"query": "other news", "limit": 10, "cursor": cursor})
+    assert other.status_code == 400
+    assert other.json()["detail"]["error_code"] == "INVALID_CURSOR"
+
+    service.search_system.add_articles([{"title": "Article 25", "content": "chips news number 25"}])
+    stale = client.post("/api/emails/search", json={"query": "chips news", "limit": 10, "cursor": cursor})
+    assert stale.status_code == 400
+    assert stale.json()["detail"]["error_code"] == "INVALID_CURSOR"
+
+
+def test_invalid_fields_rejected(client):
+    """Test that unknown projection fields are a validation error"""
+    response = client.post("/api/emails/search", json={"query": "chips", "fields": ["secret"]})
+    assert response.status_code == 422
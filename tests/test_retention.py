@@ -0,0 +1,120 @@
+"""
+Tests for retention policies, article deletion and pruning of processed emails.
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from emails import email_indexer, email_searcher
+from emails.email_searcher import EmailSearchSystem
+from emails.embedding_backends import LocalEmbeddings
+from emails.retention import RetentionPolicy, apply_retention
+from emails.sharded_searcher import ShardedEmailSearchSystem
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+EMBEDDINGS = LocalEmbeddings(size=32)
+
+ARTICLES = [
+    {"title": "Old AI", "content": "old ai news", "newsletter_type": "TLDR AI",
+     "email_id": "e1", "date": "2024-01-10T08:00:00+00:00"},
+    {"title": "Recent AI", "content": "recent ai news", "newsletter_type": "TLDR AI",
+     "email_id": "e2", "date": "2024-05-20T08:00:00+00:00"},
+    {"title": "Recent Crypto", "content": "recent crypto news", "newsletter_type": "TLDR Crypto",
+     "email_id": "e3", "date": "2024-05-01T08:00:00+00:00"},
+    {"title": "Undated", "content": "undated news", "newsletter_type": "TLDR"},
+]
+
+
+def titles(search_system):
+    return sorted(metadata["title"] for metadata in search_system.article_metadata().values())
+
+
+def test_policy_selects_by_age_type_and_count():
+    """Test age limits, per newsletter type overrides and the article cap"""
+    articles = {str(i): article for i, article in enumerate(ARTICLES)}
+
+    by_age = RetentionPolicy(max_age_days=90)
+    assert by_age.select_expired(articles, NOW) == ["0"]
+
+    by_type = RetentionPolicy(max_age_days=90, newsletter_max_age_days={"TLDR Crypto": 14})
+    assert by_type.select_expired(articles, NOW) == ["0", "2"]
+
+    by_count = RetentionPolicy(max_articles=2)
+    assert by_count.select_expired(articles, NOW) == ["3", "0"]
+
+    assert not RetentionPolicy().enabled
+    assert RetentionPolicy().select_expired(articles, NOW) == []
+
+
+@pytest.mark.parametrize("vector_storage,rerank_factor", [("flat", 0), ("int8", 2)])
+def test_delete_articles_compacts_every_index(tmp_path, monkeypatch, vector_storage, rerank_factor):
+    """Test that deleted articles leave the vector, lexical and exact-vector indexes"""
+    # Compress the few test articles right away
+    monkeypatch.setattr(email_searcher, "min_training_vectors", lambda storage, dim: 1)
+    search_system = EmailSearchSystem(
+        base_dir=str(tmp_path), embeddings=EMBEDDINGS,
+        vector_storage=vector_storage, rerank_factor=rerank_factor
+    )
+    search_system.add_articles(ARTICLES)
+    old_version = search_system.index_version
+
+    deleted = apply_retention(search_system, RetentionPolicy(max_age_days=90), NOW)
+    assert [metadata["title"] for metadata in deleted] == ["Old AI"]
+    assert search_system.index_version == old_version + 1
+    assert search_system.vector_store.index.ntotal == 3
+    assert search_system.search("old ai news", k=5, mode="lexical")[0]["metadata"]["title"] != "Old AI"
+    assert search_system.search("recent crypto news", k=1)[0]["metadata"]["title"] == "Recent Crypto"
+    if rerank_factor:
+        assert len(search_system.exact_vectors) == 3
+
+    reloaded = EmailSearchSystem(
+        base_dir=str(tmp_path), embeddings=EMBEDDINGS,
+        vector_storage=vector_storage, rerank_factor=rerank_factor
+    )
+    assert titles(reloaded) == ["Recent AI", "Recent Crypto", "Undated"]
+
+    search_system.delete_articles(list(search_system.article_metadata()))
+    assert search_system.get_total_articles() == 0
+    assert search_system.search("news") == []
+
+
+def test_sharded_retention_drops_empty_shards(tmp_path):
+    """Test that months left without articles are deleted from disk"""
+    search_system = ShardedEmailSearchSystem(base_dir=str(tmp_path), embeddings=EMBEDDINGS)
+    search_system.add_articles(ARTICLES)
+    assert search_system.list_shards() == ["2024-01", "2024-05", "undated"]
+
+    apply_retention(search_system, RetentionPolicy(max_age_days=90), NOW)
+    assert search_system.list_shards() == ["2024-05", "undated"]
+    assert titles(search_system) == ["Recent AI", "Recent Crypto", "Undated"]
+
+
+def test_indexer_prunes_aged_out_emails(tmp_path, monkeypatch):
+    """Test that emails of aged out articles are forgotten and not indexed again"""
+    class FakeFetcher:
+        def __init__(self, user_credentials):
+            pass
+
+        def fetch_emails(self, query, max_results):
+            return [{"id": article["email_id"]} for article in ARTICLES[:3]]
+
+        def get_articles_from_emails(self, emails, content_parser):
+            ids = {email["id"] for email in emails}
+            return [article for article in ARTICLES[:3] if article["email_id"] in ids]
+
+    monkeypatch.setattr(email_indexer, "EmailFetcher", FakeFetcher)
+    search_system = EmailSearchSystem(base_dir=str(tmp_path / "index"), embeddings=EMBEDDINGS)
+    indexer = email_indexer.EmailIndexingService(
+        cache_dir=str(tmp_path / "cache"), search_system=search_system
+    )
+    indexer.index_new_emails("label:newsletters")
+    assert indexer.processed_emails == {"e1", "e2", "e3"}
+
+    indexer.retention_policy = RetentionPolicy(max_age_days=(datetime.now(timezone.utc) - NOW).days + 90)
+    assert indexer.apply_retention() == 1
+    assert indexer.processed_emails == {"e2", "e3"}
+
+    assert indexer.index_new_emails("label:newsletters") == 0
+    assert titles(search_system) == ["Recent AI", "Recent Crypto"]
+    assert indexer.processed_emails == {"e2", "e3"}
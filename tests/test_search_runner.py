@@ -0,0 +1,102 @@
+"""
+Tests for running searches off the event loop with request coalescing and
+admission control.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from api.core.errors import ServiceOverloadedError
+from api.services.search_runner import SearchRunner
+
+
+class BlockingSearchSystem:
+    """Search system whose searches wait until released, counting calls"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.search_calls = 0
+        self.embed_calls = 0
+
+    async def aembed_queries(self, queries):
+        self.embed_calls += 1
+        return [[0.0] for _ in queries]
+
+    def search_many(self, queries, **kwargs):
+        self.search_calls += 1
+        self.release.wait(5)
+        return [[{"title": query}] for query in queries]
+
+
+def test_identical_searches_coalesced():
+    """Test that identical concurrent searches share one computation"""
+    search_system = BlockingSearchSystem()
+    runner = SearchRunner(search_system, max_workers=2)
+
+    async def run():
+        searches = [
+            asyncio.create_task(runner.search_many(["ai  chips"], k=5)),
+            asyncio.create_task(runner.search_many(["ai chips"], k=5)),
+            asyncio.create_task(runner.search_many(["ai chips"], k=10)),
+        ]
+        await asyncio.sleep(0.05)
+        search_system.release.set()
+        return await asyncio.gather(*searches)
+
+    first, second, other = asyncio.run(run())
+    assert first is second
+    assert other == [[{"title": "ai chips"}]]
+    assert search_system.search_calls == 2
+    assert runner.stats()["coalesced"] == 1
+    assert runner.stats()["in_flight"] == 0
+
+
+def test_overload_rejected():
+    """Test that searches beyond max_in_flight are rejected instead of queued"""
+    search_system = BlockingSearchSystem()
+    runner = SearchRunner(search_system, max_workers=1, max_in_flight=1)
+
+    async def run():
+        running = asyncio.create_task(runner.search_many(["first"]))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ServiceOverloadedError) as error:
+            await runner.search_many(["second"])
+        assert error.value.status_code == 503
+        search_system.release.set()
+        return await running
+
+    assert asyncio.run(run()) == [[{"title": "first"}]]
+    assert runner.stats()["rejected"] == 1
+
+
+def test_lexical_search_skips_embedding():
+    """Test that lexical searches do not embed queries"""
+    search_system = BlockingSearchSystem()
+    search_system.release.set()
+    runner = SearchRunner(search_system)
+
+    asyncio.run(runner.search_many(["rust"], mode="lexical"))
+    assert search_system.embed_calls == 0
+    asyncio.run(runner.search_many(["rust"], mode="hybrid"))
+    assert search_system.embed_calls == 1
+
+
+@pytest.mark.parametrize("embedding_cache_size", [1024, 0])
+def test_query_embedded_once(make_search_system, embedding_cache_size):
+    """Test that the awaited query vectors are searched with rather than looked up again"""
+    search_system = make_search_system(
+        [{"title": "AI CHIPS", "content": "Chips", "newsletter_type": "TLDR AI"}],
+        embedding_cache_size=embedding_cache_size
+    )
+    calls_before = search_system.embeddings.calls
+    runner = SearchRunner(search_system)
+
+    [results] = asyncio.run(runner.search_many(["ai chips"], k=1))
+
+    assert results[0]["metadata"]["title"] == "AI CHIPS"
+    assert search_system.embeddings.calls == calls_before + 1
+    stats = search_system.get_cache_stats()["embedding_cache"]
+    assert stats["hits"] == 0
+    assert stats["misses"] == 1
@@ -0,0 +1,186 @@
+"""
+Tests for the time- and newsletter-partitioned sharded search system.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ARTICLES = [
+    {"title": "OCTOBER CHIPS", "content": "Chips", "newsletter_type": "TLDR AI", "date": "2024-10-03T08:00:00+00:00"},
+    {"title": "NOVEMBER CHIPS", "content": "Chips", "newsletter_type": "TLDR", "date": "2024-11-05T08:00:00+00:00"},
+    {"title": "LATE NOVEMBER", "content": "Rust", "newsletter_type": "TLDR", "date": "2024-11-28T08:00:00+00:00"},
+    {"title": "NO DATE", "content": "Chips", "newsletter_type": "TLDR"},
+]
+
+
+def test_articles_partitioned_by_month(make_search_system):
+    """Test that articles land in one shard per month plus an undated shard"""
+    search_system = make_search_system(ARTICLES, partition="month")
+
+    assert search_system.list_shards() == ["2024-10", "2024-11", "undated"]
+    assert search_system.get_total_articles() == len(ARTICLES)
+
+
+def test_fan_out_embeds_query_once(make_search_system):
+    """Test that searching every shard embeds the query a single time and merges top-k"""
+    search_system = make_search_system(ARTICLES, partition="month")
+    fake = search_system.embeddings
+    calls_before = fake.calls
+
+    results = search_system.search("chips", k=2)
+
+    assert fake.calls == calls_before + 1
+    assert len(results) == 2
+    assert results[0]["similarity_score"] >= results[1]["similarity_score"]
+
+
+def test_date_range_selects_shards(make_search_system):
+    """Test that a date range only searches the matching months and dates"""
+    search_system = make_search_system(ARTICLES, partition="month")
+
+    assert search_system.select_shards(date_from="2024-11") == ["2024-11"]
+    assert search_system.select_shards(date_to="2024") == ["2024-10", "2024-11"]
+
+    results = search_system.search("chips", k=5, date_from="2024-11-01", date_to="2024-11-10")
+    assert [r["metadata"]["title"] for r in results] == ["NOVEMBER CHIPS"]
+
+
+def test_filtered_search_loads_only_selected_shards(make_search_system, monkeypatch):
+    """Test that embedding the query does not pin a shard the filters pruned"""
+    search_system = make_search_system(ARTICLES, partition="month")
+    search_system.embedding_cache.clear()
+    acquire = search_system._acquire
+    pinned = []
+
+    def record(key):
+        pinned.append(key)
+        return acquire(key)
+
+    monkeypatch.setattr(search_system, "_acquire", record)
+    search_system.search("fresh query", k=5, date_from="2024-11-01")
+    assert pinned == ["2024-11"]
+
+
+def test_newsletter_partition(make_search_system):
+    """Test that newsletter filters select a single shard"""
+    search_system = make_search_system(ARTICLES, partition="newsletter")
+
+    assert search_system.list_shards() == ["tldr", "tldr-ai"]
+    results = search_system.search("chips", k=5, filters={"newsletter_type": "TLDR AI"})
+    assert [r["metadata"]["title"] for r in results] == ["OCTOBER CHIPS"]
+
+
+def test_shards_evicted_and_reloaded(make_search_system):
+    """Test that least recently used shards are evicted and reload from disk"""
+    search_system = make_search_system(ARTICLES, partition="month", max_loaded_shards=1)
+
+    search_system.search("chips", k=5)
+
+    assert len(search_system._shards) == 1
+    assert len(search_system.search("chips", k=5)) == len(ARTICLES)
+
+
+def test_articles_counted_without_loading_shards(make_search_system, monkeypatch):
+    """Test that counting articles reads the saved indexes of unloaded shards instead of loading them"""
+    search_system = make_search_system(ARTICLES, partition="month", max_loaded_shards=1)
+    loaded = list(search_system._shards)
+
+    def load_shard(key):
+        raise AssertionError(f"Loaded shard {key}")
+
+    monkeypatch.setattr(search_system, "_load_shard", load_shard)
+    assert search_system.get_total_articles() == len(ARTICLES)
+    assert list(search_system._shards) == loaded
+
+
+def test_cold_shard_loads_outside_the_lock(make_search_system, monkeypatch):
+    """Test that loading a shard neither blocks other shards nor happens twice"""
+    search_system = make_search_system(ARTICLES, partition="month")
+    search_system.evict_shard("2024-10")
+    load_shard = search_system._load_shard
+    loads, started, release = [], threading.Event(), threading.Event()
+
+    def slow_load(key):
+        loads.append(key)
+        started.set()
+        release.wait(5)
+        return load_shard(key)
+
+    monkeypatch.setattr(search_system, "_load_shard", slow_load)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        cold = [pool.submit(search_system.get_shard, "2024-10") for _ in range(2)]
+        assert started.wait(5)
+        assert pool.submit(search_system.get_shard, "2024-11").result(timeout=1).get_total_articles() == 2
+        release.set()
+        assert cold[0].result() is cold[1].result()
+    assert loads == ["2024-10"]
+
+
+def test_pinned_shards_are_not_evicted(make_search_system):
+    """Test that a shard in use stays loaded while others come and go, and is evicted once released"""
+    search_system = make_search_system(ARTICLES, partition="month", max_loaded_shards=1)
+
+    with search_system.pinned_shards(["2024-10"]) as [writer]:
+        search_system.search("chips", k=5)
+        assert list(search_system._shards) == ["2024-10"]
+        assert search_system.get_shard("2024-10") is writer
+    search_system.get_shard("2024-11")
+    assert list(search_system._shards) == ["2024-11"]
+
+
+MERGE_ARTICLES = [
+    {"title": f"STORY {i}", "content": content, "newsletter_type": "TLDR", "date": f"2024-{month:02d}-03T08:00:00+00:00"}
+    for i, (month, content) in enumerate([
+        (10, "Chips"),
+        (10, "Rust compiler release"),
+        (10, "Chips and more chips from the chip makers"),
+        (11, "Chips"),
+        (11, "Rust rewrite of the chips toolchain"),
+        (11, "Rocket launch"),
+        (11, "Battery cars"),
+    ])
+]
+
+
+def test_shard_results_rank_like_one_index(make_search_system):
+    """Test that merged results get the scores and order of an unsharded index holding every article"""
+    sharded = make_search_system(MERGE_ARTICLES, partition="month")
+    single = make_search_system(MERGE_ARTICLES)
+    assert sharded.list_shards() == ["2024-10", "2024-11"]
+
+    for mode in ("lexical", "vector", "hybrid"):
+        for query in ("chips", "rust chips", "rocket"):
+            expected = [(r["metadata"]["title"], r["similarity_score"]) for r in single.search(query, k=4, mode=mode)]
+            found = [(r["metadata"]["title"], r["similarity_score"]) for r in sharded.search(query, k=4, mode=mode)]
+            assert found == expected, (mode, query)
+
+    # Each month has a top lexical hit of its own, only one of them scores 1
+    scores = [r["similarity_score"] for r in sharded.search("chips", k=4, mode="lexical")]
+    assert scores.count(1.0) == 1
+    assert [r["similarity_score"] for r in sharded.search("chips", k=4, mode="lexical", min_score=0.99)] == [1.0]
+
+
+def test_shards_searched_in_batches_that_fit_in_memory(make_search_system, monkeypatch):
+    """Test that searching more shards than can be loaded pins a batch at a time and ranks like one index"""
+    articles = MERGE_ARTICLES + [
+        {"title": "DECEMBER CHIPS", "content": "Chips for rockets", "newsletter_type": "TLDR",
+         "date": "2024-12-03T08:00:00+00:00"},
+    ]
+    single = make_search_system(articles)
+    sharded = make_search_system(articles, partition="month", max_loaded_shards=2)
+    assert len(sharded.list_shards()) == 3
+    load_shard = sharded._load_shard
+    loaded = []
+
+    def record(key):
+        loaded.append(len(sharded._pins))
+        return load_shard(key)
+
+    monkeypatch.setattr(sharded, "_load_shard", record)
+    for mode in ("lexical", "vector", "hybrid"):
+        expected = [(r["metadata"]["title"], r["similarity_score"]) for r in single.search("chips", k=4, mode=mode)]
+        found = [(r["metadata"]["title"], r["similarity_score"]) for r in sharded.search("chips", k=4, mode=mode)]
+        assert found == expected, mode
+    # Never more shards pinned than fit, so each load could evict an unpinned one
+    assert loaded and max(loaded) < 2
+    assert len(sharded._shards) == 2
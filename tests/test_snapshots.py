@@ -0,0 +1,230 @@
+"""
+Tests for publishing index snapshots, serving them read-only and snapshot isolation
+of searches during index writes.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+
+import faiss
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from emails.email_searcher import EmailSearchSystem
+from emails.lexical_index import BM25Index
+from emails.snapshots import SnapshotSearchSystem, SnapshotStore
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=16)
+
+
+def open_snapshot(path):
+    search_system = EmailSearchSystem(base_dir=path, read_only=True)
+    search_system.embeddings = EMBEDDINGS
+    return search_system
+
+
+def make_writer(tmp_path):
+    writer = EmailSearchSystem(base_dir=str(tmp_path / "writer"))
+    writer.embeddings = EMBEDDINGS
+    writer.add_articles([{"title": "FIRST", "content": "First article"}])
+    return writer
+
+
+def test_reader_picks_up_published_snapshots(tmp_path):
+    """Test that readers serve the live snapshot and switch when a new one is published"""
+    writer = make_writer(tmp_path)
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    store.publish(writer)
+
+    reader = SnapshotSearchSystem(store, open_snapshot, poll_interval=3600)
+    assert reader.version == "v00000001"
+    assert reader.get_total_articles() == 1
+
+    writer.add_articles([{"title": "SECOND", "content": "Second article"}])
+    store.publish(writer)
+    assert reader.get_total_articles() == 1
+
+    assert reader.refresh()
+    assert reader.version == "v00000002"
+    assert len(reader.search("article", k=5)) == 2
+    reader.close()
+
+
+def test_old_snapshots_pruned(tmp_path):
+    """Test that only the most recent snapshots are kept on disk"""
+    writer = make_writer(tmp_path)
+    store = SnapshotStore(str(tmp_path / "snapshots"), keep=2)
+    for _ in range(4):
+        store.publish(writer)
+
+    assert store.list_snapshots() == ["v00000003", "v00000004"]
+    assert store.current_name() == "v00000004"
+
+
+def test_snapshots_are_read_only(tmp_path):
+    """Test that snapshot search systems refuse writes"""
+    writer = make_writer(tmp_path)
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    store.publish(writer)
+    snapshot = open_snapshot(store.path(store.current_name()))
+
+    with pytest.raises(RuntimeError):
+        snapshot.add_articles([{"title": "THIRD", "content": "Third article"}])
+
+
+def test_reader_without_snapshot(tmp_path):
+    """Test that a reader started before the writer serves empty results"""
+    reader = SnapshotSearchSystem(SnapshotStore(str(tmp_path / "snapshots")), open_snapshot, poll_interval=3600)
+
+    assert reader.search("anything") == []
+    assert reader.get_total_articles() == 0
+    reader.close()
+
+
+def test_searches_read_a_consistent_state_while_indexing(tmp_path):
+    """Test that a captured index state is unaffected by later writes"""
+    writer = make_writer(tmp_path)
+    writer.add_articles([{"title": "SECOND", "content": "Second article"}])
+    state = writer._state
+
+    writer.add_articles([{"title": "THIRD", "content": "Third article"}])
+
+    # The third article was appended to the same FAISS index
+    assert state.vector_store is writer.vector_store
+    assert state.size == 2
+    assert len(state.lexical_index) == 2
+    hits = writer._search_vectors(state, writer.embed_queries(["third article"]), k=5)[0]
+    assert len(hits) == 2
+    assert writer.index_version == state.version + 1
+    assert writer.vector_store.index.ntotal == 3
+
+
+def test_articles_appended_without_copying_the_index(tmp_path, monkeypatch):
+    """Test that the FAISS index is only copied when it outgrows the room reserved in it"""
+    clones = []
+    original = faiss.clone_index
+
+    def clone_index(index):
+        clones.append(index.ntotal)
+        return original(index)
+
+    monkeypatch.setattr(faiss, "clone_index", clone_index)
+    writer = make_writer(tmp_path)
+    for i in range(100):
+        writer.add_articles([{"title": f"ARTICLE {i}", "content": "More article text"}])
+
+    assert writer.get_total_articles() == 101
+    # Growing by half each time, 101 articles take a dozen copies, not 100
+    assert len(clones) <= 12
+
+
+def test_failed_write_leaves_no_articles_behind(tmp_path, monkeypatch):
+    """Test that articles appended in place are removed again when saving the index fails"""
+    writer = make_writer(tmp_path)
+    writer.add_articles([{"title": "SECOND", "content": "Second article"}])
+    save = BM25Index.save
+
+    def fail(self, path):
+        raise OSError("Disk full")
+
+    monkeypatch.setattr(BM25Index, "save", fail)
+    with pytest.raises(OSError):
+        writer.add_articles([{"title": "ORPHAN", "content": "Never indexed"}])
+    monkeypatch.setattr(BM25Index, "save", save)
+
+    store = writer.vector_store
+    assert store.index.ntotal == 2
+    assert len(store.index_to_docstore_id) == len(store.docstore._dict) == 2
+
+    writer.add_articles([{"title": "THIRD", "content": "Third article"}])
+    titles = {metadata["title"] for metadata in writer.article_metadata().values()}
+    assert titles == {"FIRST", "SECOND", "THIRD"}
+    assert len(writer.lexical_index) == writer.get_total_articles() == 3
+    assert "ORPHAN" not in [hit["metadata"]["title"] for hit in writer.search("Never indexed", k=5)]
+
+
+def test_concurrent_searches_during_writes(tmp_path):
+    """Test that searching from several threads while adding articles never fails"""
+    writer = make_writer(tmp_path)
+    errors = []
+    done = threading.Event()
+
+    def search_loop():
+        while not done.is_set():
+            try:
+                results = writer.search("article", k=3, mode="hybrid")
+                assert results
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=search_loop) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for i in range(20):
+        writer.add_articles([{"title": f"ARTICLE {i}", "content": "More article text"}])
+    done.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert writer.get_total_articles() == 21
+
+
+READER_SCRIPT = """
+import sys
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from emails.email_searcher import EmailSearchSystem
+
+search_system = EmailSearchSystem(base_dir=sys.argv[1], read_only=True, neighbor_count=0)
+search_system.embeddings = DeterministicFakeEmbedding(size=64)
+search_system.search("article", k=3, mode="vector")
+print("ready", flush=True)
+sys.stdin.read()
+"""
+
+
+def mapped_memory_kb(path):
+    """Resident kB of this process's mappings of a file, by smaps field."""
+    fields = {}
+    mapped = False
+    with open("/proc/self/smaps") as f:
+        for line in f:
+            parts = line.split()
+            if "-" in parts[0]:
+                mapped = parts[-1] == path
+            elif mapped and parts[0].endswith(":") and len(parts) == 3:
+                fields[parts[0][:-1]] = fields.get(parts[0][:-1], 0) + int(parts[1])
+    return fields
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/smaps"), reason="Needs /proc/<pid>/smaps")
+def test_readers_share_vector_codes(tmp_path):
+    """Test that the vector codes of read-only systems are shared file pages, not private copies"""
+    path = str(tmp_path / "index")
+    writer = EmailSearchSystem(
+        base_dir=str(tmp_path / "writer"), embeddings=DeterministicFakeEmbedding(size=64), neighbor_count=0
+    )
+    writer.add_articles([{"title": f"ARTICLE {i}", "content": f"Article {i}"} for i in range(2000)])
+    writer.save_to(path)
+
+    src = os.path.dirname(os.path.dirname(sys.modules[EmailSearchSystem.__module__].__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([src, os.environ.get("PYTHONPATH", "")]))
+    other_reader = subprocess.Popen(
+        [sys.executable, "-c", READER_SCRIPT, path], env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        assert other_reader.stdout.readline().strip() == "ready"
+        reader = EmailSearchSystem(base_dir=path, read_only=True, neighbor_count=0)
+        reader.embeddings = DeterministicFakeEmbedding(size=64)
+        reader.search("article", k=3, mode="vector")
+
+        memory = mapped_memory_kb(os.path.join(path, "faiss_index", "index.faiss"))
+        codes_kb = 2000 * 64 * 4 // 1024
+        # Freshly written file pages may still be dirty in the page cache
+        assert memory.get("Shared_Clean", 0) + memory.get("Shared_Dirty", 0) >= codes_kb
+        assert memory.get("Private_Clean", 0) + memory.get("Private_Dirty", 0) == 0
+        assert reader.approximate_memory_bytes() > codes_kb * 1024
+    finally:
+        other_reader.communicate("")
@@ -0,0 +1,95 @@
+"""
+Tests for request tracing and the per-request sampling profiler.
+"""
+
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+import tracing
+from api.core.config import Settings
+from api.main import app, settings
+from api.services.account_manager import get_email_service
+from api.services.email_service import EmailService
+
+
+def test_spans_are_noops_without_trace():
+    """Test that spans record nothing when no trace is active"""
+    assert tracing.current_trace() is None
+    with tracing.span("search.faiss"):
+        pass
+    assert tracing.span("search.faiss") is tracing.span("parse")
+
+
+def test_trace_records_spans_and_samples():
+    """Test that spans nest in a trace and the profiler samples traced threads"""
+    with tracing.trace("request", profile_interval=0.001) as current:
+        with tracing.span("search.faiss"):
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+    assert tracing.current_trace() is None
+
+    names = [span["name"] for span in current.to_dict()["spans"]]
+    assert names == ["request", "search.faiss"]
+    assert "search-faiss;dur=" in current.server_timing()
+    folded = current.folded_profile().splitlines()
+    assert folded and all(line.rsplit(" ", 1)[1].isdigit() for line in folded)
+    assert any("test_trace_records_spans_and_samples" in line for line in folded)
+
+
+def test_profiled_search_request(tmp_path, monkeypatch):
+    """Test that ?profile=true traces a search and stores a flamegraph-ready profile"""
+    service = EmailService(Settings(base_dir=str(tmp_path), embedding_backend="local"))
+    service.search_system.add_articles([{"title": "Nvidia", "content": "AI chips"}])
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path / "profiles"))
+    monkeypatch.setattr(settings, "profiling_enabled", True)
+    monkeypatch.setattr(settings, "max_profiles", 1)
+    app.dependency_overrides[get_email_service] = lambda: service
+    client = TestClient(app)
+    try:
+        plain = client.post("/api/emails/search", json={"query": "chips", "mode": "hybrid"})
+        assert "x-trace-id" not in plain.headers
+
+        response = client.post(
+            "/api/emails/search?profile=true", json={"query": "nvidia chips", "mode": "hybrid"}
+        )
+        assert response.json()["total"] == 1
+        trace_id = response.headers["x-trace-id"]
+        assert "search-faiss;dur=" in response.headers["server-timing"]
+
+        spans = client.get(f"/profiles/{trace_id}").json()["spans"]
+        names = {span["name"] for span in spans}
+        assert {"/api/emails/search", "search.embed", "search.faiss", "serialize"} <= names
+        assert client.get(f"/profiles/{trace_id}?format=folded").status_code == 200
+        assert client.get("/profiles/..%2Fsecrets").status_code == 404
+
+        newer = client.post("/api/emails/search", json={"query": "chips"}, headers={"X-Profile": "1"})
+        # Only the newest max_profiles traces are kept
+        assert client.get(f"/profiles/{newer.headers['x-trace-id']}").status_code == 200
+        assert client.get(f"/profiles/{trace_id}").status_code == 404
+        assert sorted(os.listdir(tmp_path / "profiles")) == [
+            f"{newer.headers['x-trace-id']}.folded", f"{newer.headers['x-trace-id']}.json"
+        ]
+    finally:
+        app.dependency_overrides.clear()
+        service.close()
+
+
+def test_profiling_disabled_by_default(tmp_path, monkeypatch):
+    """Test that clients cannot turn on profiling unless the settings enable it"""
+    assert Settings().profiling_enabled is False
+    service = EmailService(Settings(base_dir=str(tmp_path), embedding_backend="local"))
+    service.search_system.add_articles([{"title": "Nvidia", "content": "AI chips"}])
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path / "profiles"))
+    app.dependency_overrides[get_email_service] = lambda: service
+    client = TestClient(app)
+    try:
+        response = client.post("/api/emails/search?profile=true", json={"query": "chips"})
+        assert response.json()["total"] == 1
+        assert "x-trace-id" not in response.headers
+        assert not os.path.exists(tmp_path / "profiles")
+    finally:
+        app.dependency_overrides.clear()
+        service.close()
@@ -0,0 +1,134 @@
+"""
+Tests for compressed vector storage and exact re-ranking.
+"""
+
+import faiss
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from emails.email_searcher import EmailSearchSystem
+from emails.vector_storage import (ExactVectorStore, build_index,
+                                   index_memory_bytes, min_training_vectors,
+                                   needs_retraining, rerank, storage_of)
+
+
+def random_vectors(n: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def make_articles(start: int, n: int):
+    return [{"title": f"ARTICLE {i}", "content": f"Content number {i}"} for i in range(start, start + n)]
+
+
+@pytest.mark.parametrize("storage", ["flat", "float16", "int8", "pq"])
+def test_build_index_storages(storage):
+    """Test that each storage builds, reports its type and finds exact matches"""
+    vectors = random_vectors(300)
+    index = build_index(storage, vectors)
+
+    assert storage_of(index) == storage
+    assert index.ntotal == 300
+    _, indices = index.search(vectors[:10], 1)
+    assert (indices[:, 0] == np.arange(10)).mean() >= 0.8
+
+
+def test_compressed_storage_is_smaller():
+    """Test that compressed storages use less memory than float32"""
+    vectors = random_vectors(2000, dim=64)
+    sizes = {storage: index_memory_bytes(build_index(storage, vectors))
+             for storage in ["flat", "float16", "int8", "pq"]}
+
+    assert sizes["flat"] > sizes["float16"] > sizes["int8"] > sizes["pq"]
+
+
+def test_pq_needs_training_vectors():
+    """Test that product quantization refuses to train on too few vectors"""
+    with pytest.raises(ValueError):
+        build_index("pq", random_vectors(10))
+
+
+def test_rerank_orders_by_exact_distance(tmp_path):
+    """Test that re-ranking restores the exact nearest neighbour order"""
+    vectors = random_vectors(50)
+    exact = ExactVectorStore(str(tmp_path / "vectors.f32"), vectors.shape[1])
+    exact.append(vectors)
+
+    candidates = np.array([[5, 3, -1, 7]])
+    distances, positions = rerank(vectors[3:4], candidates, exact, k=2)
+
+    assert len(exact) == 50
+    assert positions[0, 0] == 3
+    assert distances[0, 0] == pytest.approx(0.0, abs=1e-6)
+
+    exact.truncate(10)
+    assert len(exact) == 10
+    np.testing.assert_array_equal(exact.get(np.arange(10)), vectors[:10])
+
+
+def test_retraining_schedule():
+    """Test that compressed indexes are retrained each time they double, up to a cap"""
+    first = min_training_vectors("int8", 64)
+    assert first >= 1000
+    assert min_training_vectors("pq", 32) >= 39 * 256
+    assert not needs_retraining("int8", 64, first, 2 * first - 1)
+    assert needs_retraining("int8", 64, 2 * first - 1, 2 * first + 10)
+    assert needs_retraining("int8", 64, first, 5 * first)
+    assert not needs_retraining("int8", 64, 10 ** 6, 10 ** 6 + 10 ** 5)
+
+
+def test_incremental_int8_recall(tmp_path):
+    """Test that an int8 index grown through add_articles finds what a flat index finds"""
+    embeddings = DeterministicFakeEmbedding(size=64)
+    int8 = EmailSearchSystem(base_dir=str(tmp_path / "int8"), embeddings=embeddings,
+                             vector_storage="int8", neighbor_count=0)
+    flat = EmailSearchSystem(base_dir=str(tmp_path / "flat"), embeddings=embeddings, neighbor_count=0)
+    # A single article first, the quantizer must not be trained on it
+    for start, stop in [(0, 1)] + [(i, i + 500) for i in range(1, 4501, 500)]:
+        int8.add_articles(make_articles(start, stop - start))
+        flat.add_articles(make_articles(start, stop - start))
+    assert storage_of(int8.vector_store.index) == "int8"
+
+    queries = [f"query {i}" for i in range(50)]
+    recall = np.mean([
+        len({r["metadata"]["title"] for r in found} & {r["metadata"]["title"] for r in expected}) / 10
+        for found, expected in zip(int8.search_many(queries, k=10), flat.search_many(queries, k=10))
+    ])
+    assert recall >= 0.9
+
+
+def test_search_system_converts_once_trainable(tmp_path):
+    """Test that a flat index is converted to PQ once it can be trained, and reloads compressed"""
+    search_system = EmailSearchSystem(base_dir=str(tmp_path), vector_storage="pq", rerank_factor=4,
+                                      neighbor_count=0)
+    search_system.embeddings = DeterministicFakeEmbedding(size=32)
+    trainable = min_training_vectors("pq", 32)
+
+    search_system.add_articles(make_articles(0, 100))
+    assert storage_of(search_system.vector_store.index) == "flat"
+    assert search_system.exact_vectors is None
+
+    search_system.add_articles(make_articles(100, trainable - 100))
+    assert storage_of(search_system.vector_store.index) == "pq"
+    assert len(search_system.exact_vectors) == trainable
+
+    search_system.add_articles(make_articles(trainable, 5))
+    assert len(search_system.exact_vectors) == trainable + 5
+
+    reloaded = EmailSearchSystem(base_dir=str(tmp_path), vector_storage="pq", rerank_factor=4,
+                                 neighbor_count=0)
+    reloaded.embeddings = search_system.embeddings
+    assert storage_of(reloaded.vector_store.index) == "pq"
+    assert reloaded.exact_vectors is not None
+
+    # Re-ranked scores are exact cosine similarities, not the approximate PQ distances
+    positions = {doc_id: i for i, doc_id in reloaded.vector_store.index_to_docstore_id.items()}
+    doc_id = reloaded.vector_store.index_to_docstore_id[7]
+    article = reloaded.exact_vectors.get(np.array([7]))[0]
+    results = reloaded.related(doc_id, k=3)
+    assert len(results) == 3
+    for result in results:
+        exact = reloaded.exact_vectors.get(np.array([positions[result["id"]]]))[0]
+        assert result["similarity_score"] == pytest.approx(float(exact @ article), abs=1e-3)
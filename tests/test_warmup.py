@@ -0,0 +1,61 @@
+"""
+Tests for lazy imports, the startup warmup and the readiness endpoint.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+from api import main
+from api.core.config import Settings
+from api.services.email_service import EmailService
+from api.services.warmup import Warmup
+
+HEAVY_MODULES = ("faiss", "langchain_core", "langchain_community", "googleapiclient", "google_auth_oauthlib")
+
+
+def test_api_import_defers_heavy_modules():
+    """Test that importing the app loads none of the slow dependencies"""
+    code = (
+        "import sys, api.main; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    src = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONPATH": src}
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_warmup_records_stages(tmp_path, monkeypatch):
+    """Test that a failed embedding pre-warm is recorded without failing the warmup"""
+    monkeypatch.setattr(EmailService, "_instance", None)
+    warmup = Warmup(Settings(
+        base_dir=str(tmp_path), ollama_base_url="http://127.0.0.1:9", embedding_timeout=0.5
+    ))
+    warmup.run_sync()
+    assert set(warmup.stages) == {"service", "embeddings"}
+    assert "embeddings" in warmup.errors
+    EmailService._instance.close()
+
+
+def test_readiness_follows_warmup(tmp_path, monkeypatch):
+    """Test that /ready answers 503 until the lifespan warmup has loaded the service"""
+    monkeypatch.setattr(EmailService, "_instance", None)
+    monkeypatch.setattr(main, "warmup", Warmup(Settings(base_dir=str(tmp_path), embedding_backend="local")))
+    client = TestClient(main.app)
+    assert client.get("/ready").status_code == 503
+
+    with client:
+        deadline = time.monotonic() + 10
+        while not main.warmup.ready and time.monotonic() < deadline:
+            time.sleep(0.01)
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+        assert set(response.json()["stages"]) == {"service", "embeddings"}
+        assert EmailService._instance is not None